@@ -4,6 +4,7 @@ from django.contrib.auth.forms import UserChangeForm
 from django.contrib.auth.forms import UsernameField
 from django.utils.translation import gettext_lazy as _
 
+from djangoblog import cache_purge
 # Register your models here.
 from .models import BlogUser
 
@@ -44,6 +45,14 @@ class BlogUserChangeForm(UserChangeForm):
         super().__init__(*args, **kwargs)
 
 
+def purge_author_cache(modeladmin, request, queryset):
+    stats = cache_purge.purge(authors=list(queryset.values_list('username', flat=True)))
+    modeladmin.message_user(request, cache_purge.format_stats(stats))
+
+
+purge_author_cache.short_description = _('Purge cache of selected authors')
+
+
 class BlogUserAdmin(UserAdmin):
     form = BlogUserChangeForm
     add_form = BlogUserCreationForm
@@ -58,3 +67,4 @@ class BlogUserAdmin(UserAdmin):
     list_display_links = ('id', 'username')
     ordering = ('-id',)
     search_fields = ('username', 'nickname', 'email')
+    actions = [purge_author_cache]
@@ -16,7 +16,7 @@ from django.urls import reverse
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
 
-from djangoblog.utils import send_email, get_sha256, get_current_site, generate_code, delete_sidebar_cache
+from djangoblog.utils import send_email, get_sha256, get_current_site, generate_code
 from djangoblog.base_views import SecureFormView, LoginFormView, LogoutRedirectView
 from . import utils
 from .forms import RegisterForm, LoginForm, ForgetPasswordForm, ForgetPasswordCodeForm
@@ -87,7 +87,6 @@ class LogoutView(LogoutRedirectView):
 
     def get(self, request, *args, **kwargs):
         logout(request)
-        delete_sidebar_cache()
         # 获取响应对象并删除登录标记 cookie
         response = super(LogoutView, self).get(request, *args, **kwargs)
         response.delete_cookie('logged_user')
@@ -120,7 +119,6 @@ class LoginView(LoginFormView):
         form = AuthenticationForm(data=self.request.POST, request=self.request)
 
         if form.is_valid():
-            delete_sidebar_cache()
             logger.info(self.redirect_field_name)
 
             auth.login(self.request, form.get_user())
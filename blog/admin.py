@@ -5,6 +5,7 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from djangoblog import cache_purge
 # Register your models here.
 from .models import Article, Category, Tag, Links, SideBar, BlogSettings
 
@@ -17,26 +18,56 @@ class ArticleForm(forms.ModelForm):
         fields = '__all__'
 
 
+def _update_articles(queryset, **fields):
+    """update() 不会触发信号，手动更新标签文章数并清理缓存"""
+    # 先取出id：列表按状态筛选时，更新后 queryset 不再包含这些文章
+    article_ids = list(queryset.values_list('id', flat=True))
+    queryset.update(**fields)
+    if article_ids:
+        if 'status' in fields:
+            Tag.update_article_counts(set(
+                Article.tags.through.objects.filter(article_id__in=article_ids).values_list('tag_id', flat=True)))
+        cache_purge.purge(articles=article_ids)
+
+
 def makr_article_publish(modeladmin, request, queryset):
-    queryset.update(status='p')
+    _update_articles(queryset, status='p')
 
 
 def draft_article(modeladmin, request, queryset):
-    queryset.update(status='d')
+    _update_articles(queryset, status='d')
 
 
 def close_article_commentstatus(modeladmin, request, queryset):
-    queryset.update(comment_status='c')
+    _update_articles(queryset, comment_status='c')
 
 
 def open_article_commentstatus(modeladmin, request, queryset):
-    queryset.update(comment_status='o')
+    _update_articles(queryset, comment_status='o')
+
+
+def purge_article_cache(modeladmin, request, queryset):
+    stats = cache_purge.purge(articles=list(queryset.values_list('id', flat=True)), content=True)
+    modeladmin.message_user(request, cache_purge.format_stats(stats))
+
+
+def purge_category_cache(modeladmin, request, queryset):
+    stats = cache_purge.purge(categories=list(queryset.values_list('id', flat=True)))
+    modeladmin.message_user(request, cache_purge.format_stats(stats))
+
+
+def purge_tag_cache(modeladmin, request, queryset):
+    stats = cache_purge.purge(tags=list(queryset.values_list('id', flat=True)))
+    modeladmin.message_user(request, cache_purge.format_stats(stats))
 
 
 makr_article_publish.short_description = _('Publish selected articles')
 draft_article.short_description = _('Draft selected articles')
 close_article_commentstatus.short_description = _('Close article comments')
 open_article_commentstatus.short_description = _('Open article comments')
+purge_article_cache.short_description = _('Purge cache of selected articles')
+purge_category_cache.short_description = _('Purge cache of selected categories')
+purge_tag_cache.short_description = _('Purge cache of selected tags')
 
 
 class ArticlelAdmin(admin.ModelAdmin):
@@ -63,7 +94,8 @@ class ArticlelAdmin(admin.ModelAdmin):
         makr_article_publish,
         draft_article,
         close_article_commentstatus,
-        open_article_commentstatus]
+        open_article_commentstatus,
+        purge_article_cache]
     raw_id_fields = ('author', 'category',)
 
     def link_to_category(self, obj):
@@ -94,11 +126,13 @@ class ArticlelAdmin(admin.ModelAdmin):
 
 class TagAdmin(admin.ModelAdmin):
     exclude = ('slug', 'last_mod_time', 'creation_time')
+    actions = [purge_tag_cache]
 
 
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'parent_category', 'index')
     exclude = ('slug', 'last_mod_time', 'creation_time')
+    actions = [purge_category_cache]
 
 
 class LinksAdmin(admin.ModelAdmin):
@@ -135,9 +169,6 @@ class BlogSettingsAdmin(admin.ModelAdmin):
         )
 
     def save_model(self, request, obj, form, change):
-        """保存设置时清除缓存"""
+        """保存设置时清除依赖配置的缓存（BlogSettings.save 中完成）"""
         super().save_model(request, obj, form, change)
-        # 确保缓存被清除
-        from djangoblog.utils import cache
-        cache.clear()
         self.message_user(request, '设置已保存，缓存已清除')
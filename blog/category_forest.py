@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+分类目录森林索引
+
+分类数量少、很少修改，但每个分类页、面包屑、导航都要查询上下级关系。
+这里用一次查询取出全部分类，预先计算父子关系、祖先链和后代集合，保存在进程内；
+任何分类修改都会更新 cache_tags.CATEGORY_TREE 的版本号，各进程检查到版本变化后重建。
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from djangoblog import cache_tags
+
+CHECK_INTERVAL = getattr(settings, 'NEAR_CACHE_CHECK_INTERVAL', 1)
+
+
+class CategoryForest:
+    """
+    分类森林：
+        parents   {id: parent_id}
+        children  {id: [子分类id]}，None 对应顶级分类，顺序与 Category.Meta.ordering 一致
+        ancestors {id: (自身id, 父id, ..., 顶级id)}
+        subtrees  {id: (自身id, 所有后代id...)}，前序遍历顺序
+        descendants {id: frozenset(自身及所有后代id)}
+    """
+
+    def __init__(self, categories):
+        self.categories = {category.pk: category for category in categories}
+        self.parents = {category.pk: category.parent_category_id for category in categories}
+        self.children = defaultdict(list)
+        for category in categories:
+            parent_id = category.parent_category_id
+            self.children[parent_id if parent_id in self.categories else None].append(category.pk)
+        self.ancestors = {pk: self._build_ancestors(pk) for pk in self.categories}
+        self.subtrees = {pk: self._walk(pk) for pk in self.categories}
+        self.descendants = {pk: frozenset(subtree) for pk, subtree in self.subtrees.items()}
+
+    def _build_ancestors(self, pk):
+        chain = []
+        seen = set()
+        while pk in self.categories and pk not in seen:
+            chain.append(pk)
+            seen.add(pk)
+            pk = self.parents[pk]
+        return tuple(chain)
+
+    def _walk(self, pk):
+        """前序遍历子树（含自身），数据中出现环时每个节点只访问一次"""
+        order = []
+        seen = set()
+        stack = [pk]
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            order.append(current)
+            stack.extend(reversed(self.children.get(current, [])))
+        return tuple(order)
+
+    def __contains__(self, pk):
+        return pk in self.categories
+
+    def get_ancestors(self, pk):
+        """自身及所有上级分类，从自身到顶级"""
+        return [self.categories[i] for i in self.ancestors.get(pk, ())]
+
+    def get_descendants(self, pk):
+        """自身及所有下级分类，前序遍历顺序"""
+        return [self.categories[i] for i in self.subtrees.get(pk, ())]
+
+    def get_descendant_ids(self, pk):
+        return self.descendants.get(pk, frozenset())
+
+    def get_children(self, pk=None):
+        """直接子分类，pk 为 None 时返回顶级分类"""
+        return [self.categories[i] for i in self.children.get(pk, [])]
+
+
+_lock = threading.Lock()
+_state = {'forest': None, 'version': None, 'next_check': 0}
+
+
+def _load():
+    from blog.models import Category
+    version = cache_tags.get_tag_versions([cache_tags.CATEGORY_TREE])[cache_tags.CATEGORY_TREE]
+    return CategoryForest(list(Category.objects.all())), version
+
+
+def get_forest(require=None):
+    """
+    获取当前进程的分类森林
+    :param require: 需要包含的分类id，不在森林中（其他进程刚创建）时立即重建
+    """
+    now = time.monotonic()
+    forest = _state['forest']
+    if forest is not None and now < _state['next_check'] and (require is None or require in forest):
+        return forest
+    with _lock:
+        forest = _state['forest']
+        if forest is None or require is not None and require not in forest:
+            forest, _state['version'] = _load()
+        else:
+            version = cache_tags.get_tag_versions([cache_tags.CATEGORY_TREE])[cache_tags.CATEGORY_TREE]
+            if version != _state['version']:
+                forest, _state['version'] = _load()
+        _state['forest'] = forest
+        _state['next_check'] = now + CHECK_INTERVAL
+        return forest
+
+
+def invalidate():
+    """清空本进程的森林，其他进程通过 CATEGORY_TREE 版本号得知变化"""
+    with _lock:
+        _state['forest'] = None
@@ -1,7 +1,10 @@
 import logging
 
+from django.db.models import Count
 from django.utils import timezone
 
+from djangoblog import cache_namespace
+from djangoblog.near_cache import near_cache
 from djangoblog.utils import cache, get_blog_setting
 from .models import Category, Article
 
@@ -9,15 +12,20 @@ logger = logging.getLogger(__name__)
 
 
 def seo_processor(requests):
-    key = 'seo_processor'
-    value = cache.get(key)
+    value = near_cache.get('seo_processor')
+    if value is None:
+        key = cache_namespace.make_key(cache_namespace.SEO, 'seo_processor')
+        value = cache.get(key)
+        near_cache.set('seo_processor', value)
     if value:
-        # 更新动态值（不需要缓存的内容）
+        # 近端缓存的值在线程间共享，复制后再更新动态值（不需要缓存的内容）
+        value = dict(value)
         value['SITE_BASE_URL'] = requests.scheme + '://' + requests.get_host() + '/'
         value['CURRENT_YEAR'] = timezone.now().year
         return value
     else:
         logger.info('set processor cache.')
+        key = cache_namespace.make_key(cache_namespace.SEO, 'seo_processor')
         setting = get_blog_setting()
 
         # 优化查询：预加载关联数据
@@ -26,6 +34,9 @@ def seo_processor(requests):
             type='p',
             status='p'
         )
+        # 导航中子分类的文章数，一次分组查询，避免每次渲染导航时逐个计数
+        nav_category_counts = dict(
+            Article.objects.values_list('category_id').annotate(count=Count('id')).order_by())
 
         value = {
             'SITE_NAME': setting.site_name,
@@ -38,6 +49,7 @@ def seo_processor(requests):
             'ARTICLE_SUB_LENGTH': setting.article_sub_length,
             'nav_category_list': nav_category_list,  # 保持QuerySet
             'nav_pages': nav_pages,  # 保持QuerySet
+            'nav_category_counts': nav_category_counts,
             'OPEN_SITE_COMMENT': setting.open_site_comment,
             'BEIAN_CODE': setting.beian_code,
             'ANALYTICS_CODE': setting.analytics_code,
@@ -0,0 +1,61 @@
+import time
+
+import markdown
+from django.core.management.base import BaseCommand
+
+from djangoblog.utils import CommonMarkdown
+
+SAMPLES = {
+    'comment': '感谢分享，**很有帮助**！参考 [文档](https://docs.djangoproject.com/) 里的 `cache` 一节。',
+    'article': '''# 标题
+
+一段普通的正文，包含 **加粗**、*斜体* 和 [链接](https://www.lylinux.net/)。
+
+## 代码
+
+```python
+import os
+
+
+def main():
+    print(os.getcwd())
+```
+
+| 列1 | 列2 |
+| --- | --- |
+| a | b |
+''',
+}
+
+
+class Command(BaseCommand):
+    help = 'benchmark markdown conversions/sec: new instance per call vs pooled converters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=500,
+            help='conversions per case')
+
+    def run(self, func, value, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(value)
+        return iterations / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        cases = [
+            ('article', 'new instance', lambda v: markdown.Markdown(
+                extensions=CommonMarkdown.EXTENSIONS).convert(v)),
+            ('article', 'pooled', CommonMarkdown.get_markdown),
+            ('comment', 'new instance', lambda v: markdown.Markdown(
+                extensions=CommonMarkdown.EXTENSIONS).convert(v)),
+            ('comment', 'pooled', CommonMarkdown.get_markdown),
+            ('comment', 'pooled lite', CommonMarkdown.get_markdown_lite),
+        ]
+        for sample, name, func in cases:
+            rate = self.run(func, SAMPLES[sample], iterations)
+            self.stdout.write('{sample:<8} {name:<14} {rate:>10.1f} conversions/sec'.format(
+                sample=sample, name=name, rate=rate))
@@ -1,11 +1,47 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from djangoblog import cache_purge
 from djangoblog.utils import cache
 
 
 class Command(BaseCommand):
-    help = 'clear the whole cache'
+    help = 'purge cached pages, lists and rendered content by entity, namespace or key prefix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--article', type=int, action='append', default=[], help='article id')
+        parser.add_argument('--category', type=int, action='append', default=[], help='category id')
+        parser.add_argument('--tag', type=int, action='append', default=[], help='tag id')
+        parser.add_argument('--author', action='append', default=[], help='author username')
+        parser.add_argument(
+            '--namespace',
+            action='append',
+            default=[],
+            choices=cache_purge.NAMESPACES,
+            help='named group of caches')
+        parser.add_argument('--prefix', action='append', default=[], help='cache key prefix')
+        parser.add_argument(
+            '--content',
+            action='store_true',
+            help='also purge the filtered body of the given articles')
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='flush the whole cache, including verification codes and sessions')
 
     def handle(self, *args, **options):
-        cache.clear()
-        self.stdout.write(self.style.SUCCESS('Cleared cache\n'))
+        if options['all']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS('Cleared cache'))
+            return
+        try:
+            stats = cache_purge.purge(
+                articles=options['article'],
+                categories=options['category'],
+                tags=options['tag'],
+                authors=options['author'],
+                namespaces=options['namespace'],
+                prefixes=options['prefix'],
+                content=options['content'])
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS('Purged cache, ' + cache_purge.format_stats(stats)))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from blog.models import Tag
+from djangoblog.utils import delete_sidebar_cache
+
+
+class Command(BaseCommand):
+    help = 'recount published articles per tag and repair drifted counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='only report tags whose stored count differs')
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Tag.objects.annotate(actual=Tag.count_articles_subquery())
+            .exclude(article_count=F('actual'))
+            .values_list('id', 'name', 'article_count', 'actual'))
+        for pk, name, stored, actual in drifted:
+            self.stdout.write(f'{name}({pk}): {stored} -> {actual}')
+        if drifted and not options['dry_run']:
+            Tag.update_article_counts([pk for pk, _, _, _ in drifted])
+            delete_sidebar_cache()
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} drifted tag counts'
+                                             + (' found' if options['dry_run'] else ' repaired')))
@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client
+from django.utils import timezone
+
+from djangoblog.page_holes import WARM_HEADER, get_warm_token
+from djangoblog.sitemap import ArticleSiteMap, CategorySiteMap, StaticViewSitemap, TagSiteMap
+from djangoblog.utils import get_current_site
+
+SITEMAPS = [StaticViewSitemap, ArticleSiteMap, CategorySiteMap, TagSiteMap]
+
+
+class RateLimiter:
+    """按固定间隔放行请求，rate 为每秒请求数，0 表示不限制"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Command(BaseCommand):
+    help = 'warm page, list, sidebar, markdown and highlight caches by rendering sitemap urls'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='number of pages rendered in parallel')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='max requests per second, 0 for unlimited')
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=0,
+            help='only warm entities modified in the last N minutes')
+        parser.add_argument(
+            '--host',
+            default='',
+            help='Host header used for the requests, defaults to the current site domain')
+
+    def get_urls(self, since):
+        """按 sitemap 优先级从高到低收集需要预热的 url"""
+        cutoff = timezone.now() - timedelta(minutes=since) if since else None
+        urls = []
+        sitemaps = sorted((cls() for cls in SITEMAPS), key=lambda s: float(s.priority or 0), reverse=True)
+        for sitemap in sitemaps:
+            lastmod = getattr(sitemap, 'lastmod', None)
+            for item in sitemap.items():
+                if cutoff and lastmod is not None and lastmod(item) < cutoff:
+                    continue
+                url = sitemap.location(item)
+                if url not in urls:
+                    urls.append(url)
+        return urls
+
+    def fetch(self, url, host, limiter, local):
+        limiter.wait()
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client(HTTP_HOST=host, headers={WARM_HEADER: get_warm_token()})
+        start = time.perf_counter()
+        try:
+            response = client.get(url)
+            status = response.status_code
+            hit = response.get('X-Page-Cache') == 'HIT'
+        except Exception as e:
+            self.stderr.write(f'{url}: {e}')
+            status, hit = None, False
+        return url, status, hit, (time.perf_counter() - start) * 1000
+
+    def handle(self, *args, **options):
+        host = options['host'] or get_current_site().domain
+        urls = self.get_urls(options['since'])
+        if not urls:
+            self.stdout.write('nothing to warm')
+            return
+
+        limiter = RateLimiter(options['rate'])
+        local = threading.local()
+        concurrency = max(1, options['concurrency'])
+        start = time.perf_counter()
+        if concurrency == 1:
+            results = [self.fetch(url, host, limiter, local) for url in urls]
+        else:
+            def work(url):
+                try:
+                    return self.fetch(url, host, limiter, local)
+                finally:
+                    # 工作线程各自持有数据库连接，用完关闭
+                    close_old_connections()
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(work, urls))
+        elapsed = time.perf_counter() - start
+
+        failed = [(url, status) for url, status, _, _ in results if status != 200]
+        for url, status in failed:
+            self.stdout.write(self.style.WARNING(f'{status} {url}'))
+        timings = sorted(ms for _, _, _, ms in results)
+        hits = sum(1 for _, _, hit, _ in results if hit)
+        self.stdout.write(
+            'warmed {total} urls in {elapsed:.2f}s, {failed} failed, page cache hit ratio {ratio:.1%}'.format(
+                total=len(results), elapsed=elapsed, failed=len(failed), ratio=hits / len(results)))
+        self.stdout.write('latency ms: avg {avg:.1f} p50 {p50:.1f} p95 {p95:.1f} max {max:.1f}'.format(
+            avg=sum(timings) / len(timings),
+            p50=timings[len(timings) // 2],
+            p95=timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            max=timings[-1]))
+        self.stdout.write(self.style.SUCCESS('Warmed cache'))
@@ -1,13 +1,59 @@
+import gzip
+import hashlib
 import logging
+import re
 import time
+from collections import namedtuple
 
+from django.conf import settings
+from django.contrib import auth
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import quote_etag
 from ipware import get_client_ip
 from user_agents import parse
 
 from blog.documents import ELASTICSEARCH_ENABLED, ElaspedTimeDocumentManager
+from djangoblog import cache_namespace, conditional, page_holes
+from djangoblog.constants import CacheKey
+from djangoblog.utils import cache
 
 logger = logging.getLogger(__name__)
 
+# headers: 未命中时内层中间件和视图设置的响应头，命中时原样返回
+# has_load_times: 页面包含渲染耗时占位，返回时按本次请求的耗时替换
+# etag: 视图（ConditionalGetMixin）计算 ETag 用的 parts，命中时按当前请求重新计算
+# dependencies: 渲染前页面依赖的命名空间代数 {namespace: generation}，任何一个变化后缓存的页面失效
+CachedPage = namedtuple(
+    'CachedPage',
+    ['content', 'content_type', 'shared', 'has_holes', 'headers', 'has_load_times', 'etag', 'dependencies'],
+    defaults=((), False, None, None))
+
+# 没有通过 ConditionalGetMixin 声明依赖的页面（搜索、友情链接等）在任何文章修改后失效
+DEFAULT_DEPENDENCIES = (cache_namespace.INDEX,)
+
+# PageCacheMiddleware 之内的中间件（XFrameOptionsMiddleware 等）和视图设置的响应头
+REPLAY_HEADERS = (
+    'X-Frame-Options',
+    'Content-Security-Policy',
+    'Content-Security-Policy-Report-Only',
+    'Content-Language',
+    'Cache-Control',
+)
+
+LOAD_TIMES_MARKER = b'<!!LOAD_TIMES!!>'
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def replace_load_times(response, seconds):
+    """把页面中的渲染耗时占位替换为实际耗时"""
+    response.content = response.content.replace(LOAD_TIMES_MARKER, str.encode(str(seconds)[:5]))
+    if response.has_header('Content-Length'):
+        response['Content-Length'] = str(len(response.content))
+
 
 class OnlineMiddleware(object):
     def __init__(self, get_response=None):
@@ -34,9 +80,172 @@ class OnlineMiddleware(object):
                         log_datetime=timezone.now(),
                         useragent=user_agent,
                         ip=ip)
-                response.content = response.content.replace(
-                    b'<!!LOAD_TIMES!!>', str.encode(str(cast_time)[:5]))
+                # 整页缓存的页面保留占位，由 PageCacheMiddleware 在每次返回时替换
+                if not page_holes.is_enabled(request):
+                    replace_load_times(response, cast_time)
             except Exception as e:
                 logger.error("Error OnlineMiddleware: %s" % e)
 
         return response
+
+
+class PageCacheMiddleware:
+    """
+    整页缓存
+
+    在 URL 解析和视图执行之前直接返回 gzip 压缩保存的页面。
+    与用户相关的片段用 {% page_hole %} 留空（见 djangoblog.page_holes），返回前按当前请求填充，
+    因此声明了 page_cache_shared 的视图（文章列表、文章详情）的缓存对登录用户同样有效，
+    其他页面只缓存和返回给匿名用户。
+    以下情况不读取也不写入缓存：
+        带有 messages cookie 的请求（有待显示的消息）
+        片段之外使用了 CSRF token、设置了 cookie 或声明为 private/no-store 的页面
+    缓存键属于 page 命名空间，只在网站配置、友情链接等整站修改时失效；
+    每个页面按它依赖的实体命名空间失效（视图的 get_etag_namespaces，如文章、评论、分类、标签），
+    侧边栏和导航随文章、评论的修改变化，由片段按请求渲染，不影响缓存的页面。
+    命中缓存时不经过内层中间件，X-Frame-Options 等响应头在未命中时保存（见 REPLAY_HEADERS），
+    渲染耗时占位按每次请求的耗时替换。
+    视图通过 ConditionalGetMixin 计算 ETag 时，命中缓存同样返回 ETag 并处理 If-None-Match，
+    返回 304 时执行有副作用的片段（如记录阅读，见 page_holes.run_not_modified）。
+    """
+
+    BYPASS_COOKIES = ('messages',)
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+        # 命中缓存时不经过内层中间件，填充片段时借用 CSRF 中间件读取和写入 CSRF cookie
+        self.csrf_middleware = CsrfViewMiddleware(get_response)
+
+    def __call__(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+
+        start_time = time.perf_counter()
+        request.page_holes = True
+        key = self.get_cache_key(request)
+        page = cache.get(key)
+        if isinstance(page, CachedPage) and (page.shared or self.is_anonymous_request(request)) \
+                and self.is_fresh(page):
+            return self.build_response(request, page, start_time)
+
+        # 渲染之前记录代数，渲染期间发生的修改会使本次写入的缓存失效
+        default_dependencies = cache_namespace.get_generations(DEFAULT_DEPENDENCIES)
+        response = self.get_response(request)
+        if not self.is_html_response(response):
+            return response
+        if request.method == 'GET' and self.is_cacheable_response(request, response):
+            content = response.content
+            etag, dependencies = getattr(request, 'page_etag', None) or (None, default_dependencies)
+            page = CachedPage(
+                gzip.compress(content),
+                response['Content-Type'],
+                getattr(request, 'page_cache_shared', False),
+                page_holes.HOLE_PREFIX.encode() in content,
+                tuple((name, response[name]) for name in REPLAY_HEADERS if response.has_header(name)),
+                LOAD_TIMES_MARKER in content,
+                etag,
+                dependencies)
+            cache.set(key, page, settings.PAGE_CACHE_TIMEOUT)
+            logger.info('page cache set: %s', request.path)
+        self.fill_holes(request, response)
+        replace_load_times(response, time.perf_counter() - start_time)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request.page_cache_shared = getattr(view_class, 'page_cache_shared', False)
+
+    def is_anonymous_request(self, request):
+        return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+    def is_cacheable_request(self, request):
+        if not settings.PAGE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+            return False
+        return not any(name in request.COOKIES for name in self.BYPASS_COOKIES)
+
+    def is_html_response(self, response):
+        return not response.streaming and response.get('Content-Type', '').startswith('text/html')
+
+    def is_cacheable_response(self, request, response):
+        if response.status_code != 200:
+            return False
+        if response.has_header('Content-Encoding') or response.cookies:
+            return False
+        cache_control = response.get('Cache-Control', '')
+        if 'private' in cache_control or 'no-store' in cache_control:
+            return False
+        # 片段之外使用了 CSRF token
+        if request.META.get('CSRF_COOKIE_NEEDS_UPDATE') or request.META.get('CSRF_COOKIE_USED'):
+            return False
+        if getattr(request, 'page_cache_shared', False):
+            return True
+        user = getattr(request, 'user', None)
+        return not (user is not None and user.is_authenticated)
+
+    def get_cache_key(self, request):
+        m = hashlib.sha256()
+        for part in (
+                request.get_host(),
+                request.get_full_path(),
+                getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE),
+        ):
+            m.update(part.encode('utf-8'))
+            m.update(b'\0')
+        return cache_namespace.make_key(
+            cache_namespace.PAGE, CacheKey.PAGE_CACHE.format(digest=m.hexdigest()))
+
+    def is_fresh(self, page):
+        """页面依赖的命名空间没有变化；没有记录依赖的页面按未命中处理"""
+        if page.dependencies is None:
+            return False
+        return cache_namespace.get_generations(page.dependencies) == page.dependencies
+
+    def ensure_user(self, request):
+        """命中缓存时内层的 AuthenticationMiddleware 没有执行"""
+        if not hasattr(request, 'user'):
+            request.user = SimpleLazyObject(lambda: auth.get_user(request))
+
+    def fill_holes(self, request, response):
+        """按当前请求渲染占位片段，片段中用到 CSRF token 时写入 cookie"""
+        content = response.content
+        if page_holes.HOLE_PREFIX.encode() not in content:
+            return
+        self.ensure_user(request)
+        response.content = page_holes.fill(request, content.decode(response.charset))
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        self.csrf_middleware.process_response(request, response)
+
+    def build_response(self, request, page, start_time):
+        etag = None
+        if page.etag:
+            self.ensure_user(request)
+            etag = quote_etag(conditional.build_etag(request, page.etag, page.dependencies))
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                if page.has_holes:
+                    page_holes.run_not_modified(request, gzip.decompress(page.content).decode())
+                response['ETag'] = etag
+                patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+                response['X-Page-Cache'] = 'HIT'
+                return response
+
+        if page.has_holes or page.has_load_times:
+            if page.has_holes:
+                # 命中缓存时内层的 CSRF 中间件没有执行，先从 cookie 中读取 CSRF secret
+                self.csrf_middleware.process_request(request)
+            response = HttpResponse(gzip.decompress(page.content), content_type=page.content_type)
+            self.fill_holes(request, response)
+            replace_load_times(response, time.perf_counter() - start_time)
+        elif re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = HttpResponse(page.content, content_type=page.content_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(page.content), content_type=page.content_type)
+        for name, value in page.headers:
+            response[name] = value
+        if etag:
+            response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+        response['X-Page-Cache'] = 'HIT'
+        return response
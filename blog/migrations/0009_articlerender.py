@@ -0,0 +1,30 @@
+# Generated by Django 5.2.16 on 2026-10-19 01:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_blogsettings_color_scheme'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleRender',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rendered', serialize=False, to='blog.article', verbose_name='article')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='content hash')),
+                ('html', models.TextField(blank=True, default='', verbose_name='html')),
+                ('toc', models.TextField(blank=True, default='', verbose_name='toc')),
+                ('plain_text', models.TextField(blank=True, default='', verbose_name='plain text')),
+                ('last_modify_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='modify time')),
+            ],
+            options={
+                'verbose_name': 'article render',
+                'verbose_name_plural': 'article render',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.16 on 2026-10-19 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_articlerender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articlerender',
+            name='summary',
+            field=models.TextField(blank=True, default='', verbose_name='summary'),
+        ),
+        migrations.AddField(
+            model_name='articlerender',
+            name='summary_length',
+            field=models.IntegerField(default=0, verbose_name='summary length'),
+        ),
+    ]
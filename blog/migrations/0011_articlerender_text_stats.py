@@ -0,0 +1,44 @@
+# Generated by Django 5.2.16 on 2026-10-19 02:27
+
+from django.db import migrations, models
+
+
+def clear_article_renders(apps, schema_editor):
+    # 已有的渲染结果没有文本统计，删除后在下次访问时重新生成
+    apps.get_model('blog', 'ArticleRender').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_articlerender_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articlerender',
+            name='cjk_count',
+            field=models.IntegerField(default=0, verbose_name='cjk character count'),
+        ),
+        migrations.AddField(
+            model_name='articlerender',
+            name='description',
+            field=models.CharField(blank=True, default='', max_length=300, verbose_name='description'),
+        ),
+        migrations.AddField(
+            model_name='articlerender',
+            name='first_image_url',
+            field=models.CharField(blank=True, default='', max_length=2000, verbose_name='first image url'),
+        ),
+        migrations.AddField(
+            model_name='articlerender',
+            name='reading_minutes',
+            field=models.IntegerField(default=1, verbose_name='reading minutes'),
+        ),
+        migrations.AddField(
+            model_name='articlerender',
+            name='word_count',
+            field=models.IntegerField(default=0, verbose_name='word count'),
+        ),
+        migrations.RunPython(clear_article_renders, migrations.RunPython.noop),
+    ]
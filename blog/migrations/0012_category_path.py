@@ -0,0 +1,40 @@
+# Generated by Django 5.2.16 on 2026-10-19 04:07
+
+from django.db import migrations, models
+
+
+def backfill_category_path(apps, schema_editor):
+    # 从顶级分类开始逐层计算路径；父分类缺失或存在环的分类作为顶级处理
+    Category = apps.get_model('blog', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_category_id'))
+    paths = {}
+
+    def get_path(pk):
+        chain = []
+        while pk is not None and pk not in paths and pk not in chain:
+            chain.append(pk)
+            pk = parents.get(pk)
+        path = paths.get(pk, '/')
+        for current in reversed(chain):
+            path = f'{path}{current}/'
+            paths[current] = path
+        return paths[chain[0]] if chain else path
+
+    for pk in parents:
+        Category.objects.filter(pk=pk).update(path=get_path(pk))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_articlerender_text_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='path'),
+        ),
+        migrations.RunPython(backfill_category_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.16 on 2026-10-19 04:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_tag_article_count(apps, schema_editor):
+    Tag = apps.get_model('blog', 'Tag')
+    Article = apps.get_model('blog', 'Article')
+    counts = Article.tags.through.objects.filter(
+        tag_id=OuterRef('pk'), article__status='p', article__type='a'
+    ).order_by().values('tag_id').annotate(count=Count('article_id')).values('count')
+    Tag.objects.update(article_count=Coalesce(Subquery(counts, output_field=models.IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='article count'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-article_count', 'name'], name='idx_tag_count_name'),
+        ),
+        migrations.RunPython(backfill_tag_article_count, migrations.RunPython.noop),
+    ]
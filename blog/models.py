@@ -1,18 +1,23 @@
 import logging
+import math
 import re
 from abc import abstractmethod
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import DatabaseError, models, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.urls import reverse
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from mdeditor.fields import MDTextField
 from uuslug import slugify
 
+from blog import category_forest
+from djangoblog import cache_tags
 from djangoblog.utils import cache_decorator, cache
-from djangoblog.utils import get_current_site
+from djangoblog.utils import get_current_site, CommonMarkdown
 from djangoblog.constants import CacheTimeout, CacheKey
 
 logger = logging.getLogger(__name__)
@@ -112,6 +117,14 @@ class Article(BaseModel):
     def __str__(self):
         return self.title
 
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # 列表页查询会 defer 正文，在模板中访问 body 会逐条触发额外查询，这里记录下来便于排查
+        if fields and 'body' in fields:
+            logger.warning(
+                'Lazy load of deferred Article.body (id=%s), list views should not access body',
+                self.pk, stack_info=settings.DEBUG)
+        return super().refresh_from_db(using=using, fields=fields, **kwargs)
+
     class Meta:
         ordering = ['-article_order', '-pub_time']
         verbose_name = _('article')
@@ -136,7 +149,6 @@ class Article(BaseModel):
             'day': self.creation_time.day
         })
 
-    @cache_decorator(CacheTimeout.HOUR_10)
     def get_category_tree(self):
         tree = self.category.get_category_tree()
         names = list(map(lambda c: (c.name, c.get_absolute_url()), tree))
@@ -145,6 +157,36 @@ class Article(BaseModel):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        is_update_views = kwargs.get('update_fields') == ['views']
+        if not is_update_views:
+            # 保存时预渲染正文，详情页/列表页直接读取渲染结果
+            self.get_render()
+
+    def get_render(self):
+        """
+        获取正文的渲染结果（HTML、目录、纯文本）
+        结果按正文内容哈希持久化，正文未变化时不会重复渲染Markdown
+        :return: ArticleRender
+        """
+        content_hash = CommonMarkdown.get_content_hash(self.body)
+        render = getattr(self, '_render', None)
+        if render is None or render.content_hash != content_hash:
+            render = ArticleRender.get_or_render(self.pk, self.body, content_hash)
+            self._render = render
+        return render
+
+    def get_summary(self):
+        """
+        获取文章摘要（列表页使用）
+        优先读取已持久化的渲染结果，不需要加载和哈希正文
+        """
+        render = getattr(self, '_render', None)
+        if render is None:
+            try:
+                render = self.rendered
+            except ArticleRender.DoesNotExist:
+                render = self.get_render()
+        return render.get_summary()
 
     def viewed(self):
         self.views += 1
@@ -157,7 +199,8 @@ class Article(BaseModel):
             logger.info(f'Cache HIT: article comments (id={self.id})')
             return value
         else:
-            comments = self.comment_set.filter(is_enable=True).order_by('-id')
+            # 一次查询取出全部已启用评论及作者，评论树在内存中组装（见 comments.utils.build_comment_tree）
+            comments = list(self.comment_set.filter(is_enable=True).select_related('author').order_by('-id'))
             cache.set(cache_key, comments, CacheTimeout.HOUR_10)
             logger.info(f'Cache MISS: article comments (id={self.id})')
             return comments
@@ -166,13 +209,13 @@ class Article(BaseModel):
         info = (self._meta.app_label, self._meta.model_name)
         return reverse('admin:%s_%s_change' % info, args=(self.pk,))
 
-    @cache_decorator(expiration=CacheTimeout.HOUR_10)
+    @cache_decorator(expiration=CacheTimeout.HOUR_10, tags=lambda article: [cache_tags.ARTICLE_LIST])
     def next_article(self):
         # 下一篇
         return Article.objects.filter(
             id__gt=self.id, status='p').order_by('id').first()
 
-    @cache_decorator(expiration=CacheTimeout.HOUR_10)
+    @cache_decorator(expiration=CacheTimeout.HOUR_10, tags=lambda article: [cache_tags.ARTICLE_LIST])
     def prev_article(self):
         # 前一篇
         return Article.objects.filter(id__lt=self.id, status='p').first()
@@ -182,10 +225,169 @@ class Article(BaseModel):
         Get the first image url from article.body.
         :return:
         """
-        match = re.search(r'!\[.*?\]\((.+?)\)', self.body)
-        if match:
-            return match.group(1)
-        return ""
+        return self.get_render().first_image_url
+
+
+class ArticleRender(models.Model):
+    """文章正文渲染结果"""
+    article = models.OneToOneField(
+        Article,
+        verbose_name=_('article'),
+        primary_key=True,
+        related_name='rendered',
+        on_delete=models.CASCADE)
+    content_hash = models.CharField(_('content hash'), max_length=64)
+    html = models.TextField(_('html'), blank=True, default='')
+    toc = models.TextField(_('toc'), blank=True, default='')
+    plain_text = models.TextField(_('plain text'), blank=True, default='')
+    summary = models.TextField(_('summary'), blank=True, default='')
+    # 生成摘要时使用的 BlogSettings.article_sub_length，配置变化后摘要重新生成
+    summary_length = models.IntegerField(_('summary length'), default=0)
+    # 文本统计：SEO描述、阅读时间等直接读取，不再各自解析HTML
+    word_count = models.IntegerField(_('word count'), default=0)
+    cjk_count = models.IntegerField(_('cjk character count'), default=0)
+    reading_minutes = models.IntegerField(_('reading minutes'), default=1)
+    first_image_url = models.CharField(_('first image url'), max_length=2000, blank=True, default='')
+    description = models.CharField(_('description'), max_length=300, blank=True, default='')
+    last_modify_time = models.DateTimeField(_('modify time'), default=now)
+
+    # 中文字符或连续的非中文字符（视为单词）
+    WORD_PATTERN = re.compile(r'[\u4e00-\u9fa5]|\w+')
+    CJK_PATTERN = re.compile(r'[\u4e00-\u9fa5]')
+    IMAGE_PATTERN = re.compile(r'!\[.*?\]\((.+?)\)')
+    # 平均每分钟阅读字数
+    READING_SPEED = 200
+    DESCRIPTION_LENGTH = 150
+
+    # 渲染后需要持久化的字段
+    RENDER_FIELDS = (
+        'content_hash', 'html', 'toc', 'plain_text', 'summary', 'summary_length',
+        'word_count', 'cjk_count', 'reading_minutes', 'first_image_url', 'description',
+    )
+
+    class Meta:
+        verbose_name = _('article render')
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f'{self.article_id}:{self.content_hash[:8]}'
+
+    @staticmethod
+    def to_plain_text(html):
+        from django.utils.html import strip_tags
+        # 规范化空白字符
+        return ' '.join(strip_tags(html).split())
+
+    @classmethod
+    def get_reading_minutes(cls, word_count):
+        # 阅读时间少于1分钟时按1分钟计算
+        return max(1, math.ceil(word_count / cls.READING_SPEED))
+
+    @staticmethod
+    def get_summary_length():
+        from djangoblog.utils import get_blog_setting
+        return get_blog_setting().article_sub_length
+
+    @staticmethod
+    def to_summary(html, length):
+        from django.template.defaultfilters import truncatechars_html
+        # 使用truncatechars_html保留HTML标签结构，正确截断HTML内容
+        return truncatechars_html(html, length)
+
+    def get_summary(self, length=None):
+        """
+        获取摘要，摘要长度配置变化时基于已渲染的HTML重新生成，无需读取正文
+        """
+        length = length or self.get_summary_length()
+        if self.summary_length != length:
+            self.summary = self.to_summary(self.html, length)
+            self.summary_length = length
+            if self.article_id is not None:
+                ArticleRender.objects.filter(article_id=self.article_id).update(
+                    summary=self.summary, summary_length=length)
+        return self.summary
+
+    @classmethod
+    def rebuild_summaries(cls, length=None, batch_size=200):
+        """
+        摘要长度配置变化后批量重新生成摘要（BlogSettings 保存时调用），
+        列表页延迟加载 html，否则每篇文章都要在 get_summary 中单独查询一次 html
+        :return: 更新的数量
+        """
+        length = length or cls.get_summary_length()
+        renders = cls.objects.exclude(summary_length=length).only('article_id', 'html')
+        updated = 0
+        batch = []
+        for render in renders.iterator(chunk_size=batch_size):
+            render.summary = cls.to_summary(render.html, length)
+            render.summary_length = length
+            batch.append(render)
+            if len(batch) >= batch_size:
+                updated += cls.objects.bulk_update(batch, ['summary', 'summary_length'])
+                batch = []
+        if batch:
+            updated += cls.objects.bulk_update(batch, ['summary', 'summary_length'])
+        if updated:
+            logger.info(f'Rebuilt {updated} article summaries (length={length})')
+        return updated
+
+    @classmethod
+    def build(cls, article_id, body, content_hash=None):
+        """
+        渲染正文，返回未保存的渲染结果
+        """
+        from django.utils.text import Truncator
+        html, toc = CommonMarkdown.get_markdown_with_toc_incremental(body)
+        summary_length = cls.get_summary_length()
+        plain_text = cls.to_plain_text(html)
+        word_count = len(cls.WORD_PATTERN.findall(plain_text))
+        image = cls.IMAGE_PATTERN.search(body or '')
+        return cls(
+            article_id=article_id,
+            content_hash=content_hash or CommonMarkdown.get_content_hash(body),
+            html=html,
+            toc=toc,
+            plain_text=plain_text,
+            summary=cls.to_summary(html, summary_length),
+            summary_length=summary_length,
+            word_count=word_count,
+            cjk_count=len(cls.CJK_PATTERN.findall(plain_text)),
+            reading_minutes=cls.get_reading_minutes(word_count),
+            first_image_url=image.group(1)[:2000] if image else '',
+            description=Truncator(plain_text).chars(cls.DESCRIPTION_LENGTH, truncate='...'))
+
+    @classmethod
+    def get_or_render(cls, article_id, body, content_hash=None, save=True):
+        """
+        读取持久化的渲染结果，不存在或内容哈希不一致时重新渲染并保存
+        :param article_id: 文章id，为空时（未保存的文章）只渲染不持久化
+        :param body: 文章正文
+        :param content_hash: 正文哈希，调用方已计算时可直接传入
+        :param save: 是否保存重新渲染的结果；正文不是来自数据库（如搜索索引中的正文）时必须为 False，
+                     否则过期的正文会覆盖文章的渲染结果
+        """
+        content_hash = content_hash or CommonMarkdown.get_content_hash(body)
+        if article_id is None:
+            return cls.build(None, body, content_hash)
+
+        render = cls.objects.filter(article_id=article_id).first()
+        if render and render.content_hash == content_hash:
+            return render
+
+        logger.info(f'Render MISS: article body (id={article_id})')
+        render = cls.build(article_id, body, content_hash)
+        if not save:
+            return render
+        try:
+            render, created = cls.objects.update_or_create(
+                article_id=article_id,
+                defaults=dict(
+                    {name: getattr(render, name) for name in cls.RENDER_FIELDS},
+                    last_modify_time=now()))
+        except DatabaseError as e:
+            # 文章已被删除（如搜索索引未同步）时只返回渲染结果
+            logger.warning(f'Failed to save article render (id={article_id}): {e}')
+        return render
 
 
 class Category(BaseModel):
@@ -199,6 +401,10 @@ class Category(BaseModel):
         on_delete=models.CASCADE)
     slug = models.SlugField(default='no-slug', max_length=60, blank=True)
     index = models.IntegerField(default=0, verbose_name=_('index'))
+    # 物化路径：从顶级分类到自身的id，如 /1/5/9/，子树查询为一次前缀匹配
+    path = models.CharField(_('path'), max_length=255, default='', db_index=True, editable=False)
+
+    PATH_SEPARATOR = '/'
 
     class Meta:
         ordering = ['-index']
@@ -210,51 +416,90 @@ class Category(BaseModel):
             'blog:category_detail', kwargs={
                 'category_name': self.slug})
 
+    def _get_parent_path(self):
+        if not self.parent_category_id:
+            return self.PATH_SEPARATOR
+        parent_path = Category.objects.filter(pk=self.parent_category_id).values_list('path', flat=True).first()
+        return parent_path or self.PATH_SEPARATOR
+
+    def _is_descendant_path(self, path):
+        return self.pk is not None and f'{self.PATH_SEPARATOR}{self.pk}{self.PATH_SEPARATOR}' in path
+
+    def clean(self):
+        if self.parent_category_id and self._is_descendant_path(self._get_parent_path()):
+            raise ValidationError(_('A category cannot be moved under itself or its subcategories'))
+
+    def save(self, *args, **kwargs):
+        """保存时维护物化路径，移动分类时同时更新所有子分类的路径"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent_category' not in update_fields:
+            return super().save(*args, **kwargs)
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'path'}
+
+        parent_path = self._get_parent_path()
+        if self._is_descendant_path(parent_path):
+            raise ValidationError(_('A category cannot be moved under itself or its subcategories'))
+
+        with transaction.atomic():
+            old_path = None
+            if self.pk is not None:
+                old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+                self.path = f'{parent_path}{self.pk}{self.PATH_SEPARATOR}'
+            super().save(*args, **kwargs)
+            new_path = f'{parent_path}{self.pk}{self.PATH_SEPARATOR}'
+            if self.path != new_path:
+                # 新建的分类保存后才有id
+                self.path = new_path
+                Category.objects.filter(pk=self.pk).update(path=new_path)
+            if old_path and old_path != new_path:
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1)))
+
+    def get_ancestor_ids(self):
+        """从顶级分类到自身的id"""
+        return [int(pk) for pk in self.path.split(self.PATH_SEPARATOR) if pk]
+
+    def get_subtree_filter(self, prefix=''):
+        """
+        自身及所有子分类的查询条件，如 Article.objects.filter(category.get_subtree_filter('category__'))
+        路径缺失（尚未回填）时退回到按id过滤
+        """
+        if self.path:
+            return Q(**{f'{prefix}path__startswith': self.path})
+        return Q(**{f'{prefix}id__in': self.get_sub_category_ids()})
+
     def __str__(self):
         return self.name
 
-    @cache_decorator(CacheTimeout.HOUR_10)
     def get_category_tree(self):
         """
-        递归获得分类目录的父级
+        获得分类目录及其所有上级，从自身到顶级分类
         :return:
         """
-        categorys = []
-
-        def parse(category):
-            categorys.append(category)
-            if category.parent_category:
-                parse(category.parent_category)
-
-        parse(self)
-        return categorys
+        if self.pk is None:
+            parent = self.parent_category
+            return [self] + (parent.get_category_tree() if parent else [])
+        return category_forest.get_forest(require=self.pk).get_ancestors(self.pk)
 
-    @cache_decorator(CacheTimeout.HOUR_10)
     def get_sub_categorys(self):
         """
-        获得当前分类目录所有子集
+        获得当前分类目录及其所有子集
         :return:
         """
-        categorys = []
-        all_categorys = Category.objects.all()
+        return category_forest.get_forest(require=self.pk).get_descendants(self.pk)
 
-        def parse(category):
-            if category not in categorys:
-                categorys.append(category)
-            childs = all_categorys.filter(parent_category=category)
-            for child in childs:
-                if category not in categorys:
-                    categorys.append(child)
-                parse(child)
-
-        parse(self)
-        return categorys
+    def get_sub_category_ids(self):
+        """当前分类目录及其所有子集的id"""
+        return category_forest.get_forest(require=self.pk).get_descendant_ids(self.pk)
 
 
 class Tag(BaseModel):
     """文章标签"""
     name = models.CharField(_('tag name'), max_length=30, unique=True)
     slug = models.SlugField(default='no-slug', max_length=60, blank=True)
+    # 已发布文章数，由信号维护（见 djangoblog.blog_signals），reconcile_tag_counts 命令修复偏差
+    article_count = models.PositiveIntegerField(_('article count'), default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -262,14 +507,39 @@ class Tag(BaseModel):
     def get_absolute_url(self):
         return reverse('blog:tag_detail', kwargs={'tag_name': self.slug})
 
-    @cache_decorator(CacheTimeout.HOUR_10)
     def get_article_count(self):
-        return Article.objects.filter(tags__name=self.name).distinct().count()
+        return self.article_count
+
+    @staticmethod
+    def count_articles_subquery():
+        """每个标签已发布文章数的子查询，与标签页列出的文章一致"""
+        counts = Article.tags.through.objects.filter(
+            tag_id=OuterRef('pk'), article__status='p', article__type='a'
+        ).order_by().values('tag_id').annotate(count=Count('article_id')).values('count')
+        return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+    @classmethod
+    def update_article_counts(cls, tag_ids=None):
+        """
+        重新计算标签的文章数，一条 UPDATE 语句完成
+        :param tag_ids: 需要更新的标签id，None 表示全部
+        """
+        queryset = cls.objects.all()
+        if tag_ids is not None:
+            tag_ids = [tag_id for tag_id in tag_ids if tag_id]
+            if not tag_ids:
+                return 0
+            queryset = queryset.filter(pk__in=tag_ids)
+        return queryset.update(article_count=cls.count_articles_subquery())
 
     class Meta:
         ordering = ['name']
         verbose_name = _('tag')
         verbose_name_plural = verbose_name
+        indexes = [
+            # 优化标签云查询：按文章数取前N个
+            models.Index(fields=['-article_count', 'name'], name='idx_tag_count_name'),
+        ]
 
 
 class Links(models.Model):
@@ -401,5 +671,7 @@ class BlogSettings(models.Model):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        from djangoblog.utils import cache
-        cache.clear()
+        from djangoblog.utils import delete_blog_setting_cache
+        delete_blog_setting_cache()
+        # 摘要长度变化时一次更新所有摘要，只有长度不一致的记录会被读取
+        ArticleRender.rebuild_summaries(self.article_sub_length)
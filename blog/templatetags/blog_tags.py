@@ -13,9 +13,12 @@ from django.templatetags.static import static
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from blog import category_forest
 from blog.models import Article, Category, Tag, Links, SideBar, LinkShowType
 from comments.models import Comment
-from djangoblog.utils import CommonMarkdown, sanitize_html
+from djangoblog import cache_namespace, page_holes
+from djangoblog.near_cache import near_cache
+from djangoblog.utils import CommonMarkdown, render_comment_html
 from djangoblog.utils import cache
 from djangoblog.utils import get_current_site
 from oauth.models import OAuthUser
@@ -69,7 +72,7 @@ def custom_markdown(content):
 @register.filter()
 @stringfilter
 def sidebar_markdown(content):
-    html_content = CommonMarkdown.get_markdown(content)
+    html_content = CommonMarkdown.get_markdown_lite(content)
     return mark_safe(html_content)
 
 
@@ -83,23 +86,21 @@ def render_article_content(context, article, is_summary=False):
         article: 文章对象
         is_summary: 是否为摘要模式（首页使用）
     """
-    if not article or not hasattr(article, 'body'):
+    if not article:
         return ''
-    
-    # 先转换Markdown为HTML
-    html_content = CommonMarkdown.get_markdown(article.body)
-    
-    # 如果是摘要模式，先截断内容再应用插件
-    if is_summary:
-        # 从配置中获取摘要长度
-        from djangoblog.utils import get_blog_setting
-        from django.template.defaultfilters import truncatechars_html
 
-        blogsetting = get_blog_setting()
-        summary_length = blogsetting.article_sub_length
-
-        # 使用truncatechars_html保留HTML标签结构，正确截断HTML内容
-        html_content = truncatechars_html(html_content, summary_length)
+    # 读取预渲染的HTML，正文未变化时不再重复转换Markdown
+    # 摘要模式直接读取预生成的摘要，列表页不需要渲染和截断全文（也不加载正文）
+    if isinstance(article, Article):
+        html_content = article.get_summary() if is_summary else article.get_render().html
+    elif not hasattr(article, 'body'):
+        return ''
+    else:
+        html_content = CommonMarkdown.get_markdown(article.body)
+        if is_summary:
+            from django.template.defaultfilters import truncatechars_html
+            from djangoblog.utils import get_blog_setting
+            html_content = truncatechars_html(html_content, get_blog_setting().article_sub_length)
     
     # 然后应用插件过滤器，传递完整的上下文
     from djangoblog.plugin_manage import hooks
@@ -134,6 +135,15 @@ def get_markdown_toc(content):
     return mark_safe(toc)
 
 
+@register.simple_tag
+def get_article_toc(article):
+    """
+    获取文章目录（读取预渲染结果）
+    用法: {% get_article_toc article as toc %}
+    """
+    return mark_safe(article.get_render().toc)
+
+
 @register.simple_tag
 def current_nav_item(request):
     """Determine the active navigation item based on the current URL path."""
@@ -151,11 +161,22 @@ def current_nav_item(request):
     return ''
 
 
+@register.simple_tag(takes_context=True)
+def page_hole(context, name, **kwargs):
+    """
+    与用户相关的页面片段（见 djangoblog.page_holes）
+    用法: {% page_hole 'comment_reply' comment_id=comment_item.pk %}
+    """
+    request = getattr(context, 'request', None)
+    if request is not None and page_holes.is_enabled(request):
+        return page_holes.render_marker(name, **kwargs)
+    return page_holes.render_inline(name, context, **kwargs)
+
+
 @register.filter()
 @stringfilter
 def comment_markdown(content):
-    content = CommonMarkdown.get_markdown(content)
-    return mark_safe(sanitize_html(content))
+    return mark_safe(render_comment_html(content))
 
 
 @register.filter(is_safe=True)
@@ -175,7 +196,10 @@ def get_reactions_for_user(comment, user):
     """
     获取评论的 reactions 数据（过滤器方式）
     用法: {{ comment|get_reactions_for_user:user }}
+    页面上的评论已通过 comments.utils.attach_reactions 批量加载时直接使用
     """
+    if hasattr(comment, 'reactions_summary'):
+        return comment.reactions_summary
     try:
         return comment.get_reactions_summary(user if user.is_authenticated else None)
     except Exception as e:
@@ -254,12 +278,19 @@ def load_sidebar(user, linktype):
     加载侧边栏
     :return:
     """
-    value = cache.get("sidebar" + linktype)
+    value = near_cache.get('sidebar' + linktype)
+    if value is None:
+        key = cache_namespace.make_key(cache_namespace.SIDEBAR, linktype)
+        value = cache.get(key)
+        near_cache.set('sidebar' + linktype, value)
     if value:
+        # 近端缓存的值在线程间共享，复制后再加入当前用户
+        value = dict(value)
         value['user'] = user
         return value
     else:
         logger.info('load sidebar')
+        key = cache_namespace.make_key(cache_namespace.SIDEBAR, linktype)
         from djangoblog.utils import get_blog_setting
         blogsetting = get_blog_setting()
 
@@ -288,20 +319,14 @@ def load_sidebar(user, linktype):
 
         commment_list = Comment.objects.filter(
             is_enable=True
-        ).select_related('author').order_by('-id')[:blogsetting.sidebar_comment_count]
-        # 标签云 — 按文章数排序，取 top 20，size = (count/avg)*5+10
+        ).select_related('author', 'article').order_by('-id')[:blogsetting.sidebar_comment_count]
+        # 标签云 — 按维护的文章数取 top 20（一次索引查询），size = (count/avg)*5+10
         increment = 5
-        tags = Tag.objects.all()
+        top_tags = list(Tag.objects.filter(article_count__gt=0).order_by('-article_count', 'name')[:20])
         sidebar_tags = None
-        if tags and len(tags) > 0:
-            s = sorted(
-                [t for t in [(t, t.get_article_count()) for t in tags] if t[1]],
-                key=lambda x: x[1], reverse=True
-            )[:20]
-            count = sum([t[1] for t in s])
-            dd = 1 if (count == 0 or not len(s)) else count / len(s)
-            sidebar_tags = list(
-                map(lambda x: (x[0], x[1], (x[1] / dd) * increment + 10), s))
+        if top_tags:
+            dd = sum(t.article_count for t in top_tags) / len(top_tags)
+            sidebar_tags = [(t, t.article_count, (t.article_count / dd) * increment + 10) for t in top_tags]
 
         value = {
             'recent_articles': recent_articles,
@@ -317,8 +342,8 @@ def load_sidebar(user, linktype):
             'sidebar_tags': sidebar_tags,
             'extra_sidebars': extra_sidebars
         }
-        cache.set("sidebar" + linktype, value, 60 * 60 * 60 * 3)
-        logger.info('set sidebar cache.key:{key}'.format(key="sidebar" + linktype))
+        cache.set(key, value, 60 * 60 * 60 * 3)
+        logger.info('set sidebar cache.key:{key}'.format(key=key))
         value['user'] = user
         return value
 
@@ -572,6 +597,20 @@ def query(qs, **kwargs):
     return qs.filter(**kwargs)
 
 
+@register.simple_tag
+def category_children(category=None):
+    """ 分类的直接子分类，不传分类时返回顶级分类，数据来自进程内的分类森林。Usage:
+          {% category_children category as children %}
+    """
+    return category_forest.get_forest().get_children(category.pk if category else None)
+
+
+@register.filter
+def get_item(mapping, key):
+    """按键读取字典中的值，不存在时返回 None"""
+    return mapping.get(key) if mapping else None
+
+
 @register.filter
 def addstr(arg1, arg2):
     """concatenate arg1 & arg2"""
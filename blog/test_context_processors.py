@@ -9,6 +9,7 @@ from django.utils import timezone
 from accounts.models import BlogUser
 from blog.context_processors import seo_processor
 from blog.models import Category, Article
+from djangoblog import cache_namespace
 from djangoblog.utils import cache
 
 
@@ -89,7 +90,7 @@ class SeoProcessorTest(TestCase):
         result1 = seo_processor(request)
 
         # 验证缓存已设置
-        cached_value = cache.get('seo_processor')
+        cached_value = cache.get(cache_namespace.make_key(cache_namespace.SEO, 'seo_processor'))
         self.assertIsNotNone(cached_value)
 
         # 第二次调用 - 应该从缓存获取
@@ -192,7 +193,7 @@ class SeoProcessorTest(TestCase):
         result1 = seo_processor(request)
 
         # 手动删除缓存模拟过期
-        cache.delete('seo_processor')
+        cache_namespace.bump(cache_namespace.SEO)
 
         # 第二次调用应该重新生成缓存
         result2 = seo_processor(request)
@@ -1,14 +1,22 @@
 """
 Test cases for blog middleware
 """
+import gzip
 import time
+from io import StringIO
 from unittest.mock import Mock, patch, MagicMock
 
-from django.test import TestCase, RequestFactory
+from django.core.management import call_command
+from django.test import TestCase, RequestFactory, override_settings
 from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
 
 from blog.middleware import OnlineMiddleware
+from blog.models import Article
+from comments.models import Comment
+from djangoblog.test_base import BaseTestCase
+from djangoblog.utils import cache
 
 
 class OnlineMiddlewareTest(TestCase):
@@ -280,3 +288,220 @@ class OnlineMiddlewareTest(TestCase):
         if mock_create.called:
             call_args = mock_create.call_args[1]
             self.assertEqual(call_args['log_datetime'], mock_time)
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheMiddlewareTest(BaseTestCase):
+    """测试匿名访问的整页缓存"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_anonymous_page_served_from_cache(self):
+        url = self.article.get_absolute_url()
+        first = self.client.get(url)
+        self.assertFalse(first.has_header('X-Page-Cache'))
+        second = self.client.get(url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+    def test_compressed_response(self):
+        url = reverse('blog:index')
+        first = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), first.content)
+
+    def test_shared_page_fills_user_fragments(self):
+        url = self.article.get_absolute_url()
+        self.client.get(url)
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertNotIn(b'page-hole', response.content)
+        self.assertIn(b'data-authenticated="true"', response.content)
+        self.assertIn(reverse('account:logout').encode(), response.content)
+        self.assertIn(b'id="commentform"', response.content)
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_filled_fragments_use_context_processors(self):
+        self.blog_settings.comment_need_review = True
+        self.blog_settings.save()
+        url = self.article.get_absolute_url()
+        self.client.login(username='testuser', password='testpass123')
+        miss = self.client.get(url)
+        self.assertFalse(miss.has_header('X-Page-Cache'))
+        self.assertContains(miss, '审核后显示')
+        hit = self.client.get(url)
+        self.assertEqual(hit['X-Page-Cache'], 'HIT')
+        self.assertContains(hit, '审核后显示')
+
+    def test_logged_in_user_bypasses_unshared_page(self):
+        url = reverse('blog:links')
+        self.client.get(url)
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertTrue(response.context['user'].is_authenticated)
+
+    def test_cached_page_keeps_inner_middleware_headers(self):
+        url = self.article.get_absolute_url()
+        first = self.client.get(url)
+        self.assertEqual(first['X-Frame-Options'], 'SAMEORIGIN')
+        second = self.client.get(url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second['X-Frame-Options'], 'SAMEORIGIN')
+
+    def test_cached_page_measures_load_time_per_request(self):
+        from blog.middleware import PageCacheMiddleware
+        middleware = PageCacheMiddleware(lambda request: HttpResponse('<p><!!LOAD_TIMES!!></p>'))
+        factory = RequestFactory()
+        with patch('blog.middleware.time.perf_counter', side_effect=[100.0, 101.0, 200.0, 203.0]):
+            first = middleware(factory.get('/load-times/'))
+            second = middleware(factory.get('/load-times/'))
+        self.assertEqual(first.content, b'<p>1.0</p>')
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, b'<p>3.0</p>')
+
+    def test_cached_page_records_view(self):
+        url = self.article.get_absolute_url()
+        self.client.get(url)
+        self.client.get(url)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 2)
+
+    def test_cached_page_answers_conditional_get(self):
+        for url in (reverse('blog:index'), self.article.get_absolute_url()):
+            etag = self.client.get(url)['ETag']
+            hit = self.client.get(url)
+            self.assertEqual(hit['X-Page-Cache'], 'HIT')
+            self.assertEqual(hit['ETag'], etag)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    def test_encodings_share_weak_etag(self):
+        url = reverse('blog:index')
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        identity = self.client.get(url)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertEqual(compressed['ETag'], etag)
+        self.assertEqual(identity['ETag'], etag)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_records_view(self):
+        url = self.article.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        with self.settings(PAGE_CACHE_ENABLED=False):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 3)
+
+    def test_csrf_page_not_cached(self):
+        url = reverse('account:login')
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_article_change_invalidates_page(self):
+        url = self.article.get_absolute_url()
+        self.client.get(url)
+        self.article.title = '整页缓存新标题'
+        self.article.save()
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, '整页缓存新标题')
+
+    def test_comment_status_change_invalidates_page(self):
+        from blog.admin import close_article_commentstatus
+        from comments.admin import disable_commentstatus, enable_commentstatus
+        comment = self.create_comment(self.article, self.user, body='整页缓存中的评论')
+        comment.is_enable = True
+        comment.save()
+        url = self.article.get_absolute_url()
+
+        def assert_refreshed(contains):
+            response = self.client.get(url)
+            self.assertFalse(response.has_header('X-Page-Cache'))
+            if contains:
+                self.assertContains(response, '整页缓存中的评论')
+            else:
+                self.assertNotContains(response, '整页缓存中的评论')
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+        assert_refreshed(True)
+        comment.is_enable = False
+        comment.save()
+        assert_refreshed(False)
+        enable_commentstatus(None, None, Comment.objects.filter(pk=comment.pk))
+        assert_refreshed(True)
+        disable_commentstatus(None, None, Comment.objects.filter(pk=comment.pk))
+        assert_refreshed(False)
+        close_article_commentstatus(None, None, Article.objects.filter(pk=self.article.pk))
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertNotContains(response, 'id="commentform"')
+
+    def test_comment_keeps_unrelated_pages_cached(self):
+        other = self.create_article(title='无关文章', category=self.create_category('无关分类'))
+        url = other.get_absolute_url()
+        self.client.get(url)
+        comment = self.create_comment(self.article, self.user, body='另一篇文章的评论')
+        comment.is_enable = True
+        comment.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        # 侧边栏按请求渲染，显示最新评论
+        self.assertContains(response, '另一篇文章的评论')
+        self.assertFalse(self.client.get(self.article.get_absolute_url()).has_header('X-Page-Cache'))
+
+    def test_category_change_invalidates_pages_showing_it(self):
+        other = self.create_article(title='无关文章', category=self.create_category('无关分类'))
+        urls = [self.article.get_absolute_url(), reverse('blog:index'), other.get_absolute_url()]
+        for url in urls:
+            self.client.get(url)
+        self.category.name = '改名后的分类'
+        self.category.save()
+        for url in urls[:2]:
+            response = self.client.get(url)
+            self.assertFalse(response.has_header('X-Page-Cache'))
+            self.assertContains(response, '改名后的分类')
+        self.assertEqual(self.client.get(urls[2])['X-Page-Cache'], 'HIT')
+
+    def test_settings_change_invalidates_all_pages(self):
+        urls = [self.article.get_absolute_url(), reverse('blog:index'), reverse('blog:links')]
+        for url in urls:
+            self.client.get(url)
+        self.blog_settings.site_name = '新的站点名称'
+        self.blog_settings.save()
+        for url in urls:
+            response = self.client.get(url)
+            self.assertFalse(response.has_header('X-Page-Cache'))
+            self.assertContains(response, '新的站点名称')
+
+    def test_forged_warm_header_still_records_view(self):
+        url = self.article.get_absolute_url()
+        self.client.get(url, headers={'X-Cache-Warm': '1'})
+        self.client.get(url, headers={'X-Cache-Warm': '1'})
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 2)
+
+    def test_warm_cache_command(self):
+        out = StringIO()
+        call_command('warm_cache', concurrency=1, host='testserver', stdout=out)
+        self.assertIn('hit ratio 0.0%', out.getvalue())
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 0)
+
+        response = self.client.get(self.article.get_absolute_url())
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        out = StringIO()
+        call_command('warm_cache', concurrency=1, host='testserver', stdout=out)
+        self.assertIn('hit ratio 100.0%', out.getvalue())
@@ -77,6 +77,72 @@ class ArticleViewTest(BaseTestCase, ViewTestMixin):
         response = self.client.get(url, {'page': 2})
         self.assertEqual(response.status_code, 200)
 
+    def test_index_caches_single_page(self):
+        """测试首页缓存只保存当前页数据和总数"""
+        from django.conf import settings
+        from djangoblog import cache_namespace, cache_tags
+        from djangoblog.mixins import CachedPageList
+        from djangoblog.utils import cache
+        for i in range(settings.PAGINATE_BY + 2):
+            self.create_article(title=f'分页文章{i}')
+        cache.clear()
+        total = Article.objects.filter(type='a', status='p').count()
+
+        response = self.client.get(reverse('blog:index'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        value = cache_tags.get_tagged(cache_namespace.make_key(cache_namespace.INDEX, 'index_2'))
+        self.assertIsInstance(value, CachedPageList)
+        self.assertEqual(value.count(), total)
+        self.assertEqual(len(value.rows), total - settings.PAGINATE_BY)
+        self.assertEqual(response.context['paginator'].count, total)
+
+    def test_list_pages_invalidated_by_dependencies(self):
+        """测试文章修改后依赖它的所有分页缓存失效"""
+        from django.conf import settings
+        from blog.models import Category
+        from djangoblog.utils import cache
+        child = Category.objects.create(name='子分类', parent_category=self.category)
+        for i in range(settings.PAGINATE_BY):
+            self.create_article(title=f'分页文章{i}')
+        cache.clear()
+
+        self.client.get(reverse('blog:index'), {'page': 2})
+        self.client.get(self.category.get_absolute_url())
+        self.create_article(title='子分类新文章', category=child)
+
+        response = self.client.get(reverse('blog:index'), {'page': 2})
+        self.assertContains(response, '分页文章0')
+        response = self.client.get(self.category.get_absolute_url())
+        self.assertContains(response, '子分类新文章')
+
+    def test_article_edit_invalidates_tag_list(self):
+        """测试修改文章标题后标签列表更新"""
+        self.article.tags.add(self.tag)
+        self.client.get(self.tag.get_absolute_url())
+        self.article.title = '修改后的标题'
+        self.article.save()
+        self.assertContains(self.client.get(self.tag.get_absolute_url()), '修改后的标题')
+
+    def test_list_views_do_not_load_body(self):
+        """测试列表页不加载文章正文"""
+        self.article.tags.add(self.tag)
+        urls = [
+            reverse('blog:index'),
+            reverse('blog:archives'),
+            self.category.get_absolute_url(),
+            self.tag.get_absolute_url(),
+            self.user.get_absolute_url(),
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.assertNoLogs('blog.models', level='WARNING'):
+                self.assert_view_success(url)
+
+    def test_deferred_body_access_is_flagged(self):
+        """测试访问被延迟加载的正文时记录警告"""
+        article = Article.objects.defer('body').get(pk=self.article.pk)
+        with self.assertLogs('blog.models', level='WARNING'):
+            self.assertEqual(article.body, self.article.body)
+
     def test_category_view(self):
         """测试分类页"""
         url = self.category.get_absolute_url()
@@ -109,6 +175,55 @@ class ArticleViewTest(BaseTestCase, ViewTestMixin):
         self.assertContains(response, self.user.username)
 
 
+class ConditionalGetTest(BaseTestCase, ViewTestMixin):
+    """测试视图执行前的 ETag 计算"""
+
+    def test_detail_not_modified(self):
+        url = self.article.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIsNone(response.context)
+
+    def test_detail_etag_changes_with_content(self):
+        url = self.article.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        self.create_comment()
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+        etag = self.client.get(url)['ETag']
+        self.article.title = '修改后的标题'
+        self.article.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_etag_ignores_other_articles(self):
+        other = self.create_article(title='另一篇文章')
+        url = self.article.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.create_comment(article=other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_detail_etag_depends_on_user(self):
+        url = self.article.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_not_modified(self):
+        url = reverse('blog:index')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.create_article(title='新文章')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed_not_modified(self):
+        response = self.client.get('/feed/')
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get('/feed/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
 class SearchViewTest(BaseTestCase, ViewTestMixin):
     """测试搜索功能"""
 
@@ -151,6 +266,27 @@ class ArticlePermissionTest(BaseTestCase, ViewTestMixin):
         self.assertIn(response.status_code, [200, 302, 404])
 
 
+class CleanCacheViewTest(BaseTestCase, ViewTestMixin):
+    """测试按范围清理缓存接口"""
+
+    def test_requires_superuser(self):
+        response = self.client.get(reverse('blog:clean'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_scoped_purge(self):
+        from djangoblog.utils import cache
+        cache.set('verify_code', '123456')
+        self.client.login(username='admin', password='admin123')
+        response = self.client.get(reverse('blog:clean'), {
+            'article': self.article.pk, 'namespace': 'sidebar'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'namespaces:')
+        self.assertEqual(cache.get('verify_code'), '123456')
+
+        response = self.client.get(reverse('blog:clean'), {'namespace': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+
+
 class ErrorHandlingTest(BaseTestCase, ViewTestMixin):
     """测试错误处理"""
 
@@ -176,6 +312,24 @@ class ErrorHandlingTest(BaseTestCase, ViewTestMixin):
         # 应该返回第一页或错误页
         self.assertIn(response.status_code, [200, 404])
 
+    def test_last_page(self):
+        """测试 page=last 返回最后一页"""
+        from django.test import override_settings
+        for i in range(12):
+            self.create_article(title=f'最后一页测试{i}')
+        url = reverse('blog:index')
+        with override_settings(PAGE_CACHE_ENABLED=False):
+            response = self.client.get(url, {'page': 'last'})
+            self.assertEqual(response.status_code, 200)
+            page_obj = response.context['page_obj']
+            self.assertGreater(page_obj.paginator.num_pages, 1)
+            self.assertEqual(page_obj.number, page_obj.paginator.num_pages)
+            self.assertTrue(page_obj.object_list)
+            # 再次访问命中列表缓存
+            self.assertEqual(
+                list(self.client.get(url, {'page': 'last'}).context['page_obj'].object_list),
+                list(page_obj.object_list))
+
     def test_page_out_of_range(self):
         """测试页码超出范围"""
         url = reverse('blog:index')
@@ -228,6 +228,7 @@ class ArticleTest(TestCase):
         call_command("ping_baidu", "all")
         call_command("create_testdata")
         call_command("clear_cache")
+        call_command("clear_cache", namespace=["content"], author=[user.username])
         call_command("sync_user_avatar")
         call_command("build_search_words")
 
@@ -303,3 +304,234 @@ class SearchHighlightTest(TestCase):
         text = "欢迎使用DjangoBlog系统"
         result = highlight_search_term(text, "Django")
         self.assertIn("<mark>Django</mark>", result)
+
+
+class ArticleRenderTest(TestCase):
+    """测试文章正文预渲染结果的持久化与失效"""
+
+    def setUp(self):
+        self.user = BlogUser.objects.create_user(
+            username='render_user', email='render@test.com', password='render123')
+        self.category = Category.objects.create(name='render_category')
+
+    def create_article(self, body):
+        return Article.objects.create(
+            title='render title', body=body, author=self.user,
+            category=self.category, type='a', status='p')
+
+    def test_render_populated_on_save(self):
+        from blog.models import ArticleRender
+        article = self.create_article('# 标题\n\n正文**加粗**')
+        render = ArticleRender.objects.get(article_id=article.pk)
+        self.assertIn('<strong>加粗</strong>', render.html)
+        self.assertIn('标题', render.toc)
+        self.assertEqual(render.plain_text, '标题 正文加粗')
+
+    def test_render_refreshed_when_body_changes(self):
+        from blog.models import ArticleRender
+        article = self.create_article('first body')
+        old_hash = ArticleRender.objects.get(article_id=article.pk).content_hash
+        article.body = 'second body'
+        article.save()
+        render = ArticleRender.objects.get(article_id=article.pk)
+        self.assertNotEqual(render.content_hash, old_hash)
+        self.assertIn('second body', render.html)
+
+    def test_render_lazily_rebuilt_on_miss(self):
+        from blog.models import ArticleRender
+        article = self.create_article('lazy body')
+        ArticleRender.objects.filter(article_id=article.pk).delete()
+        article = Article.objects.get(pk=article.pk)
+        self.assertIn('lazy body', article.get_render().html)
+        self.assertTrue(ArticleRender.objects.filter(article_id=article.pk).exists())
+
+    def test_render_without_save_keeps_stored_render(self):
+        from blog.models import ArticleRender
+        article = self.create_article('current body')
+        render = ArticleRender.get_or_render(article.pk, 'stale index body', save=False)
+        self.assertIn('stale index body', render.plain_text)
+        stored = ArticleRender.objects.get(article_id=article.pk)
+        self.assertIn('current body', stored.html)
+        self.assertIn('current body', stored.summary)
+
+    def test_views_update_does_not_render(self):
+        from unittest.mock import patch
+        article = self.create_article('views body')
+        with patch('blog.models.CommonMarkdown.get_markdown_with_toc') as mock_render:
+            article.viewed()
+            article.get_render()
+        mock_render.assert_not_called()
+
+    def test_detail_page_uses_render(self):
+        from unittest.mock import patch
+        article = self.create_article('detail **body**')
+        with patch('blog.models.CommonMarkdown.get_markdown_with_toc') as mock_render:
+            response = self.client.get(article.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<strong>body</strong>')
+        mock_render.assert_not_called()
+
+    def test_summary_precomputed_on_save(self):
+        from blog.models import ArticleRender
+        from djangoblog.utils import get_blog_setting
+        article = self.create_article('summary ' * 200)
+        render = ArticleRender.objects.get(article_id=article.pk)
+        self.assertEqual(render.summary_length, get_blog_setting().article_sub_length)
+        self.assertLess(len(render.summary), len(render.html))
+
+    def test_summary_does_not_touch_body(self):
+        from unittest.mock import patch
+        article = self.create_article('list **body**')
+        article = Article.objects.select_related('rendered').defer('body').get(pk=article.pk)
+        with patch('blog.models.CommonMarkdown.get_markdown_with_toc') as mock_render, \
+                self.assertNumQueries(0):
+            summary = article.get_summary()
+        self.assertIn('<strong>body</strong>', summary)
+        mock_render.assert_not_called()
+        self.assertIn('body', article.get_deferred_fields())
+
+    def test_summaries_rebuilt_in_bulk_when_setting_changes(self):
+        from blog.models import ArticleRender
+        from djangoblog.utils import get_blog_setting
+        for i in range(3):
+            Article.objects.create(
+                title=f'summary title {i}', body=f'article {i} ' * 50, author=self.user,
+                category=self.category, type='a', status='p')
+        setting = get_blog_setting()
+        setting.article_sub_length = 20
+        setting.save()
+        self.assertFalse(ArticleRender.objects.exclude(summary_length=20).exists())
+
+        get_blog_setting()
+        articles = list(Article.objects.select_related('rendered').defer('body', 'rendered__html'))
+        with self.assertNumQueries(0):
+            for article in articles:
+                self.assertLessEqual(len(article.get_summary()), 30)
+
+    def test_summary_rebuilt_when_length_changes(self):
+        from blog.models import ArticleRender
+        article = self.create_article('abcdefghij ' * 50)
+        render = ArticleRender.objects.get(article_id=article.pk)
+        render.get_summary(length=20)
+        render = ArticleRender.objects.get(article_id=article.pk)
+        self.assertEqual(render.summary_length, 20)
+        self.assertIn('abcdefghij', render.summary)
+        self.assertLess(len(render.summary), 40)
+
+    def test_text_stats_computed_on_save(self):
+        from blog.models import ArticleRender
+        article = self.create_article('# 标题\n\n![cover](/media/cover.png)\n\nhello world 你好')
+        render = ArticleRender.objects.get(article_id=article.pk)
+        self.assertEqual(render.cjk_count, 4)
+        self.assertEqual(render.word_count, 6)
+        self.assertEqual(render.reading_minutes, 1)
+        self.assertEqual(render.first_image_url, '/media/cover.png')
+        self.assertEqual(render.description, render.plain_text)
+        self.assertEqual(article.get_first_image_url(), '/media/cover.png')
+
+    def test_reading_time_uses_stored_stats(self):
+        from blog.models import ArticleRender
+        from plugins.reading_time.plugin import ReadingTimePlugin
+        article = self.create_article('short body')
+        ArticleRender.objects.filter(article_id=article.pk).update(reading_minutes=42)
+        article = Article.objects.get(pk=article.pk)
+        result = ReadingTimePlugin().add_reading_time('<p>short body</p>', article=article)
+        self.assertIn('42 分钟', result)
+
+
+class CategoryForestTest(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name='根分类')
+        self.child = Category.objects.create(name='子分类', parent_category=self.root)
+        self.grandchild = Category.objects.create(name='孙分类', parent_category=self.child)
+        self.other = Category.objects.create(name='其他分类')
+
+    def test_lookups_served_from_forest(self):
+        self.grandchild.get_category_tree()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.grandchild.get_category_tree(), [self.grandchild, self.child, self.root])
+            self.assertEqual(self.root.get_sub_categorys(), [self.root, self.child, self.grandchild])
+            self.assertEqual(self.child.get_sub_category_ids(), {self.child.pk, self.grandchild.pk})
+
+    def test_category_change_rebuilds_forest(self):
+        self.assertNotIn(self.grandchild.pk, self.other.get_sub_category_ids())
+        self.child.parent_category = self.other
+        self.child.save()
+        self.assertIn(self.grandchild.pk, self.other.get_sub_category_ids())
+        self.assertEqual(self.grandchild.get_category_tree(), [self.grandchild, self.child, self.other])
+
+
+class CategoryPathTest(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name='根分类')
+        self.child = Category.objects.create(name='子分类', parent_category=self.root)
+        self.grandchild = Category.objects.create(name='孙分类', parent_category=self.child)
+        self.other = Category.objects.create(name='其他分类')
+
+    def test_path_maintained_on_create(self):
+        self.assertEqual(self.root.path, f'/{self.root.pk}/')
+        self.assertEqual(self.grandchild.path, f'/{self.root.pk}/{self.child.pk}/{self.grandchild.pk}/')
+        self.assertEqual(self.grandchild.get_ancestor_ids(), [self.root.pk, self.child.pk, self.grandchild.pk])
+
+    def test_move_updates_descendants(self):
+        self.child.parent_category = self.other
+        self.child.save()
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.path, f'/{self.other.pk}/{self.child.pk}/{self.grandchild.pk}/')
+        subtree = Category.objects.filter(self.other.get_subtree_filter())
+        self.assertEqual(set(subtree), {self.other, self.child, self.grandchild})
+        self.assertEqual(list(Category.objects.filter(self.root.get_subtree_filter())), [self.root])
+
+    def test_cannot_move_under_descendant(self):
+        from django.core.exceptions import ValidationError
+        self.root.parent_category = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.root.clean()
+        with self.assertRaises(ValidationError):
+            self.root.save()
+
+    def test_backfill_migration(self):
+        import importlib
+        from django.apps import apps
+        migration = importlib.import_module('blog.migrations.0012_category_path')
+        Category.objects.update(path='')
+        migration.backfill_category_path(apps, None)
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.path, f'/{self.root.pk}/{self.child.pk}/{self.grandchild.pk}/')
+
+
+class TagArticleCountTest(TestCase):
+    def setUp(self):
+        self.user = BlogUser.objects.create_user(username='counter', email='counter@test.com', password='pwd')
+        self.category = Category.objects.create(name='计数分类')
+        self.tag = Tag.objects.create(name='计数标签')
+        self.article = Article.objects.create(
+            title='计数文章', body='body', author=self.user, category=self.category, type='a', status='p')
+
+    def get_count(self):
+        return Tag.objects.get(pk=self.tag.pk).article_count
+
+    def test_counts_follow_tags_and_status(self):
+        self.article.tags.add(self.tag)
+        self.assertEqual(self.get_count(), 1)
+        self.article.status = 'd'
+        self.article.save()
+        self.assertEqual(self.get_count(), 0)
+        self.article.status = 'p'
+        self.article.save()
+        self.assertEqual(self.get_count(), 1)
+        self.article.tags.clear()
+        self.assertEqual(self.get_count(), 0)
+        self.tag.article_set.add(self.article)
+        self.assertEqual(self.get_count(), 1)
+        self.article.delete()
+        self.assertEqual(self.get_count(), 0)
+
+    def test_reconcile_command_repairs_drift(self):
+        from io import StringIO
+        self.article.tags.add(self.tag)
+        Tag.objects.filter(pk=self.tag.pk).update(article_count=7)
+        out = StringIO()
+        call_command('reconcile_tag_counts', stdout=out)
+        self.assertIn('7 -> 1', out.getvalue())
+        self.assertEqual(self.get_count(), 1)
@@ -4,7 +4,7 @@ import uuid
 
 from django.conf import settings
 from django.core.paginator import Paginator
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
 from django.templatetags.static import static
@@ -15,23 +15,27 @@ from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
 from haystack.views import SearchView
 
+from blog import category_forest
 from blog.models import Article, Category, LinkShowType, Links, Tag
 from comments.forms import CommentForm
+from comments.utils import attach_reactions, build_comment_tree, iter_comment_replies
+from djangoblog import cache_namespace, cache_purge, cache_tags, page_holes
 from djangoblog.plugin_manage import hooks
 from djangoblog.plugin_manage.hook_constants import ARTICLE_CONTENT_HOOK_NAME
-from djangoblog.utils import cache, get_blog_setting, get_sha256
+from djangoblog.utils import get_blog_setting, get_sha256
 from djangoblog.mixins import (
     SlugCachedMixin,
     ArticleListMixin,
     OptimizedArticleQueryMixin,
     CachedListViewMixin,
+    ConditionalGetMixin,
     PageNumberMixin
 )
 
 logger = logging.getLogger(__name__)
 
 
-class ArticleListView(CachedListViewMixin, PageNumberMixin, ListView):
+class ArticleListView(ConditionalGetMixin, CachedListViewMixin, PageNumberMixin, ListView):
     """
     文章列表视图基类（重构版）
 
@@ -49,10 +53,38 @@ class ArticleListView(CachedListViewMixin, PageNumberMixin, ListView):
     paginate_by = settings.PAGINATE_BY
     page_kwarg = 'page'
     link_type = LinkShowType.L
+    # 与用户相关的片段都已挖洞，整页缓存可以在所有用户之间共享
+    page_cache_shared = True
 
     def get_view_cache_key(self):
         return self.request.get['pages']
 
+    def get_etag_parts(self):
+        return ['list', self.request.get_full_path()]
+
+    def get_etag_namespaces(self):
+        namespaces = super().get_etag_namespaces()
+        namespace = self.get_cache_namespace()
+        if namespace:
+            namespaces.append(namespace)
+        # 当前页数据来自缓存，视图执行时复用（见 get_queryset）
+        namespaces.extend(self.get_row_namespaces(self.get_queryset().rows))
+        return namespaces
+
+    def get_row_namespaces(self, rows):
+        """列表中每篇文章显示的分类、标签和评论数，修改后包含它们的页面失效"""
+        namespaces = set()
+        for row in rows:
+            namespaces.add(cache_namespace.category_namespace(row.category_id))
+            namespaces.add(cache_namespace.comments_namespace(row.pk))
+            namespaces.update(cache_namespace.tag_namespace(tag.pk) for tag in row.tags.all())
+        return sorted(namespaces)
+
+    def get_queryset(self):
+        if not hasattr(self, '_page_list'):
+            self._page_list = super().get_queryset()
+        return self._page_list
+
     def get_context_data(self, **kwargs):
         kwargs['linktype'] = self.link_type
         return super(ArticleListView, self).get_context_data(**kwargs)
@@ -76,6 +108,9 @@ class IndexView(OptimizedArticleQueryMixin, ArticleListView):
     def get_queryset_cache_key(self):
         return f'index_{self.page_number}'
 
+    def get_cache_namespace(self):
+        return cache_namespace.INDEX
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         blog_setting = get_blog_setting()
@@ -86,7 +121,7 @@ class IndexView(OptimizedArticleQueryMixin, ArticleListView):
         return context
 
 
-class ArticleDetailView(DetailView):
+class ArticleDetailView(ConditionalGetMixin, DetailView):
     '''
     文章详情页面
     '''
@@ -94,22 +129,49 @@ class ArticleDetailView(DetailView):
     model = Article
     pk_url_kwarg = 'article_id'
     context_object_name = "article"
+    page_cache_shared = True
+
+    def get_etag_parts(self):
+        # 只查询修改时间，文章不存在时不计算 ETag，由视图返回 404
+        article_id = self.kwargs[self.pk_url_kwarg]
+        self.etag_article = Article.objects.filter(pk=article_id).values(
+            'last_modify_time', 'category_id', 'author__username').first()
+        if self.etag_article is None:
+            return None
+        return ['article', article_id, self.etag_article['last_modify_time'].isoformat(),
+                self.request.GET.get('comment_page', '')]
+
+    def get_etag_namespaces(self):
+        """
+        文章本身及上下篇（article）、评论及表情回应（comments）、
+        面包屑中的分类及其上级分类、标签、作者的变化
+        """
+        article_id = self.kwargs[self.pk_url_kwarg]
+        namespaces = super().get_etag_namespaces() + [
+            cache_namespace.article_namespace(article_id),
+            cache_namespace.comments_namespace(article_id)]
+        # get_etag_parts 中已查询
+        article = self.etag_article
+        if article['category_id']:
+            forest = category_forest.get_forest(require=article['category_id'])
+            namespaces.extend(cache_namespace.category_namespace(pk)
+                              for pk in forest.ancestors.get(article['category_id'], ()))
+        namespaces.extend(cache_namespace.tag_namespace(pk)
+                          for pk in Article.tags.through.objects.filter(
+                              article_id=article_id).values_list('tag_id', flat=True))
+        namespaces.append(cache_namespace.author_namespace(article['author__username']))
+        return namespaces
+
+    def not_modified(self, request, *args, **kwargs):
+        # 304 时视图没有执行，与 article_read 片段一样通知插件文章被阅读
+        page_holes.record_article_read(request, self.kwargs[self.pk_url_kwarg])
 
     def get_context_data(self, **kwargs):
         comment_form = CommentForm()
 
-        # 优化：直接查询父评论，减少数据库查询
-        from comments.models import Comment
-        parent_comments = Comment.objects.filter(
-            article=self.object,
-            parent_comment=None,
-            is_enable=True
-        ).select_related('author').prefetch_related(
-            'comment_set__author'  # 预加载子评论及其作者
-        ).order_by('-id')
-
-        # 获取所有评论用于总数显示
+        # 一次查询取出全部评论，在内存中组装评论树，按顶级评论分页
         article_comments = self.object.comment_list()
+        parent_comments = build_comment_tree(article_comments)
 
         blog_setting = get_blog_setting()
         paginator = Paginator(parent_comments, blog_setting.article_comment_count)
@@ -124,6 +186,13 @@ class ArticleDetailView(DetailView):
                 page = paginator.num_pages
 
         p_comments = paginator.page(page)
+        if not page_holes.is_enabled(self.request):
+            # 直接渲染表情回应时一次加载本页全部评论的数据；整页缓存由 comment_reactions 片段批量加载
+            page_comments = []
+            for comment in p_comments:
+                page_comments.append(comment)
+                page_comments.extend(iter_comment_replies(comment))
+            attach_reactions(page_comments, self.request.user)
         next_page = p_comments.next_page_number() if p_comments.has_next() else None
         prev_page = p_comments.previous_page_number() if p_comments.has_previous() else None
 
@@ -147,15 +216,9 @@ class ArticleDetailView(DetailView):
         
         # 添加基础SEO数据
         blog_setting = get_blog_setting()
-        from django.utils.html import strip_tags
-        from django.utils.text import Truncator
-        from djangoblog.utils import CommonMarkdown
-        
-        # 处理description：markdown -> HTML -> 纯文本，彻底去除格式
-        html_content = CommonMarkdown.get_markdown(article.body)
-        description = strip_tags(html_content)
-        description = ' '.join(description.split())  # 规范化空白字符
-        description = Truncator(description).chars(150, truncate='...')
+
+        # 处理description：使用保存时生成的纯文本摘要，彻底去除格式
+        description = article.get_render().description
         
         # 处理keywords：去除空格，用逗号分隔
         tags = [tag.name.strip() for tag in article.tags.all()]
@@ -170,7 +233,9 @@ class ArticleDetailView(DetailView):
         hooks.run_action(ARTICLE_DETAIL_LOAD, article=article, context=context, request=self.request)
         
         # Action Hook, 通知插件"文章详情已获取"
-        hooks.run_action('after_article_body_get', article=article, request=self.request)
+        # 使用整页缓存时由 article_read 片段在每次请求时通知（见 djangoblog.page_holes）
+        if not page_holes.is_enabled(self.request) and not page_holes.is_warming(self.request):
+            hooks.run_action('after_article_body_get', article=article, request=self.request)
         return context
 
 
@@ -188,10 +253,10 @@ class CategoryDetailView(SlugCachedMixin, OptimizedArticleQueryMixin, ArticleLis
     def get_queryset_data(self):
         # 使用 Mixin 缓存的对象，只查询一次
         category = self.get_slug_object()
-        categorynames = [c.name for c in category.get_sub_categorys()]
 
+        # 子树按物化路径前缀匹配
         return self.get_optimized_article_queryset().filter(
-            category__name__in=categorynames, status='p'
+            category.get_subtree_filter('category__'), status='p'
         )
 
     def get_queryset_cache_key(self):
@@ -199,6 +264,13 @@ class CategoryDetailView(SlugCachedMixin, OptimizedArticleQueryMixin, ArticleLis
         category = self.get_slug_object()
         return f'category_list_{category.name}_{self.page_number}'
 
+    def get_cache_namespace(self):
+        return cache_namespace.category_namespace(self.get_slug_object().pk)
+
+    def get_queryset_cache_tags(self):
+        # 列表包含子分类的文章，子树结构变化时失效
+        return [cache_tags.CATEGORY_TREE]
+
     def get_context_data(self, **kwargs):
         category = self.get_slug_object()
         categoryname = category.name
@@ -213,7 +285,7 @@ class CategoryDetailView(SlugCachedMixin, OptimizedArticleQueryMixin, ArticleLis
         
         # 添加基础SEO数据
         blog_setting = get_blog_setting()
-        article_count = self.get_queryset().count()
+        article_count = self.object_list.count()
         kwargs['seo_title'] = f"{categoryname} | {blog_setting.site_name}"
         kwargs['seo_description'] = f"浏览 {categoryname} 分类下的所有文章，共 {article_count} 篇文章。"
         kwargs['seo_keywords'] = f"{categoryname}, {blog_setting.site_keywords}"
@@ -234,6 +306,9 @@ class AuthorDetailView(OptimizedArticleQueryMixin, ArticleListView):
         author_name = slugify(self.kwargs['author_name'])
         return f'author_{author_name}_{self.page_number}'
 
+    def get_cache_namespace(self):
+        return cache_namespace.author_namespace(self.kwargs['author_name'])
+
     def get_queryset_data(self):
         author_name = self.kwargs['author_name']
         return self.get_optimized_article_queryset().filter(
@@ -247,7 +322,7 @@ class AuthorDetailView(OptimizedArticleQueryMixin, ArticleListView):
         
         # 添加基础SEO数据
         blog_setting = get_blog_setting()
-        article_count = self.get_queryset().count()
+        article_count = self.object_list.count()
         kwargs['seo_title'] = f"{author_name} 的文章 | {blog_setting.site_name}"
         kwargs['seo_description'] = f"浏览 {author_name} 发表的所有文章，共 {article_count} 篇。"
         kwargs['seo_keywords'] = f"{author_name}, {blog_setting.site_keywords}"
@@ -278,6 +353,9 @@ class TagDetailView(SlugCachedMixin, OptimizedArticleQueryMixin, ArticleListView
         tag = self.get_slug_object()
         return f'tag_{tag.name}_{self.page_number}'
 
+    def get_cache_namespace(self):
+        return cache_namespace.tag_namespace(self.get_slug_object().pk)
+
     def get_context_data(self, **kwargs):
         tag = self.get_slug_object()
         kwargs['page_type'] = TagDetailView.page_type
@@ -285,7 +363,7 @@ class TagDetailView(SlugCachedMixin, OptimizedArticleQueryMixin, ArticleListView
         
         # 添加基础SEO数据
         blog_setting = get_blog_setting()
-        article_count = self.get_queryset().count()
+        article_count = self.object_list.count()
         kwargs['seo_title'] = f"{tag.name} | {blog_setting.site_name}"
         kwargs['seo_description'] = f"浏览所有关于 {tag.name} 的文章，共 {article_count} 篇内容。"
         kwargs['seo_keywords'] = f"{tag.name}, {blog_setting.site_keywords}"
@@ -293,23 +371,32 @@ class TagDetailView(SlugCachedMixin, OptimizedArticleQueryMixin, ArticleListView
         return super(TagDetailView, self).get_context_data(**kwargs)
 
 
-class ArchivesView(OptimizedArticleQueryMixin, ArticleListView):
+class ArchivesView(ArticleListView):
     """
     文章归档页面（重构版）
 
-    使用 OptimizedArticleQueryMixin 优化文章查询
+    归档页只展示标题、日期和分类，只查询这些字段
     """
     page_type = '文章归档'
     paginate_by = None
     page_kwarg = None
     template_name = 'blog/article_archives.html'
+    archive_fields = ('id', 'title', 'pub_time', 'creation_time', 'category__name')
 
     def get_queryset_data(self):
-        return self.get_optimized_article_queryset().filter(status='p')
+        return Article.objects.filter(status='p').select_related(
+            'category').only(*self.archive_fields)
 
     def get_queryset_cache_key(self):
         return 'archives'
 
+    def get_cache_namespace(self):
+        return cache_namespace.INDEX
+
+    def get_row_namespaces(self, rows):
+        # 归档页不显示标签
+        return sorted({cache_namespace.category_namespace(row.category_id) for row in rows})
+
 
 class LinkListView(ListView):
     model = Links
@@ -404,5 +491,22 @@ from djangoblog.error_views import (
 
 
 def clean_cache_view(request):
-    cache.clear()
-    return HttpResponse('ok')
+    """
+    按范围清理缓存，仅限超级用户；参数（均可重复）：
+    article、category、tag 为实体id，author 为用户名，namespace 见 cache_purge.NAMESPACES，prefix 为键前缀
+    不带参数时清理所有页面相关的缓存
+    """
+    if not request.user.is_superuser:
+        return HttpResponseForbidden()
+    try:
+        stats = cache_purge.purge(
+            articles=[int(pk) for pk in request.GET.getlist('article')],
+            categories=[int(pk) for pk in request.GET.getlist('category')],
+            tags=[int(pk) for pk in request.GET.getlist('tag')],
+            authors=request.GET.getlist('author'),
+            namespaces=request.GET.getlist('namespace'),
+            prefixes=request.GET.getlist('prefix'),
+            content=bool(request.GET.get('content')))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return HttpResponse('ok, ' + cache_purge.format_stats(stats))
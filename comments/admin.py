@@ -3,15 +3,24 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from djangoblog import cache_purge
 from .models import Comment, CommentReaction
 
 
+def _update_comment_status(queryset, is_enable):
+    """update() 不会触发信号，手动清理评论所在文章的缓存"""
+    article_ids = set(queryset.values_list('article_id', flat=True))
+    queryset.update(is_enable=is_enable)
+    for article_id in article_ids:
+        cache_purge.purge_comments(article_id)
+
+
 def disable_commentstatus(modeladmin, request, queryset):
-    queryset.update(is_enable=False)
+    _update_comment_status(queryset, False)
 
 
 def enable_commentstatus(modeladmin, request, queryset):
-    queryset.update(is_enable=True)
+    _update_comment_status(queryset, True)
 
 
 disable_commentstatus.short_description = _('Disable comments')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.16 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0005_commentreaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='body_html',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='body html'),
+        ),
+    ]
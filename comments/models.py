@@ -1,15 +1,19 @@
 from django.conf import settings
 from django.db import models
+from django.utils.safestring import mark_safe
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 from blog.models import Article
+from djangoblog.utils import render_comment_html
 
 
 # Create your models here.
 
 class Comment(models.Model):
     body = models.TextField('正文', max_length=300)
+    # 渲染并清理后的正文HTML，保存时生成，展示时不再重复渲染
+    body_html = models.TextField(_('body html'), blank=True, default='', editable=False)
     creation_time = models.DateTimeField(_('creation time'), default=now)
     last_modify_time = models.DateTimeField(_('last modify time'), default=now)
     author = models.ForeignKey(
@@ -44,6 +48,24 @@ class Comment(models.Model):
     def __str__(self):
         return self.body
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'body' in update_fields:
+            self.body_html = render_comment_html(self.body)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'body_html'}
+        super().save(*args, **kwargs)
+
+    def get_body_html(self):
+        """
+        获取清理后的正文HTML，历史评论没有保存结果时生成并回写
+        """
+        if not self.body_html and self.body:
+            self.body_html = render_comment_html(self.body)
+            if self.pk:
+                Comment.objects.filter(pk=self.pk).update(body_html=self.body_html)
+        return mark_safe(self.body_html)
+
     def get_reactions_summary(self, user=None):
         """
         获取评论的 reactions 统计信息
@@ -56,39 +78,10 @@ class Comment(models.Model):
             '❤️': {'count': 3, 'has_reacted': False, 'users': [...]},
             ...
         }
+        多条评论请使用 comments.utils.load_reactions 批量获取
         """
-        from django.db.models import Count
-
-        reactions = CommentReaction.objects.filter(
-            comment=self
-        ).values('reaction_type').annotate(count=Count('id'))
-
-        result = {}
-        for reaction in reactions:
-            emoji = reaction['reaction_type']
-
-            # 获取该 emoji 的所有点赞用户
-            reaction_users = CommentReaction.objects.filter(
-                comment=self,
-                reaction_type=emoji
-            ).select_related('user')[:10]  # 最多显示10个用户
-
-            user_names = [r.user.nickname or r.user.username for r in reaction_users]
-
-            result[emoji] = {
-                'count': reaction['count'],
-                'has_reacted': False,
-                'users': user_names
-            }
-
-            if user and user.is_authenticated:
-                result[emoji]['has_reacted'] = CommentReaction.objects.filter(
-                    comment=self,
-                    user=user,
-                    reaction_type=emoji
-                ).exists()
-
-        return result
+        from comments.utils import load_reactions
+        return load_reactions([self.pk], user)[self.pk]
 
 
 class CommentReaction(models.Model):
@@ -1,23 +1,21 @@
 from django import template
 
+from comments.utils import build_comment_tree, iter_comment_replies
+
 register = template.Library()
 
 
 @register.simple_tag
 def parse_commenttree(commentlist, comment):
-    """获得当前评论子评论的列表
+    """获得当前评论所有子评论的列表，在内存中组装，不再逐层查询
         用法: {% parse_commenttree article_comments comment as childcomments %}
     """
-    datas = []
-
-    def parse(c):
-        childs = commentlist.filter(parent_comment=c, is_enable=True)
-        for child in childs:
-            datas.append(child)
-            parse(child)
-
-    parse(comment)
-    return datas
+    comments = [c for c in commentlist if c.is_enable]
+    if comment.pk not in {c.pk for c in comments}:
+        comments.append(comment)
+    build_comment_tree(comments)
+    current = next(c for c in comments if c.pk == comment.pk)
+    return list(iter_comment_replies(current))
 
 
 @register.inclusion_tag('comments/tags/comment_item.html')
@@ -91,6 +91,36 @@ class CommentCreationTest(TestCase):
         article_comments = Comment.objects.filter(article=self.article)
         self.assertIn(comment, article_comments)
 
+    def test_comment_body_html_rendered_on_save(self):
+        """测试保存评论时生成清理后的正文HTML"""
+        comment = Comment.objects.create(
+            body='**bold** <script>alert(1)</script><span style="">x</span>',
+            author=self.commenter,
+            article=self.article
+        )
+
+        comment = Comment.objects.get(pk=comment.pk)
+        self.assertIn('<strong>bold</strong>', comment.body_html)
+        self.assertNotIn('<script', comment.body_html)
+        self.assertNotIn('style', comment.body_html)
+
+        comment.body = 'updated'
+        comment.save(update_fields=['body'])
+        self.assertIn('updated', Comment.objects.get(pk=comment.pk).body_html)
+
+    def test_comment_body_html_backfilled(self):
+        """测试历史评论展示时补全正文HTML"""
+        comment = Comment.objects.create(
+            body='legacy *comment*',
+            author=self.commenter,
+            article=self.article
+        )
+        Comment.objects.filter(pk=comment.pk).update(body_html='')
+
+        comment = Comment.objects.get(pk=comment.pk)
+        self.assertIn('<em>comment</em>', comment.get_body_html())
+        self.assertIn('<em>comment</em>', Comment.objects.get(pk=comment.pk).body_html)
+
 
 class CommentModerationTest(TestCase):
     """测试评论审核工作流"""
@@ -1,4 +1,4 @@
-from django.test import Client, RequestFactory, TransactionTestCase
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
 from django.urls import reverse
 
 from accounts.models import BlogUser
@@ -107,3 +107,151 @@ class CommentsTest(TransactionTestCase):
 
         from comments.utils import send_comment_email
         send_comment_email(comment)
+
+
+class CommentTreeTest(TestCase):
+    def setUp(self):
+        self.user = BlogUser.objects.create_user(username='tree', email='tree@test.com', password='pwd')
+        category = Category.objects.create(name='评论树分类')
+        self.article = Article.objects.create(
+            title='评论树文章', body='body', author=self.user, category=category, type='a', status='p')
+
+    def create_comment(self, body, parent=None, is_enable=True):
+        return Comment.objects.create(
+            body=body, author=self.user, article=self.article, parent_comment=parent, is_enable=is_enable)
+
+    def test_build_comment_tree(self):
+        from comments.utils import build_comment_tree
+        root = self.create_comment('root')
+        reply = self.create_comment('reply', root)
+        nested = self.create_comment('nested', reply)
+        hidden = self.create_comment('hidden', root, is_enable=False)
+        self.create_comment('orphan', hidden)
+        other = self.create_comment('other')
+
+        roots = build_comment_tree(self.article.comment_list())
+        self.assertEqual([c.pk for c in roots], [other.pk, root.pk])
+        self.assertEqual([c.pk for c in roots[1].children], [reply.pk])
+        self.assertEqual([c.pk for c in roots[1].children[0].children], [nested.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(roots[1].children[0].children[0].parent_comment.author.username, 'tree')
+
+    def test_article_page_comment_queries_do_not_grow_with_depth(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from djangoblog.utils import cache
+        parent = self.create_comment('level 0')
+        url = self.article.get_absolute_url()
+        cache.clear()
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get(url)
+        for i in range(1, 6):
+            parent = self.create_comment(f'level {i}', parent)
+        cache.clear()
+        with CaptureQueriesContext(connection) as deep:
+            response = self.client.get(url)
+        self.assertContains(response, 'level 5')
+
+        def comment_queries(context):
+            return [q for q in context.captured_queries if 'FROM "comments_comment"' in q['sql']]
+
+        self.assertEqual(len(comment_queries(deep)), len(comment_queries(shallow)))
+
+
+class CommentReactionsTest(TestCase):
+    def setUp(self):
+        from djangoblog.utils import cache
+        cache.clear()
+        self.user = BlogUser.objects.create_user(username='react', email='react@test.com', password='pwd')
+        category = Category.objects.create(name='表情分类')
+        self.article = Article.objects.create(
+            title='表情文章', body='body', author=self.user, category=category, type='a', status='p')
+        self.comments = [
+            Comment.objects.create(body=f'comment {i}', author=self.user, article=self.article, is_enable=True)
+            for i in range(5)]
+
+    def react(self, comment, user, emoji):
+        from comments.models import CommentReaction
+        return CommentReaction.objects.create(comment=comment, user=user, reaction_type=emoji)
+
+    def test_load_reactions(self):
+        from comments.utils import REACTION_USERS_LIMIT, load_reactions
+        first, second = self.comments[:2]
+        users = [
+            BlogUser.objects.create_user(username=f'fan{i}', email=f'fan{i}@test.com', password='pwd')
+            for i in range(REACTION_USERS_LIMIT + 2)]
+        for user in users:
+            self.react(first, user, '👍')
+        self.react(first, self.user, '❤️')
+        self.react(second, users[0], '🎉')
+
+        ids = [comment.pk for comment in self.comments]
+        with self.assertNumQueries(3):
+            summaries = load_reactions(ids, self.user)
+        self.assertEqual(list(summaries[first.pk]), ['👍', '❤️'])
+        self.assertEqual(summaries[first.pk]['👍']['count'], REACTION_USERS_LIMIT + 2)
+        self.assertEqual(summaries[first.pk]['👍']['users'],
+                         [user.username for user in users[:REACTION_USERS_LIMIT]])
+        self.assertFalse(summaries[first.pk]['👍']['has_reacted'])
+        self.assertEqual(summaries[first.pk]['❤️'], {'count': 1, 'has_reacted': True, 'users': ['react']})
+        self.assertEqual(summaries[second.pk], {'🎉': {'count': 1, 'has_reacted': False, 'users': ['fan0']}})
+        self.assertEqual(summaries[self.comments[2].pk], {})
+        self.assertEqual(first.get_reactions_summary(self.user), summaries[first.pk])
+
+        # 计数已缓存，只需查询当前用户的回应；匿名访问不查询
+        with self.assertNumQueries(1):
+            load_reactions(ids, self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(load_reactions(ids)[first.pk]['❤️']['has_reacted'], False)
+
+    def test_cache_invalidated_on_reaction_change(self):
+        from comments.utils import load_reactions
+        comment = self.comments[0]
+        self.assertEqual(load_reactions([comment.pk])[comment.pk], {})
+        reaction = self.react(comment, self.user, '🚀')
+        self.assertEqual(load_reactions([comment.pk])[comment.pk]['🚀']['count'], 1)
+        reaction.delete()
+        self.assertEqual(load_reactions([comment.pk])[comment.pk], {})
+
+    def test_reaction_cache_disabled(self):
+        from django.test import override_settings
+        from comments.utils import load_reactions
+        self.react(self.comments[0], self.user, '👀')
+        ids = [comment.pk for comment in self.comments]
+        with override_settings(COMMENT_REACTIONS_CACHE_TIMEOUT=0):
+            for _ in range(2):
+                with self.assertNumQueries(2):
+                    load_reactions(ids)
+
+    def test_article_page_reaction_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from djangoblog.utils import cache
+        for comment in self.comments:
+            self.react(comment, self.user, '👍')
+        self.client.login(username='react', password='pwd')
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.article.get_absolute_url())
+        self.assertContains(response, 'comment 4')
+        reaction_queries = [q for q in context.captured_queries if 'comments_commentreaction' in q['sql']]
+        self.assertEqual(len(reaction_queries), 3)
+
+    def test_page_hole_prefetch(self):
+        from django.contrib.auth.models import AnonymousUser
+        from djangoblog import page_holes
+        for comment in self.comments:
+            self.react(comment, self.user, '😄')
+        content = ''.join(
+            page_holes.render_marker('comment_reactions', comment_id=comment.pk) for comment in self.comments)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        # 片段的上下文处理器数据（seo_processor）正常情况下来自缓存
+        from blog.context_processors import seo_processor
+        seo_processor(request)
+        with self.assertNumQueries(2):
+            filled = page_holes.fill(request, content)
+        self.assertNotIn(page_holes.HOLE_PREFIX, filled)
+        for comment in self.comments:
+            self.assertIn(f'reactionPicker({comment.pk})', filled)
+        self.assertEqual(filled.count('"count": 1'), len(self.comments))
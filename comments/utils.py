@@ -1,12 +1,142 @@
 import logging
 
+from django.conf import settings
+from django.db.models import Count, F, Min, Window
+from django.db.models.functions import RowNumber
 from django.utils.translation import gettext_lazy as _
 
+from djangoblog.constants import CacheKey, CacheTimeout
+from djangoblog.utils import cache
 from djangoblog.utils import get_current_site
 from djangoblog.utils import send_email
 
 logger = logging.getLogger(__name__)
 
+# 每种表情最多显示的用户数
+REACTION_USERS_LIMIT = 10
+
+
+def build_comment_tree(comments):
+    """
+    在内存中组装评论树，O(n)
+    :param comments: 一篇文章的全部已启用评论（一次查询取出，已 select_related('author')）
+    :return: 顶级评论列表；每条评论的 children 为直接回复列表，parent_comment 直接取自同一批评论，
+             顺序与 comments 一致。父评论不在 comments 中（未启用或已删除）的回复不显示
+    """
+    comments = list(comments)
+    by_id = {comment.pk: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.children = []
+    for comment in comments:
+        parent_id = comment.parent_comment_id
+        if parent_id is None:
+            roots.append(comment)
+        elif parent_id in by_id:
+            parent = by_id[parent_id]
+            parent.children.append(comment)
+            # 模板中显示“回复 @用户”时不再逐条查询父评论
+            type(comment).parent_comment.field.set_cached_value(comment, parent)
+    return roots
+
+
+def iter_comment_replies(comment):
+    """按深度优先顺序遍历评论的所有回复（需先经过 build_comment_tree）"""
+    for child in getattr(comment, 'children', []):
+        yield child
+        yield from iter_comment_replies(child)
+
+
+def _reactions_cache_timeout():
+    """表情回应计数的缓存时间，设置为 0 时不缓存，每次从数据库统计"""
+    return getattr(settings, 'COMMENT_REACTIONS_CACHE_TIMEOUT', CacheTimeout.HOUR_1)
+
+
+def _query_reaction_stats(comment_ids):
+    """
+    两次查询统计多条评论的表情回应
+    :return: {comment_id: {emoji: {'count': 数量, 'users': [最早回应的用户名...]}}}，
+             表情按首次回应的顺序排列
+    """
+    from comments.models import CommentReaction
+    reactions = CommentReaction.objects.filter(comment_id__in=comment_ids)
+    stats = {pk: {} for pk in comment_ids}
+    counts = reactions.values('comment_id', 'reaction_type').annotate(
+        count=Count('id'), first_id=Min('id')).order_by('comment_id', 'first_id')
+    for row in counts:
+        stats[row['comment_id']][row['reaction_type']] = {'count': row['count'], 'users': []}
+
+    # 按评论和表情分组编号，每组只取最早的若干个用户
+    users = reactions.annotate(rank=Window(
+        RowNumber(),
+        partition_by=[F('comment_id'), F('reaction_type')],
+        order_by=F('id').asc(),
+    )).filter(rank__lte=REACTION_USERS_LIMIT).order_by('id').values_list(
+        'comment_id', 'reaction_type', 'user__nickname', 'user__username')
+    for comment_id, emoji, nickname, username in users:
+        entry = stats[comment_id].get(emoji)
+        if entry is not None:
+            entry['users'].append(nickname or username)
+    return stats
+
+
+def load_reactions(comment_ids, user=None):
+    """
+    批量获取评论的表情回应，格式与 Comment.get_reactions_summary 相同
+    计数和用户名按评论缓存（见 COMMENT_REACTIONS_CACHE_TIMEOUT），未命中的评论一起统计，共两次查询；
+    当前用户的回应与用户相关，不缓存，再查询一次
+    :param comment_ids: 页面上的评论id
+    :param user: 当前用户，未登录或为 None 时 has_reacted 均为 False
+    :return: {comment_id: {emoji: {'count': 5, 'has_reacted': True, 'users': ['Alice', ...]}}}
+    """
+    from comments.models import CommentReaction
+    comment_ids = list(dict.fromkeys(comment_ids))
+    if not comment_ids:
+        return {}
+
+    timeout = _reactions_cache_timeout()
+    keys = {pk: CacheKey.COMMENT_REACTIONS.format(comment_id=pk) for pk in comment_ids}
+    cached = cache.get_many(list(keys.values())) if timeout else {}
+    stats = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in comment_ids if pk not in stats]
+    if missing:
+        loaded = _query_reaction_stats(missing)
+        stats.update(loaded)
+        if timeout:
+            cache.set_many({keys[pk]: loaded[pk] for pk in missing}, timeout)
+
+    reacted = set()
+    reacted_ids = [pk for pk in comment_ids if stats[pk]]
+    if user is not None and user.is_authenticated and reacted_ids:
+        reacted = set(CommentReaction.objects.filter(
+            comment_id__in=reacted_ids, user=user).values_list('comment_id', 'reaction_type'))
+
+    return {
+        pk: {
+            emoji: {
+                'count': entry['count'],
+                'has_reacted': (pk, emoji) in reacted,
+                'users': list(entry['users']),
+            }
+            for emoji, entry in stats[pk].items()
+        }
+        for pk in comment_ids
+    }
+
+
+def attach_reactions(comments, user=None):
+    """为页面上的评论批量加载表情回应，保存在 comment.reactions_summary 中供模板使用"""
+    comments = list(comments)
+    summaries = load_reactions([comment.pk for comment in comments], user)
+    for comment in comments:
+        comment.reactions_summary = summaries[comment.pk]
+    return comments
+
+
+def invalidate_reactions(comment_id):
+    """评论的表情回应增加或删除后清除计数缓存"""
+    cache.delete(CacheKey.COMMENT_REACTIONS.format(comment_id=comment_id))
+
 
 def send_comment_email(comment):
     site = get_current_site().domain
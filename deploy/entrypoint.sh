@@ -28,6 +28,11 @@ python manage.py makemigrations && \
   python manage.py build_index && \
   python manage.py compilemessages  || exit 1
 
+# 只有共享缓存（redis）能把预热结果带给 gunicorn worker，预热失败不影响启动
+if [ -n "$DJANGO_REDIS_URL" ]; then
+  python manage.py warm_cache --concurrency 4 --rate 20 || echo "cache warming failed"
+fi
+
 exec gunicorn ${DJANGO_WSGI_MODULE}:application \
 --name $NAME \
 --workers $NUM_WORKERS \
@@ -6,6 +6,9 @@ class DjangoblogAppConfig(AppConfig):
 
     def ready(self):
         super().ready()
+        # 代码高亮结果缓存
+        from .highlight_cache import install
+        install()
         # Import and load plugins here
         from .plugin_manage.loader import load_plugins
         load_plugins() 
\ No newline at end of file
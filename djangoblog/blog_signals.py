@@ -5,14 +5,17 @@ import django.dispatch
 from django.conf import settings
 from django.contrib.admin.models import LogEntry
 from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.contrib.sites.models import Site
 from django.core.mail import EmailMultiAlternatives
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from comments.models import Comment
-from comments.utils import send_comment_email
+from blog.models import Article, Category, Links, SideBar, Tag
+from comments.models import Comment, CommentReaction
+from comments.utils import invalidate_reactions, send_comment_email
+from djangoblog import cache_namespace, cache_purge, cache_tags
 from djangoblog.spider_notify import SpiderNotify
-from djangoblog.utils import cache, expire_view_cache, delete_sidebar_cache, delete_view_cache
+from djangoblog.utils import delete_sidebar_cache, delete_site_cache
 from djangoblog.utils import get_current_site
 from oauth.models import OAuthUser
 
@@ -76,10 +79,9 @@ def model_post_save_callback(
     if isinstance(instance, LogEntry):
         return
 
-    # 检查是否只更新了浏览量
-    is_update_views = update_fields == {'views'}
-    if is_update_views:
-        return  # 浏览量更新不需要清理缓存
+    # 只更新了浏览量或登录时间（登录时 update_last_login）不需要清理缓存
+    if update_fields and set(update_fields) <= {'views', 'last_login'}:
+        return
 
     # 搜索引擎通知
     if 'get_full_url' in dir(instance):
@@ -90,89 +92,135 @@ def model_post_save_callback(
             except Exception as ex:
                 logger.error("notify sipder", ex)
 
-    # 评论相关的缓存清理
+    # 评论相关的缓存清理：禁用评论同样需要清理，已缓存的页面仍然显示该评论
     if isinstance(instance, Comment):
+        cache_purge.purge_comments(instance.article_id)
         if instance.is_enable:
-            path = instance.article.get_absolute_url()
-            site = get_current_site().domain
-            if site.find(':') > 0:
-                site = site[0:site.find(':')]
-
-            expire_view_cache(
-                path,
-                servername=site,
-                serverport=80,
-                key_prefix='blogdetail')
-
-            # 清理评论相关缓存
-            comment_cache_key = 'article_comments_{id}'.format(
-                id=instance.article.id)
-            cache.delete(comment_cache_key)
-            delete_view_cache('article_comments', [str(instance.article.pk)])
-            delete_sidebar_cache()
-            cache.delete('seo_processor')
-
             _thread.start_new_thread(send_comment_email, (instance,))
 
-    # 文章相关的精细化缓存清理
+    # 文章相关的缓存清理：按依赖标签失效，覆盖列表的所有分页
     elif 'get_full_url' in dir(instance):
-        from blog.models import Article, Category, Tag
-
         if isinstance(instance, Article):
-            # 清理文章列表首页缓存
-            cache.delete('index_1')
-
-            # 清理文章详情缓存
-            article_cache_key = f'article_comments_{instance.id}'
-            cache.delete(article_cache_key)
-
-            # 清理分类相关缓存
-            if instance.category:
-                category_name = instance.category.name
-                cache.delete(f'category_list_{category_name}_1')
-
-            # 清理标签相关缓存
-            try:
-                for tag in instance.tags.all():
-                    cache.delete(f'tag_{tag.name}_1')
-            except Exception:
-                pass  # 可能在创建时tags还未关联
-
-            # 清理作者相关缓存
-            if instance.author:
-                from uuslug import slugify
-                author_slug = slugify(instance.author.username)
-                cache.delete(f'author_{author_slug}_1')
-
-            # 清理归档缓存
-            cache.delete('archives')
-
-            # 清理侧边栏和上下文处理器缓存
-            delete_sidebar_cache()
-            cache.delete('seo_processor')
+            # 发布、撤回文章会改变标签的文章数，先更新计数再使侧边栏等缓存失效
+            Tag.update_article_counts(instance.tags.values_list('id', flat=True))
+            cache_purge.purge_article(instance)
 
         elif isinstance(instance, Category):
-            # 清理分类相关缓存
-            cache.delete(f'category_list_{instance.name}_1')
-            delete_sidebar_cache()
-            cache.delete('seo_processor')
+            cache_purge.purge_category(instance)
 
         elif isinstance(instance, Tag):
-            # 清理标签相关缓存
-            cache.delete(f'tag_{instance.name}_1')
-            delete_sidebar_cache()
+            cache_purge.purge_tag(instance)
 
         # 其他模型的缓存清理
         else:
             # 对于其他有get_full_url的模型，清理基础缓存
             delete_sidebar_cache()
-            cache.delete('seo_processor')
+            cache_namespace.bump(cache_namespace.SEO)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def article_tags_changed_callback(sender, instance, action, reverse, pk_set, **kwargs):
+    """文章标签变化：新旧标签的列表和文章数都需要失效"""
+    if action == 'pre_clear':
+        tag_ids = list(instance.tags.values_list('id', flat=True)) if not reverse \
+            else list(instance.article_set.values_list('id', flat=True))
+        # 关联删除后才能重新计数，记录下来在 post_clear 中使用
+        instance._cleared_tag_ids = tag_ids
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        update_tag_article_counts(instance, reverse, pk_set)
+        if action == 'post_clear':
+            delete_sidebar_cache()
+            return
+        tag_ids = pk_set or []
+    else:
+        return
+    if reverse:
+        # 从标签一侧修改：instance 为标签，pk_set/tag_ids 为文章id
+        cache_tags.invalidate_tags(
+            cache_tags.ARTICLE_LIST,
+            cache_tags.tag_tag(instance.pk),
+            *[cache_tags.article_tag(article_id) for article_id in tag_ids])
+        cache_namespace.bump(cache_namespace.INDEX, cache_namespace.tag_namespace(instance.pk))
+    else:
+        cache_tags.invalidate_tags(
+            cache_tags.article_tag(instance.pk),
+            *[cache_tags.tag_tag(tag_id) for tag_id in tag_ids])
+        cache_namespace.bump(*[cache_namespace.tag_namespace(tag_id) for tag_id in tag_ids])
+    delete_sidebar_cache()
+
+
+def update_tag_article_counts(instance, reverse, pk_set):
+    """文章与标签的关联变化后更新标签的文章数"""
+    if reverse:
+        Tag.update_article_counts([instance.pk])
+    elif pk_set is not None:
+        Tag.update_article_counts(pk_set)
+    else:
+        Tag.update_article_counts(getattr(instance, '_cleared_tag_ids', []))
+
+
+@receiver(pre_delete, sender=Article)
+def article_pre_delete_callback(sender, instance, **kwargs):
+    # 文章删除时关联会被级联删除，提前记录标签
+    instance._deleted_tag_ids = list(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Article)
+def article_post_delete_callback(sender, instance, **kwargs):
+    tag_ids = getattr(instance, '_deleted_tag_ids', [])
+    Tag.update_article_counts(tag_ids)
+    cache_purge.purge_article(instance, tag_ids=tag_ids)
+
+
+@receiver(post_delete, sender=Category)
+def category_post_delete_callback(sender, instance, **kwargs):
+    cache_purge.purge_category(instance)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_post_delete_callback(sender, instance, **kwargs):
+    cache_purge.purge_tag(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_post_delete_callback(sender, instance, **kwargs):
+    cache_purge.purge_comments(instance.article_id)
+
+
+@receiver(post_save, sender=Links)
+@receiver(post_delete, sender=Links)
+def links_changed_callback(sender, instance, **kwargs):
+    """友情链接显示在侧边栏和链接页，属于整站修改，整页缓存一起失效"""
+    cache_namespace.bump(cache_namespace.SIDEBAR, cache_namespace.PAGE)
+
+
+@receiver(post_save, sender=SideBar)
+@receiver(post_delete, sender=SideBar)
+def sidebar_changed_callback(sender, instance, **kwargs):
+    """侧边栏在页面片段中按请求渲染，不需要清理整页缓存"""
+    delete_sidebar_cache()
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def site_changed_callback(sender, instance, **kwargs):
+    delete_site_cache()
+
+
+@receiver(post_save, sender=CommentReaction)
+@receiver(post_delete, sender=CommentReaction)
+def comment_reaction_changed_callback(sender, instance, **kwargs):
+    """表情回应只在页面片段中渲染，更新评论命名空间使文章页的 ETag 变化"""
+    invalidate_reactions(instance.comment_id)
+    article_id = Comment.objects.filter(pk=instance.comment_id).values_list(
+        'article_id', flat=True).first()
+    if article_id:
+        cache_namespace.bump(cache_namespace.comments_namespace(article_id))
 
 
 @receiver(user_logged_in)
 @receiver(user_logged_out)
 def user_auth_callback(sender, request, user, **kwargs):
+    # 侧边栏缓存不包含用户信息（登录状态由页面片段渲染），登录、登出不需要清理缓存
     if user and user.username:
         logger.info(user)
-        delete_sidebar_cache()
-        # cache.clear()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+命名空间缓存键
+
+每个命名空间（index、category:X、tag:Y、author:Z、article:X、comments:X、sidebar、seo、page）保存一个代数计数器，
+命名空间内的缓存键都带上当前代数：ns:{namespace}:{generation}:{key}。
+bump 只需把计数器加一，旧代数的键不会再被读到，等待过期或被淘汰即可，
+不需要扫描键，也不需要 cache.clear() 清掉验证码、微信会话等无关数据。
+
+与 cache_tags 的区别：标签在读取时校验版本，适合一个值依赖多个实体；
+命名空间把版本放进键里，读取只需一次 get，适合按页面类型整体失效的缓存。
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+
+from djangoblog.near_cache import near_cache
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'cache_ns_generation:{namespace}'
+NAMESPACED_KEY = 'ns:{namespace}:{generation}:{key}'
+
+# 常用命名空间
+INDEX = 'index'  # 首页、归档
+SIDEBAR = 'sidebar'  # 侧边栏
+SEO = 'seo'  # seo_processor 上下文
+# 整页缓存：只在整站变化（网站配置、手动清理）时失效，单个页面按其依赖的实体命名空间失效
+# （见 blog.middleware.PageCacheMiddleware），侧边栏和导航在页面片段中按请求渲染
+PAGE = 'page'
+
+# 这些命名空间的值同时保存在进程内近端缓存中（见 djangoblog.near_cache），失效时一并通知
+NEAR_CACHED_NAMESPACES = frozenset([SIDEBAR, SEO])
+
+
+def category_namespace(category_id):
+    return f'category:{category_id}'
+
+
+def tag_namespace(tag_id):
+    return f'tag:{tag_id}'
+
+
+def author_namespace(username):
+    return f'author:{username}'
+
+
+def article_namespace(article_id):
+    return f'article:{article_id}'
+
+
+def comments_namespace(article_id):
+    return f'comments:{article_id}'
+
+
+def _initial_generation():
+    # 计数器被淘汰后从当前纳秒时间重新开始，不会回到用过的代数
+    return time.time_ns()
+
+
+def get_generation(namespace):
+    """获取命名空间当前代数，不存在时初始化"""
+    key = GENERATION_KEY.format(namespace=namespace)
+    generation = cache.get(key)
+    if generation is None:
+        generation = _initial_generation()
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def get_generations(namespaces):
+    """
+    一次读取多个命名空间的当前代数，不存在的会初始化
+    :return: {namespace: generation}
+    """
+    keys = {namespace: GENERATION_KEY.format(namespace=namespace) for namespace in namespaces}
+    stored = cache.get_many(list(keys.values()))
+    generations = {}
+    for namespace, key in keys.items():
+        generation = stored.get(key)
+        if generation is None:
+            generation = get_generation(namespace)
+        generations[namespace] = generation
+    return generations
+
+
+def make_key(namespace, key):
+    """生成带命名空间代数的缓存键"""
+    return NAMESPACED_KEY.format(
+        namespace=namespace, generation=get_generation(namespace), key=key)
+
+
+def bump(*namespaces):
+    """使命名空间内的所有缓存键失效"""
+    namespaces = {namespace for namespace in namespaces if namespace}
+    for namespace in namespaces:
+        key = GENERATION_KEY.format(namespace=namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 计数器不存在（从未使用或已被淘汰），旧键已无法被读到
+            if not cache.add(key, _initial_generation(), None):
+                cache.incr(key)
+    if namespaces:
+        logger.info('bump cache namespaces: %s', ', '.join(sorted(namespaces)))
+    if namespaces & NEAR_CACHED_NAMESPACES:
+        near_cache.invalidate()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+按范围清理缓存
+
+共享 redis 上的 cache.clear() 会清空所有节点的缓存，导致同时回源（惊群），
+还会丢掉验证码、微信会话、django-compressor 状态等与页面无关的数据。这里提供按范围清理：
+    按实体：文章、分类、标签、作者，失效依赖它们的缓存标签和命名空间
+    按命名空间：sidebar、seo、settings、lists、pages、content
+    按键前缀：redis 使用 SCAN + UNLINK 分批删除，不会阻塞服务端
+
+标签和命名空间的失效只需更新版本号（见 cache_tags、cache_namespace），不需要删除键。
+每个函数返回 collections.Counter：tags、namespaces 为失效的数量，keys 为删除的键数量。
+"""
+
+import logging
+from collections import Counter
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from djangoblog import cache_namespace, cache_tags, highlight_cache
+from djangoblog.constants import CacheKey
+
+logger = logging.getLogger(__name__)
+
+SCAN_BATCH_SIZE = 500
+
+# 可按名称清理的命名空间
+SIDEBAR = 'sidebar'
+SEO = 'seo'
+SETTINGS = 'settings'
+LISTS = 'lists'
+PAGES = 'pages'
+CONTENT = 'content'
+NAMESPACES = (SIDEBAR, SEO, SETTINGS, LISTS, PAGES, CONTENT)
+
+# 渲染结果按内容哈希缓存，内容变化时键随之变化，默认不清理
+DEFAULT_NAMESPACES = (SIDEBAR, SEO, SETTINGS, LISTS, PAGES)
+
+CONTENT_PREFIXES = (
+    CacheKey.MARKDOWN_BLOCK.split('{')[0],
+    CacheKey.CODE_HIGHLIGHT.split('{')[0],
+    CacheKey.ARTICLE_CONTENT_FILTERED.split('{')[0],
+)
+
+
+def _invalidate(tags=(), namespaces=()):
+    tags = {tag for tag in tags if tag}
+    namespaces = {namespace for namespace in namespaces if namespace}
+    cache_tags.invalidate_tags(*tags)
+    cache_namespace.bump(*namespaces)
+    return Counter(tags=len(tags), namespaces=len(namespaces))
+
+
+def _escape_pattern(value):
+    """转义 redis glob 模式中的特殊字符"""
+    for char in '\\*?[]':
+        value = value.replace(char, '\\' + char)
+    return value
+
+
+def _locmem_keys(backend, prefix, made_prefix):
+    """
+    列出 LocMemCache 中以 prefix 开头的键（未经 make_key 处理的原始键）
+    LocMemCache 没有列出键的公开接口，这里只在锁内读取键的快照（_cache、_lock），
+    删除仍通过公开的 delete 完成；内部结构变化或使用了自定义 KEY_FUNCTION 时报错，不会误删
+    """
+    store = getattr(backend, '_cache', None)
+    lock = getattr(backend, '_lock', None)
+    if store is None or lock is None or not made_prefix.endswith(prefix):
+        raise ValueError(f'prefix purge is not supported by this {type(backend).__name__} configuration')
+    head = made_prefix[:len(made_prefix) - len(prefix)]
+    with lock:
+        keys = [key for key in list(store) if key.startswith(made_prefix)]
+    return [key[len(head):] for key in keys]
+
+
+def delete_prefix(prefix, batch_size=SCAN_BATCH_SIZE):
+    """
+    删除以 prefix 开头的缓存键
+    :return: 删除的键数量
+    :raises ValueError: prefix 为空，或缓存后端不支持按前缀删除
+    """
+    if not prefix:
+        raise ValueError('prefix is required')
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    made_prefix = backend.make_key(prefix)
+    deleted = 0
+    if isinstance(backend, RedisCache):
+        client = backend._cache.get_client(write=True)
+        batch = []
+        for key in client.scan_iter(match=_escape_pattern(made_prefix) + '*', count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += client.unlink(*batch)
+    elif isinstance(backend, LocMemCache):
+        for key in _locmem_keys(backend, prefix, made_prefix):
+            deleted += backend.delete(key)
+    else:
+        raise ValueError(f'prefix purge is not supported by {type(backend).__name__}')
+    logger.info('purge cache prefix %s: %d keys', prefix, deleted)
+    return deleted
+
+
+def purge_prefix(prefix, batch_size=SCAN_BATCH_SIZE):
+    return Counter(keys=delete_prefix(prefix, batch_size))
+
+
+def _neighbour_ids(article_id):
+    """按 id 相邻的已发布文章，它们的上下篇可能是这篇文章"""
+    from blog.models import Article
+    published = Article.objects.filter(status='p')
+    return [pk for pk in (
+        published.filter(id__lt=article_id).order_by('-id').values_list('id', flat=True).first(),
+        published.filter(id__gt=article_id).order_by('id').values_list('id', flat=True).first(),
+    ) if pk is not None]
+
+
+def purge_article(article, tag_ids=None, content=False):
+    """
+    使依赖文章的缓存失效：
+    所有文章列表（首页、归档）及上下篇、文章所在分类、作者、标签的列表，
+    文章页及按 id 相邻的已发布文章的页面（上下篇链接），侧边栏和导航的数据
+    :param tag_ids: 文章的标签id，默认从数据库读取
+    :param content: 同时删除插件过滤后的正文缓存（正文修改后键会变化，通常不需要）
+    """
+    tags = [
+        cache_tags.ARTICLE_LIST,
+        cache_tags.article_tag(article.pk),
+        cache_tags.category_tag(article.category_id),
+        cache_tags.author_tag(article.author.username),
+    ]
+    if tag_ids is None:
+        tag_ids = article.tags.values_list('id', flat=True) if article.pk else []
+    tags.extend(cache_tags.tag_tag(tag_id) for tag_id in tag_ids)
+
+    # 文章出现在首页、所在分类及其上级分类、作者和标签的列表中，整个命名空间一起失效
+    namespaces = [
+        cache_namespace.INDEX,
+        cache_namespace.author_namespace(article.author.username),
+        cache_namespace.SIDEBAR,
+        cache_namespace.SEO,
+    ]
+    from blog.models import Category
+    try:
+        categories = article.category.get_category_tree() if article.category_id else []
+    except Category.DoesNotExist:
+        # 分类被删除时级联删除文章，分类的命名空间由分类的信号处理
+        categories = []
+    namespaces.extend(cache_namespace.category_namespace(c.pk) for c in categories)
+    namespaces.extend(cache_namespace.tag_namespace(tag_id) for tag_id in tag_ids)
+    if article.pk:
+        namespaces.append(cache_namespace.article_namespace(article.pk))
+        namespaces.extend(cache_namespace.article_namespace(pk) for pk in _neighbour_ids(article.pk))
+    stats = _invalidate(tags, namespaces)
+
+    # 清理文章评论缓存
+    stats['keys'] += cache.delete(CacheKey.ARTICLE_COMMENTS.format(article_id=article.id))
+    if content:
+        stats += purge_prefix(CacheKey.ARTICLE_CONTENT_FILTERED.format(article_id=article.id, digest=''))
+    return stats
+
+
+def purge_comments(article_id):
+    """
+    使文章的评论相关缓存失效，评论新增、启用、禁用、删除时调用：
+    评论列表、文章页的整页缓存和 ETag（评论命名空间）、侧边栏最新评论
+    """
+    from django.core.cache.utils import make_template_fragment_key
+    stats = _invalidate(namespaces=[cache_namespace.comments_namespace(article_id), cache_namespace.SIDEBAR])
+    stats['keys'] += cache.delete(CacheKey.ARTICLE_COMMENTS.format(article_id=article_id))
+    stats['keys'] += cache.delete(make_template_fragment_key('article_comments', [str(article_id)]))
+    return stats
+
+
+def purge_category(category):
+    from blog import category_forest
+    category_forest.invalidate()
+    return _invalidate(
+        [cache_tags.CATEGORY_TREE, cache_tags.category_tag(category.pk)],
+        [cache_namespace.category_namespace(category.pk), cache_namespace.SIDEBAR, cache_namespace.SEO])
+
+
+def purge_tag(tag):
+    return _invalidate(
+        [cache_tags.tag_tag(tag.pk)],
+        [cache_namespace.tag_namespace(tag.pk), cache_namespace.SIDEBAR])
+
+
+def purge_author(username):
+    return _invalidate(
+        [cache_tags.author_tag(username)],
+        [cache_namespace.author_namespace(username)])
+
+
+def purge_namespace(name):
+    """按名称清理一类缓存，name 取值见 NAMESPACES"""
+    if name == SIDEBAR:
+        return _invalidate(namespaces=[cache_namespace.SIDEBAR])
+    if name == SEO:
+        return _invalidate(namespaces=[cache_namespace.SEO])
+    if name == SETTINGS:
+        # 配置出现在所有页面中，整页缓存一起失效
+        stats = _invalidate(
+            [cache_tags.SETTINGS], [cache_namespace.SIDEBAR, cache_namespace.SEO, cache_namespace.PAGE])
+        stats['keys'] += cache.delete('get_blog_setting')
+        return stats
+    if name == LISTS:
+        from blog import category_forest
+        from blog.models import Article, Category, Tag
+        category_forest.invalidate()
+        # 列表页同时保存在整页缓存中
+        namespaces = [cache_namespace.INDEX, cache_namespace.PAGE]
+        namespaces.extend(cache_namespace.category_namespace(pk)
+                          for pk in Category.objects.values_list('id', flat=True))
+        namespaces.extend(cache_namespace.tag_namespace(pk)
+                          for pk in Tag.objects.values_list('id', flat=True))
+        namespaces.extend(cache_namespace.author_namespace(username)
+                          for username in Article.objects.values_list('author__username', flat=True).distinct())
+        return _invalidate([cache_tags.ARTICLE_LIST, cache_tags.CATEGORY_TREE], namespaces)
+    if name == PAGES:
+        return _invalidate(namespaces=[cache_namespace.PAGE])
+    if name == CONTENT:
+        # 进程内的高亮缓存只能清理当前进程，其他进程按 LRU 淘汰
+        highlight_cache._local_cache.clear()
+        stats = Counter()
+        for prefix in CONTENT_PREFIXES:
+            stats += purge_prefix(prefix)
+        return stats
+    raise ValueError(f'unknown cache namespace: {name}')
+
+
+def purge_all(names=DEFAULT_NAMESPACES):
+    """清理页面相关的全部缓存，验证码、会话等其他数据不受影响"""
+    stats = Counter()
+    for name in names:
+        stats += purge_namespace(name)
+    return stats
+
+
+def purge(articles=(), categories=(), tags=(), authors=(), namespaces=(), prefixes=(), content=False):
+    """
+    按实体id、用户名、命名空间名称、键前缀清理缓存，什么都不指定时调用 purge_all
+    供管理后台、clean 接口和 clear_cache 命令使用
+    """
+    from blog.models import Article, Category, Tag
+    stats = Counter()
+    for article in Article.objects.select_related('author', 'category').filter(pk__in=articles):
+        stats += purge_article(article, content=content)
+    for category in Category.objects.filter(pk__in=categories):
+        stats += purge_category(category)
+    for tag in Tag.objects.filter(pk__in=tags):
+        stats += purge_tag(tag)
+    for username in authors:
+        stats += purge_author(username)
+    for name in namespaces:
+        stats += purge_namespace(name)
+    for prefix in prefixes:
+        stats += purge_prefix(prefix)
+    if not any((articles, categories, tags, authors, namespaces, prefixes)):
+        stats += purge_all()
+    return stats
+
+
+def format_stats(stats):
+    return 'tags: {tags}, namespaces: {namespaces}, keys: {keys}'.format(
+        tags=stats['tags'], namespaces=stats['namespaces'], keys=stats['keys'])
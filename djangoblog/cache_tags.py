@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+缓存依赖标签
+
+缓存值在写入时记录它依赖的实体标签（如 article:1、category:2、tag:3、author:admin、settings）
+以及这些标签当时的版本号；读取时版本号不一致即视为失效。
+实体保存后调用 invalidate_tags 更新相关标签的版本号，
+所有依赖这些标签的缓存（包括列表的每一页）随之失效，不需要逐个枚举缓存键。
+
+版本号使用随机值而不是自增计数：版本键被淘汰后重新生成的版本一定与旧版本不同，
+依赖它的缓存只会多失效而不会误命中。
+"""
+
+import logging
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TAG_VERSION_KEY = 'cache_tag_version:{tag}'
+
+# 常用标签
+ARTICLE_LIST = 'article_list'  # 文章集合（新增、发布、删除文章会改变所有列表和上下篇）
+CATEGORY_TREE = 'category_tree'  # 分类层级结构
+SETTINGS = 'settings'  # 网站配置
+
+TaggedValue = namedtuple('TaggedValue', ['value', 'tag_versions'])
+
+
+def article_tag(article_id):
+    return f'article:{article_id}'
+
+
+def category_tag(category_id):
+    return f'category:{category_id}'
+
+
+def tag_tag(tag_id):
+    return f'tag:{tag_id}'
+
+
+def author_tag(username):
+    return f'author:{username}'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def get_tag_versions(tags):
+    """
+    获取标签当前的版本号，不存在的标签会初始化
+    :return: {tag: version}
+    """
+    tags = set(tags)
+    if not tags:
+        return {}
+    keys = {tag: TAG_VERSION_KEY.format(tag=tag) for tag in tags}
+    stored = cache.get_many(list(keys.values()))
+    versions = {}
+    for tag, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            version = _new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions[tag] = version
+    return versions
+
+
+def is_valid(tag_versions):
+    """记录的版本号是否仍然是标签的当前版本"""
+    if not tag_versions:
+        return True
+    return get_tag_versions(tag_versions.keys()) == tag_versions
+
+
+def set_tagged(key, value, tags=(), timeout=None, tag_versions=None):
+    """
+    写入带依赖标签的缓存
+    :param tag_versions: 计算前获取的标签版本；计算期间标签失效时写入的值会被视为过期
+    """
+    versions = dict(tag_versions or {})
+    versions.update(get_tag_versions(set(tags) - set(versions)))
+    if timeout is None:
+        cache.set(key, TaggedValue(value, versions))
+    else:
+        cache.set(key, TaggedValue(value, versions), timeout)
+
+
+def get_tagged(key, default=None):
+    """读取带依赖标签的缓存，依赖的任一标签失效时返回 default"""
+    entry = cache.get(key)
+    if not isinstance(entry, TaggedValue) or not is_valid(entry.tag_versions):
+        return default
+    return entry.value
+
+
+def invalidate_tags(*tags):
+    """使依赖这些标签的缓存全部失效"""
+    tags = {tag for tag in tags if tag}
+    if not tags:
+        return
+    cache.set_many({TAG_VERSION_KEY.format(tag=tag): _new_version() for tag in tags}, None)
+    logger.info('invalidate cache tags: %s', ', '.join(sorted(tags)))
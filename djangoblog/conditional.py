@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+条件请求（ETag / Last-Modified）
+
+ConditionalGetMiddleware 只能在页面渲染完成后对响应内容计算哈希，304 仍然要完整渲染一次。
+这里在执行视图之前，用内容的版本信息（文章修改时间、命名空间代数等）计算 ETag，
+请求头匹配时直接返回 304，不执行查询和模板渲染。
+页面的 gzip 和未压缩内容使用同一个 ETag，按 RFC 9110 只能是弱 ETag（W/"..."）。
+
+侧边栏和导航在页面片段中按请求渲染（见 djangoblog.page_holes），页面的 ETag 只包含它自己依赖的
+实体命名空间（文章、评论、分类、标签等）的代数，以及整站配置修改时更新的 page 命名空间。
+"""
+
+import hashlib
+
+from django.db.models import Max
+
+from djangoblog import cache_namespace
+
+# 所有页面共同依赖的命名空间
+PAGE_NAMESPACES = (cache_namespace.PAGE,)
+
+
+def make_etag(*parts):
+    m = hashlib.sha256()
+    for part in parts:
+        m.update(str(part).encode('utf-8'))
+        m.update(b'\0')
+    return m.hexdigest()[:32]
+
+
+def get_namespace_parts(namespaces):
+    return get_generation_parts(cache_namespace.get_generations(namespaces))
+
+
+def get_generation_parts(generations):
+    return [f'{namespace}={generations[namespace]}' for namespace in sorted(generations)]
+
+
+def get_request_parts(request):
+    """与请求相关的部分：当前用户（页面中的用户片段）和语言"""
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else 0
+    return [user_id, getattr(request, 'LANGUAGE_CODE', '')]
+
+
+def build_etag(request, parts, generations):
+    """
+    由视图的版本信息和依赖的命名空间代数 {namespace: generation} 计算当前请求的 ETag
+    整页缓存保存 parts 和 generations，命中时用同一方法按当前请求重新计算（见 PageCacheMiddleware）
+    :return: 弱 ETag，不同的内容编码之间语义相同
+    """
+    return 'W/"%s"' % make_etag(*parts, *get_request_parts(request), *get_generation_parts(generations))
+
+
+def get_latest_article_time():
+    from blog.models import Article
+    return Article.objects.filter(status='p').aggregate(
+        latest=Max('last_modify_time'))['latest']
+
+
+def feed_etag(request, *args, **kwargs):
+    return make_etag('feed', request.path, *get_namespace_parts([cache_namespace.INDEX, cache_namespace.SEO]))
+
+
+def feed_last_modified(request, *args, **kwargs):
+    return get_latest_article_time()
+
+
+def sitemap_etag(request, *args, **kwargs):
+    return make_etag(
+        'sitemap', request.path, *get_namespace_parts([cache_namespace.INDEX, cache_namespace.SIDEBAR]))
+
+
+def sitemap_last_modified(request, *args, **kwargs):
+    return get_latest_article_time()
@@ -44,6 +44,9 @@ class CacheKey:
     ARTICLE_NEXT = 'article_next_{article_id}'
     ARTICLE_PREV = 'article_prev_{article_id}'
     ARTICLE_CATEGORY_TREE = 'article_category_tree_{article_id}'
+    ARTICLE_CONTENT_FILTERED = 'article_content_{article_id}_{digest}'
+    MARKDOWN_BLOCK = 'markdown_block_{digest}'
+    CODE_HIGHLIGHT = 'code_highlight_{digest}'
 
     # 列表页缓存
     INDEX_LIST = 'index_{page}'
@@ -57,10 +60,14 @@ class CacheKey:
     SUB_CATEGORIES = 'sub_categories_{category_id}'
     TAG_ARTICLE_COUNT = 'tag_article_count_{tag_id}'
 
+    # 评论
+    COMMENT_REACTIONS = 'comment_reactions_{comment_id}'
+
     # 全局设置
     BLOG_SETTINGS = 'blog_settings'
     CURRENT_SITE = 'current_site'
     SIDEBAR = 'sidebar_{type}'
+    PAGE_CACHE = 'page_cache_{digest}'
 
     # 侧边栏相关
     SIDEBAR_LATEST_ARTICLES = 'sidebar_latest_articles'
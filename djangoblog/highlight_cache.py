@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+代码高亮缓存
+
+codehilite 每次渲染都会对每个代码块重新执行 Pygments 词法分析和格式化，
+编程类文章的渲染时间大部分花在这里，而且同样的代码片段经常出现在多篇文章中。
+这里按 (语言, 代码, 格式化选项) 的哈希缓存高亮结果：
+    第一层：进程内有界 LRU
+    第二层：Django 共享缓存（多进程/多机共享）
+"""
+
+import hashlib
+import logging
+
+import pygments
+from django.core.cache import cache
+
+from djangoblog.constants import CacheKey, CacheTimeout
+from djangoblog.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+_local_cache = LRUCache()
+
+
+def get_highlight_key(code, lexer, formatter):
+    """
+    高亮结果的内容哈希：Pygments 版本 + 词法分析器及选项 + 格式化器及选项 + 代码
+    """
+    m = hashlib.sha256()
+    for part in (
+            pygments.__version__,
+            type(lexer).__name__,
+            repr(sorted(lexer.options.items())),
+            type(formatter).__name__,
+            repr(sorted(formatter.options.items())),
+    ):
+        m.update(part.encode('utf-8'))
+        m.update(b'\0')
+    m.update(code.encode('utf-8'))
+    return m.hexdigest()
+
+
+def cached_highlight(code, lexer, formatter, outfile=None):
+    """
+    与 pygments.highlight 参数相同，先查进程内缓存，再查共享缓存，都未命中才调用 Pygments
+    """
+    if outfile is not None:
+        return pygments.highlight(code, lexer, formatter, outfile)
+
+    digest = get_highlight_key(code, lexer, formatter)
+    value = _local_cache.get(digest)
+    if value is not None:
+        return value
+
+    key = CacheKey.CODE_HIGHLIGHT.format(digest=digest)
+    value = cache.get(key)
+    if value is None:
+        value = pygments.highlight(code, lexer, formatter)
+        cache.set(key, value, CacheTimeout.DAY_7)
+        logger.debug('Highlight MISS: %s', digest)
+    _local_cache.set(digest, value)
+    return value
+
+
+def install():
+    """
+    让 codehilite 扩展调用带缓存的高亮函数
+
+    codehilite 的 CodeHilite.hilite 通过模块级的 highlight 调用 Pygments，
+    fenced_code 与缩进代码块都经过这里，替换该名称即可覆盖所有代码块。
+    """
+    from markdown.extensions import codehilite
+    if getattr(codehilite, 'highlight', None) is pygments.highlight:
+        codehilite.highlight = cached_highlight
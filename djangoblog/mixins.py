@@ -122,11 +122,16 @@ class OptimizedArticleQueryMixin:
     使用 select_related 和 prefetch_related 优化文章查询，
     减少数据库查询次数，避免 N+1 查询问题
 
+    列表页不加载正文（body 可能很大），摘要读取预渲染结果，
+    模板中误访问 body 时 Article.refresh_from_db 会记录警告
+
     Usage:
         class MyView(OptimizedArticleQueryMixin, ListView):
             def get_queryset(self):
                 return self.get_optimized_article_queryset().filter(status='p')
     """
+    # 列表页只需要预渲染结果中的摘要
+    list_deferred_fields = ('body', 'rendered__html', 'rendered__toc', 'rendered__plain_text')
 
     def get_optimized_article_queryset(self):
         """
@@ -135,10 +140,13 @@ class OptimizedArticleQueryMixin:
         使用 select_related 预加载外键关联：
             - author: 文章作者
             - category: 文章分类
+            - rendered: 预渲染结果（列表页摘要）
 
         使用 prefetch_related 预加载多对多关联：
             - tags: 文章标签
 
+        使用 defer 延迟加载 list_deferred_fields（正文和预渲染的全文）
+
         Returns:
             QuerySet: 优化后的 Article queryset
         """
@@ -146,18 +154,50 @@ class OptimizedArticleQueryMixin:
 
         return Article.objects.select_related(
             'author',      # 预加载作者（ForeignKey）
-            'category'     # 预加载分类（ForeignKey）
+            'category',    # 预加载分类（ForeignKey）
+            'rendered'     # 预加载预渲染结果（OneToOne）
         ).prefetch_related(
             'tags'         # 预加载标签（ManyToMany）
-        )
+        ).defer(*self.list_deferred_fields)
+
+
+class CachedPageList:
+    """
+    缓存的单页数据
+
+    只保存当前页已查询出的对象和总数，交给 Paginator 使用：
+    count() 直接返回缓存的总数，切片时按当前页的偏移量返回缓存的对象，不会再查询数据库
+    """
+
+    def __init__(self, rows, count, offset=0):
+        self.rows = rows
+        self.total = count
+        self.offset = offset
+
+    def count(self):
+        return self.total
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = (index.start or 0) - self.offset
+            stop = (self.total if index.stop is None else index.stop) - self.offset
+            return self.rows[max(start, 0):max(stop, 0)]
+        return self.rows[index - self.offset]
 
 
 class CachedListViewMixin:
     """
     Mixin: 为 ListView 提供统一的缓存逻辑
 
-    自动缓存 queryset 结果，减少数据库查询
-    子类需要实现 get_queryset_cache_key() 和 get_queryset_data() 方法
+    缓存当前页的对象和总数（而不是未求值的 QuerySet），命中缓存时不再查询和计数
+    子类需要实现 get_queryset_cache_key() 和 get_queryset_data() 方法，
+    缓存键需要包含页码；get_cache_namespace() 返回的命名空间失效时所有分页一起失效
 
     Usage:
         class MyView(CachedListViewMixin, ListView):
@@ -196,39 +236,151 @@ class CachedListViewMixin:
             f'{self.__class__.__name__} must implement get_queryset_data()'
         )
 
+    def get_cache_namespace(self):
+        """
+        子类实现：返回列表所属的缓存命名空间（见 djangoblog.cache_namespace）
+
+        Returns:
+            str: 命名空间，None 表示不使用命名空间
+        """
+        return None
+
+    def get_queryset_cache_tags(self):
+        """
+        子类实现：返回列表依赖的缓存标签（见 djangoblog.cache_tags），标签失效时所有分页的缓存失效
+
+        Returns:
+            list: 缓存标签
+        """
+        return []
+
+    def get_row_cache_tags(self, rows):
+        """
+        当前页每个对象的缓存标签（如 article:1），对象修改后包含它的分页失效
+        """
+        return ['{name}:{pk}'.format(name=row._meta.model_name, pk=row.pk) for row in rows]
+
+    def get_page_rows(self, queryset):
+        """
+        查询当前页的对象和总数
+
+        Args:
+            queryset: 完整的 queryset
+
+        Returns:
+            CachedPageList: 当前页数据（不分页时为全部对象）
+        """
+        per_page = self.get_paginate_by(queryset)
+        if not per_page:
+            rows = list(queryset)
+            return CachedPageList(rows, len(rows))
+
+        count = queryset.count()
+        page_number = self.page_number
+        if page_number == 'last':
+            # 与 ListView.paginate_queryset 一致，按总数计算最后一页
+            page_number = self.get_paginator(
+                CachedPageList([], count), per_page,
+                orphans=self.get_paginate_orphans(),
+                allow_empty_first_page=self.get_allow_empty()).num_pages
+        offset = (page_number - 1) * per_page
+        rows = list(queryset[offset:offset + per_page]) if 0 <= offset < count else []
+        return CachedPageList(rows, count, offset)
+
     def get_queryset_from_cache(self, cache_key):
         """
-        从缓存获取 queryset，如果缓存不存在则查询并缓存
+        从缓存获取当前页数据，如果缓存不存在则查询并缓存
 
         Args:
             cache_key: 缓存键
 
         Returns:
-            QuerySet: 查询结果
+            CachedPageList: 当前页数据
         """
-        from djangoblog.utils import cache
+        from djangoblog import cache_tags
 
-        value = cache.get(cache_key)
-        if value:
+        value = cache_tags.get_tagged(cache_key)
+        if isinstance(value, CachedPageList):
             logger.info(f'Cache HIT: {cache_key}')
             return value
 
-        queryset = self.get_queryset_data()
-        cache.set(cache_key, queryset)
+        # 查询前记录标签版本，查询期间发生的修改会使本次写入的缓存失效
+        tag_versions = cache_tags.get_tag_versions(self.get_queryset_cache_tags())
+        value = self.get_page_rows(self.get_queryset_data())
+        cache_tags.set_tagged(
+            cache_key, value, self.get_row_cache_tags(value.rows), tag_versions=tag_versions)
         logger.info(f'Cache MISS: {cache_key}')
-        return queryset
+        return value
 
     def get_queryset(self):
         """
         重写 get_queryset，使用缓存
 
         Returns:
-            QuerySet: 查询结果（从缓存或数据库）
+            CachedPageList: 当前页数据（从缓存或数据库）
         """
+        from djangoblog import cache_namespace
+
         key = self.get_queryset_cache_key()
+        namespace = self.get_cache_namespace()
+        if namespace:
+            key = cache_namespace.make_key(namespace, key)
         return self.get_queryset_from_cache(key)
 
 
+class ConditionalGetMixin:
+    """
+    Mixin: 在执行视图之前计算 ETag，条件请求匹配时直接返回 304
+
+    ETag 由子类提供的版本信息、页面依赖的命名空间代数、当前用户和语言组成，见 djangoblog.conditional；
+    整页缓存同样按这些命名空间判断缓存的页面是否失效
+
+    Usage:
+        class MyView(ConditionalGetMixin, DetailView):
+            def get_etag_parts(self):
+                return ['my_view', self.kwargs['pk']]
+    """
+
+    def get_etag_parts(self):
+        """
+        子类实现：返回页面内容的版本信息
+
+        Returns:
+            list: 版本信息，返回 None 表示不计算 ETag
+        """
+        return None
+
+    def get_etag_namespaces(self):
+        """页面依赖的缓存命名空间，子类加上页面实体的命名空间"""
+        from djangoblog import conditional
+        return list(conditional.PAGE_NAMESPACES)
+
+    def get_etag(self, request, *args, **kwargs):
+        from djangoblog import cache_namespace, conditional
+
+        parts = self.get_etag_parts()
+        if parts is None:
+            return None
+        parts = [str(part) for part in parts]
+        # 渲染之前记录代数，渲染期间发生的修改会使本次写入的整页缓存失效
+        generations = cache_namespace.get_generations(self.get_etag_namespaces())
+        # 整页缓存保存计算方法，命中缓存时按当前请求重新计算并处理条件请求
+        request.page_etag = (parts, generations)
+        return conditional.build_etag(request, parts, generations)
+
+    def not_modified(self, request, *args, **kwargs):
+        """子类实现：返回 304 时视图没有执行，在这里处理仍需执行的操作（如记录阅读）"""
+
+    def dispatch(self, request, *args, **kwargs):
+        from django.views.decorators.http import condition
+
+        view = condition(etag_func=self.get_etag)(super().dispatch)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 304:
+            self.not_modified(request, *args, **kwargs)
+        return response
+
+
 class PageNumberMixin:
     """
     Mixin: 提供页码获取功能
@@ -250,10 +402,13 @@ class PageNumberMixin:
         从 URL kwargs 或 GET 参数中获取页码，默认为 1
 
         Returns:
-            int: 当前页码
+            int | str: 当前页码；'last' 表示最后一页（与 ListView 一致），
+                       页码在查询时按总数确定，缓存键中保留 'last'
         """
         page = self.kwargs.get(self.page_kwarg) or \
                self.request.GET.get(self.page_kwarg) or 1
+        if page == 'last':
+            return page
 
         try:
             return int(page)
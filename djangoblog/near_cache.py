@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+进程内近端缓存
+
+网站配置、当前站点、seo_processor 和侧边栏的数据每个请求都要读取，
+使用 redis 时每次都是一次网络往返加反序列化，而这些数据很少变化。
+这里在每个进程内再加一层有界、短 TTL 的缓存：
+    第一层：进程内 LRU（NEAR_CACHE_TTL 秒后过期）
+    第二层：Django 共享缓存
+
+一致性通过共享缓存中的版本号保证：invalidate() 递增版本号，
+各进程每 NEAR_CACHE_CHECK_INTERVAL 秒最多读取一次版本号，发现变化就清空本地缓存。
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from djangoblog.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+NEAR_CACHE_VERSION_KEY = 'near_cache_version'
+NEAR_CACHE_TTL = getattr(settings, 'NEAR_CACHE_TTL', 60)
+NEAR_CACHE_CHECK_INTERVAL = getattr(settings, 'NEAR_CACHE_CHECK_INTERVAL', 1)
+
+
+class NearCache:
+    """带 TTL 和共享版本号校验的进程内缓存"""
+
+    def __init__(self, max_size=256, ttl=NEAR_CACHE_TTL, check_interval=NEAR_CACHE_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._data = LRUCache(max_size)
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_check = 0
+
+    def _sync(self):
+        """按间隔检查共享版本号，其他进程失效过缓存时清空本地数据"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            version = cache.get(NEAR_CACHE_VERSION_KEY)
+            if version is None:
+                # 版本号被淘汰或共享缓存被清空，重新生成的版本号一定与本地记录不同
+                version = time.time_ns()
+                if not cache.add(NEAR_CACHE_VERSION_KEY, version, None):
+                    version = cache.get(NEAR_CACHE_VERSION_KEY, version)
+            if version != self._version:
+                self._data.clear()
+                self._version = version
+            self._next_check = now + self.check_interval
+
+    def get(self, key):
+        self._sync()
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            return None
+        return value
+
+    def set(self, key, value):
+        if value is not None:
+            self._data.set(key, (value, time.monotonic() + self.ttl))
+
+    def clear(self):
+        self._data.clear()
+
+    def invalidate(self):
+        """清空本进程的数据，并通知其他进程在下次检查时清空"""
+        self._data.clear()
+        try:
+            cache.incr(NEAR_CACHE_VERSION_KEY)
+        except ValueError:
+            if not cache.add(NEAR_CACHE_VERSION_KEY, time.time_ns(), None):
+                cache.incr(NEAR_CACHE_VERSION_KEY)
+        logger.info('invalidate near cache')
+
+
+near_cache = NearCache()
+
+
+def near_cached(key):
+    """
+    无参数函数的进程内缓存，未命中时调用原函数（原函数通常再读取共享缓存）
+    """
+
+    def wrapper(func):
+        @functools.wraps(func)
+        def news():
+            value = near_cache.get(key)
+            if value is None:
+                value = func()
+                near_cache.set(key, value)
+            return value
+
+        return news
+
+    return wrapper
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+页面挖洞（hole punching）
+
+文章正文、目录、评论树渲染开销大但与用户无关，登录状态、评论表单（含 CSRF token）、
+管理链接、表情回应等与用户相关的部分很小。侧边栏和导航出现在所有页面中，随任何文章、评论、分类的修改变化，
+同样挖洞，数据来自近端缓存，页面本身只依赖自己的实体（见 blog.middleware.PageCacheMiddleware）。
+模板中用 {% page_hole %} 标记这些片段：
+整页缓存开启时只输出一个带签名的占位注释，缓存的页面因此可以在所有用户之间共享；
+PageCacheMiddleware 返回响应前按当前请求渲染各个占位片段并替换。
+没有经过整页缓存的请求（如 POST、测试中直接渲染模板）在模板中直接渲染片段。
+
+片段通过 register 注册：模板名 + 根据参数构造上下文的函数，参数只能是可 JSON 序列化的简单值。
+片段中嵌套的片段（如侧边栏中的账号信息）在填充时直接渲染。
+"""
+
+import logging
+import re
+
+from django.core import signing
+from django.template import engines
+from django.template.context_processors import csrf
+from django.template.loader import get_template
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+HOLE_SALT = 'djangoblog.page_holes'
+HOLE_MARKER = '<!--page-hole:{token}-->'
+HOLE_PREFIX = '<!--page-hole:'
+HOLE_RE = re.compile(r'<!--page-hole:([\w.:\-]+)-->')
+
+# warm_cache 命令发出的预热请求带有该请求头，不应计为文章阅读
+# 请求头的值由 SECRET_KEY 派生（见 get_warm_token），客户端无法伪造
+WARM_HEADER = 'X-Cache-Warm'
+WARM_SALT = 'djangoblog.page_holes.warm'
+
+_holes = {}
+_not_modified_holes = set()
+_inline_holes = set()
+
+
+def register(name, template_name, prefetch=None, not_modified=False, inline=False):
+    """
+    注册片段
+    :param template_name: 片段模板
+    :param prefetch: prefetch(request, kwargs_list)，填充前以页面上同名片段的全部参数调用一次，
+                     用于批量加载数据（如所有评论的表情回应），结果可保存在 request 上供 builder 使用
+    :param not_modified: builder 有副作用（如记录阅读），整页缓存返回 304 时也要执行
+    :param inline: 片段的数据只由 builder 提供（如侧边栏），直接渲染时同样调用 builder
+    被装饰的函数 builder(request, **kwargs) 返回填充时额外需要的上下文
+    """
+
+    def wrapper(builder):
+        _holes[name] = (template_name, builder, prefetch)
+        if not_modified:
+            _not_modified_holes.add(name)
+        if inline:
+            _inline_holes.add(name)
+        return builder
+
+    return wrapper
+
+
+def is_enabled(request):
+    """本次请求是否由 PageCacheMiddleware 统一填充片段"""
+    return getattr(request, 'page_holes', False)
+
+
+def get_warm_token():
+    """预热请求头的值，只有持有 SECRET_KEY 的 warm_cache 命令能生成"""
+    return salted_hmac(WARM_SALT, 'warm').hexdigest()
+
+
+def is_warming(request):
+    """是否为缓存预热请求，请求头的值不正确时按普通请求处理"""
+    if request is None:
+        return False
+    token = request.META.get('HTTP_X_CACHE_WARM')
+    return bool(token) and constant_time_compare(token, get_warm_token())
+
+
+def render_marker(name, **kwargs):
+    token = signing.dumps([name, kwargs], salt=HOLE_SALT)
+    return mark_safe(HOLE_MARKER.format(token=token))
+
+
+def render_inline(name, context, **kwargs):
+    """直接在当前模板上下文中渲染片段"""
+    template_name, builder, _ = _holes[name]
+    request = getattr(context, 'request', None)
+    values = context.flatten()
+    values.update(kwargs)
+    if name in _inline_holes:
+        values.update(builder(request or values.get('request'), **kwargs) or {})
+    return get_template(template_name).render(values, request)
+
+
+def _context_processor_values(request):
+    """
+    上下文处理器的结果（如 seo_processor 提供的 COMMENT_NEED_REVIEW），与直接渲染时的模板上下文一致
+    一个页面有多个片段，每个请求只执行一次
+    """
+    values = getattr(request, 'page_hole_context', None)
+    if values is None:
+        values = {}
+        for processor in engines['django'].engine.template_context_processors:
+            values.update(processor(request))
+        request.page_hole_context = values
+    return values
+
+
+def render_hole(request, name, **kwargs):
+    """按当前请求渲染片段，模板上下文中没有 request 属性，嵌套的片段直接渲染"""
+    template_name, builder, _ = _holes[name]
+    values = dict(_context_processor_values(request))
+    values.update({'request': request, 'user': request.user})
+    values.update(csrf(request))
+    values.update(kwargs)
+    values.update(builder(request, **kwargs) or {})
+    return get_template(template_name).render(values)
+
+
+def _load_holes(content):
+    """解析页面中的占位：{token: (name, kwargs)}，忽略签名无效的占位"""
+    holes = {}
+    for token in HOLE_RE.findall(content):
+        try:
+            holes[token] = signing.loads(token, salt=HOLE_SALT)
+        except signing.BadSignature:
+            # 不是由模板生成的占位（如文章正文中的同名注释），原样保留
+            continue
+    return holes
+
+
+def _prefetch(request, holes):
+    """按片段名称分组，调用各片段的 prefetch"""
+    grouped = {}
+    for name, kwargs in holes:
+        grouped.setdefault(name, []).append(kwargs)
+    for name, kwargs_list in grouped.items():
+        prefetch = _holes[name][2] if name in _holes else None
+        if prefetch is None:
+            continue
+        try:
+            prefetch(request, kwargs_list)
+        except Exception as e:
+            logger.error('page hole prefetch failed: %s', e)
+
+
+def fill(request, content):
+    """替换页面中的所有占位片段"""
+    if HOLE_PREFIX not in content:
+        return content
+
+    holes = _load_holes(content)
+    _prefetch(request, holes.values())
+
+    def replace(match):
+        hole = holes.get(match.group(1))
+        if hole is None:
+            return match.group(0)
+        name, kwargs = hole
+        try:
+            return render_hole(request, name, **kwargs)
+        except Exception as e:
+            logger.error('page hole render failed: %s', e)
+            return ''
+
+    return HOLE_RE.sub(replace, content)
+
+
+def run_not_modified(request, content):
+    """整页缓存返回 304 时不渲染页面，只执行有副作用的片段"""
+    if HOLE_PREFIX not in content:
+        return
+    for name, kwargs in _load_holes(content).values():
+        if name not in _not_modified_holes:
+            continue
+        try:
+            _holes[name][1](request, **kwargs)
+        except Exception as e:
+            logger.error('page hole not modified failed: %s', e)
+
+
+def record_article_read(request, article_id):
+    """通知插件文章被阅读（如浏览量统计），预热请求不计入"""
+    from blog.models import Article
+    from djangoblog.plugin_manage import hooks
+    if is_warming(request):
+        return
+    article = Article.objects.only('id', 'views').filter(pk=article_id).first()
+    if article is not None:
+        hooks.run_action('after_article_body_get', article=article, request=request)
+
+
+@register('authenticated', 'share_layout/hole_authenticated.html')
+def authenticated_hole(request):
+    return {}
+
+
+@register('nav', 'share_layout/nav.html')
+def nav_hole(request):
+    """导航的分类、页面和文章数来自 seo_processor"""
+    return {}
+
+
+@register('sidebar', 'blog/tags/sidebar.html', inline=True)
+def sidebar_hole(request, linktype):
+    from blog.templatetags.blog_tags import load_sidebar
+    return load_sidebar(request.user, linktype)
+
+
+@register('sidebar_account', 'blog/tags/sidebar_account.html')
+def sidebar_account_hole(request):
+    return {}
+
+
+@register('article_admin_link', 'blog/tags/article_admin_link.html')
+def article_admin_link_hole(request, admin_url):
+    return {}
+
+
+@register('article_read', 'blog/tags/article_read.html', not_modified=True)
+def article_read_hole(request, article_id):
+    """不输出内容：命中整页缓存时视图没有执行，在这里通知插件文章被阅读（如浏览量统计）"""
+    record_article_read(request, article_id)
+    return {}
+
+
+@register('comment_form', 'comments/tags/comment_form_hole.html')
+def comment_form_hole(request, article_id):
+    from comments.forms import CommentForm
+    return {'form': CommentForm()}
+
+
+def prefetch_comment_reactions(request, kwargs_list):
+    """一次加载页面上所有评论的表情回应"""
+    from comments.utils import load_reactions
+    request.comment_reactions = load_reactions(
+        [kwargs['comment_id'] for kwargs in kwargs_list], request.user)
+
+
+@register('comment_reactions', 'comments/tags/comment_reactions.html', prefetch=prefetch_comment_reactions)
+def comment_reactions_hole(request, comment_id):
+    from comments.models import Comment
+    comment = Comment(pk=comment_id)
+    summaries = getattr(request, 'comment_reactions', {})
+    if comment_id in summaries:
+        comment.reactions_summary = summaries[comment_id]
+    return {'comment_item': comment}
+
+
+@register('comment_reply', 'comments/tags/comment_reply.html')
+def comment_reply_hole(request, comment_id):
+    return {}
@@ -0,0 +1,173 @@
+"""
+文章内容单次解析处理管线
+
+the_content 过滤器链原本由各插件分别用正则扫描整段 HTML。
+这里把 HTML 只解析一次为事件流（开始标签、文本、结束标签……），
+注册为 ContentTransformer 的插件在同一次遍历中处理自己关心的元素，
+最后统一序列化输出。未改动的标签原样输出，保证输出与输入一致。
+
+普通的字符串过滤器（callable）仍然可以注册到钩子上，
+hooks.apply_filters 会把相邻的转换器合并为一次解析，与字符串过滤器按注册顺序交替执行。
+"""
+import logging
+from html import escape
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+
+class ContentTransformer:
+    """
+    元素级内容转换器基类
+
+    TAGS: 需要处理的开始标签，如 ('img', 'a')
+    HANDLE_TEXT: 是否需要处理文本节点
+    PURE: 输出是否只依赖内容和文章字段（与请求无关），纯转换器的结果可按文章缓存
+    """
+    TAGS = ()
+    HANDLE_TEXT = False
+    PURE = False
+
+    def begin(self, document, *args, **kwargs):
+        """
+        每次处理内容前调用，参数与 apply_filters 相同
+        :return: False 表示本次不参与处理（如摘要模式）
+        """
+        return True
+
+    def handle_starttag(self, tag, attrs, document):
+        """
+        处理开始标签
+        :param attrs: 属性字典（值已反转义）
+        :return: 新的属性字典；返回 None 表示不修改，原样输出
+        """
+        return None
+
+    def handle_text(self, text, document):
+        """
+        处理文本节点（原始 HTML 文本，未反转义）
+        :return: 替换后的文本；返回 None 表示不修改
+        """
+        return None
+
+    def finish(self, document):
+        """全部内容遍历完成后调用，可通过 document.prepend/append 添加内容"""
+        pass
+
+
+class ContentDocument:
+    """单次处理过程的状态，转换器实例是共享的，状态都保存在这里"""
+
+    def __init__(self):
+        self._prefix = []
+        self._suffix = []
+        self._states = {}
+
+    def get_state(self, transformer):
+        """获取转换器在本次处理中的私有状态字典"""
+        return self._states.setdefault(id(transformer), {})
+
+    def prepend(self, html):
+        # 与字符串过滤器逐个拼接的效果一致：后执行的插件内容在最前面
+        self._prefix.insert(0, html)
+
+    def append(self, html):
+        self._suffix.append(html)
+
+    def wrap(self, body):
+        return ''.join(self._prefix) + body + ''.join(self._suffix)
+
+
+def serialize_starttag(tag, attrs, self_closing=False):
+    parts = [tag]
+    for name, value in attrs.items():
+        if value is None:
+            parts.append(name)
+        else:
+            parts.append(f'{name}="{escape(value, quote=True)}"')
+    return '<{}{}>'.format(' '.join(parts), ' /' if self_closing else '')
+
+
+class _ContentParser(HTMLParser):
+    def __init__(self, transformers, document):
+        super().__init__(convert_charrefs=False)
+        self.document = document
+        self.output = []
+        self.tag_handlers = {}
+        self.text_handlers = [t for t in transformers if t.HANDLE_TEXT]
+        for transformer in transformers:
+            for tag in transformer.TAGS:
+                self.tag_handlers.setdefault(tag, []).append(transformer)
+
+    def _handle_start(self, tag, attrs, self_closing):
+        raw = self.get_starttag_text()
+        handlers = self.tag_handlers.get(tag)
+        if not handlers:
+            self.output.append(raw)
+            return
+        attrs = dict(attrs)
+        changed = False
+        for transformer in handlers:
+            result = transformer.handle_starttag(tag, attrs, self.document)
+            if result is not None:
+                attrs = result
+                changed = True
+        self.output.append(serialize_starttag(tag, attrs, self_closing) if changed else raw)
+
+    def handle_starttag(self, tag, attrs):
+        self._handle_start(tag, attrs, False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._handle_start(tag, attrs, True)
+
+    def handle_endtag(self, tag):
+        self.output.append(f'</{tag}>')
+
+    def handle_data(self, data):
+        for transformer in self.text_handlers:
+            result = transformer.handle_text(data, self.document)
+            if result is not None:
+                data = result
+        self.output.append(data)
+
+    def handle_entityref(self, name):
+        self.output.append(f'&{name};')
+
+    def handle_charref(self, name):
+        self.output.append(f'&#{name};')
+
+    def handle_comment(self, data):
+        self.output.append(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self.output.append(f'<!{decl}>')
+
+    def unknown_decl(self, data):
+        self.output.append(f'<![{data}]>')
+
+    def handle_pi(self, data):
+        self.output.append(f'<?{data}>')
+
+
+def apply_transformers(value, transformers, *args, **kwargs):
+    """
+    对 HTML 执行一组转换器：只解析一次、序列化一次
+    """
+    if not isinstance(value, str):
+        return value
+
+    document = ContentDocument()
+    active = [t for t in transformers if t.begin(document, *args, **kwargs) is not False]
+    if not active:
+        return value
+
+    body = value
+    if any(t.TAGS or t.HANDLE_TEXT for t in active):
+        parser = _ContentParser(active, document)
+        parser.feed(value)
+        parser.close()
+        body = ''.join(parser.output)
+
+    for transformer in active:
+        transformer.finish(document)
+    return document.wrap(body)
@@ -1,18 +1,25 @@
 import logging
 
+from djangoblog.plugin_manage.content_pipeline import ContentTransformer, apply_transformers
+
 logger = logging.getLogger(__name__)
 
 _hooks = {}
 
 
-def register(hook_name: str, callback: callable):
+def _callback_name(callback):
+    return getattr(callback, '__name__', callback.__class__.__name__)
+
+
+def register(hook_name: str, callback):
     """
     注册一个钩子回调。
+    callback 可以是普通函数，也可以是 ContentTransformer 实例（仅对 Filter Hook 有效）。
     """
     if hook_name not in _hooks:
         _hooks[hook_name] = []
     _hooks[hook_name].append(callback)
-    logger.debug(f"Registered hook '{hook_name}' with callback '{callback.__name__}'")
+    logger.debug(f"Registered hook '{hook_name}' with callback '{_callback_name(callback)}'")
 
 
 def run_action(hook_name: str, *args, **kwargs):
@@ -26,19 +33,106 @@ def run_action(hook_name: str, *args, **kwargs):
             try:
                 callback(*args, **kwargs)
             except Exception as e:
-                logger.error(f"Error running action hook '{hook_name}' callback '{callback.__name__}': {e}", exc_info=True)
+                logger.error(f"Error running action hook '{hook_name}' callback '{_callback_name(callback)}': {e}", exc_info=True)
+
+
+def pure_filter(func):
+    """
+    标记过滤器为纯函数：输出只依赖输入内容和文章字段，与请求无关。
+    纯过滤器的结果可以按文章缓存，ContentTransformer 通过类属性 PURE 声明。
+    """
+    func.pure = True
+    return func
+
+
+def is_pure(callback):
+    if isinstance(callback, ContentTransformer):
+        return callback.PURE
+    return getattr(callback, 'pure', False)
 
 
 def apply_filters(hook_name: str, value, *args, **kwargs):
     """
     执行一个 Filter Hook。
     它会把 value 依次传递给所有注册的回调函数进行处理。
+    相邻注册的 ContentTransformer 会合并为一次 HTML 解析执行。
+    传入 article 参数时，过滤器链开头连续的纯过滤器输出会按文章缓存，
+    只有之后依赖请求的过滤器每次重新执行。
     """
     if hook_name in _hooks:
         logger.debug(f"Applying filter hook '{hook_name}'")
-        for callback in _hooks[hook_name]:
-            try:
-                value = callback(value, *args, **kwargs)
-            except Exception as e:
-                logger.error(f"Error applying filter hook '{hook_name}' callback '{callback.__name__}': {e}", exc_info=True)
+        callbacks = _hooks[hook_name]
+        article = kwargs.get('article')
+        pure_count = 0
+        while pure_count < len(callbacks) and is_pure(callbacks[pure_count]):
+            pure_count += 1
+
+        if pure_count and getattr(article, 'pk', None):
+            value = _apply_pure_filters(hook_name, value, callbacks[:pure_count], *args, **kwargs)
+            callbacks = callbacks[pure_count:]
+        value = _apply_callbacks(hook_name, value, callbacks, *args, **kwargs)
     return value
+
+
+def _get_pure_filters_cache_key(hook_name, value, callbacks, article, is_summary):
+    import hashlib
+    from djangoblog.constants import CacheKey
+    from djangoblog.plugin_manage.loader import get_loaded_plugins
+
+    # 过滤器或插件版本变化都会生成新的缓存键
+    plugin_versions = ','.join(
+        f'{p.plugin_slug}={p.PLUGIN_VERSION}' for p in get_loaded_plugins())
+    m = hashlib.sha256()
+    for part in (
+            hook_name,
+            ','.join(_callback_name(c) for c in callbacks),
+            plugin_versions,
+            str(is_summary),
+            str(getattr(article, 'last_modify_time', '')),
+            value):
+        m.update(str(part).encode('utf-8'))
+        m.update(b'\0')
+    return CacheKey.ARTICLE_CONTENT_FILTERED.format(
+        article_id=article.pk, digest=m.hexdigest())
+
+
+def _apply_pure_filters(hook_name, value, callbacks, *args, **kwargs):
+    if not isinstance(value, str):
+        return _apply_callbacks(hook_name, value, callbacks, *args, **kwargs)
+
+    from djangoblog.constants import CacheTimeout
+    from djangoblog.utils import cache
+
+    key = _get_pure_filters_cache_key(
+        hook_name, value, callbacks, kwargs['article'], kwargs.get('is_summary', False))
+    result = cache.get(key)
+    if result is None:
+        result = _apply_callbacks(hook_name, value, callbacks, *args, **kwargs)
+        cache.set(key, result, CacheTimeout.HOUR_10)
+    return result
+
+
+def _apply_callbacks(hook_name, value, callbacks, *args, **kwargs):
+    transformers = []
+    for callback in callbacks:
+        if isinstance(callback, ContentTransformer):
+            transformers.append(callback)
+            continue
+        value = _apply_transformers(hook_name, value, transformers, *args, **kwargs)
+        transformers = []
+        try:
+            value = callback(value, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error applying filter hook '{hook_name}' callback '{_callback_name(callback)}': {e}", exc_info=True)
+    return _apply_transformers(hook_name, value, transformers, *args, **kwargs)
+
+
+def _apply_transformers(hook_name, value, transformers, *args, **kwargs):
+    if not transformers:
+        return value
+    try:
+        return apply_transformers(value, transformers, *args, **kwargs)
+    except Exception as e:
+        names = ', '.join(_callback_name(t) for t in transformers)
+        logger.error(f"Error applying content transformers '{names}' on hook '{hook_name}': {e}", exc_info=True)
+        return value
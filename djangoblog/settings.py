@@ -69,9 +69,8 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.gzip.GZipMiddleware',
-    # 'django.middleware.cache.UpdateCacheMiddleware',
+    'blog.middleware.PageCacheMiddleware',
     'django.middleware.common.CommonMiddleware',
-    # 'django.middleware.cache.FetchFromCacheMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -300,6 +299,14 @@ if os.environ.get("DJANGO_REDIS_URL"):
         }
     }
 
+# 整页缓存（见 blog.middleware.PageCacheMiddleware），测试时默认关闭，避免用例之间共享页面
+PAGE_CACHE_ENABLED = env_to_bool('DJANGO_PAGE_CACHE', not TESTING)
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# 进程内近端缓存（见 djangoblog.near_cache）：本地过期时间及检查共享版本号的间隔，单位秒
+NEAR_CACHE_TTL = 60
+NEAR_CACHE_CHECK_INTERVAL = 0 if TESTING else 1
+
 SITE_ID = 1
 BAIDU_NOTIFY_URL = os.environ.get('DJANGO_BAIDU_NOTIFY_URL') \
                    or 'http://data.zz.baidu.com/urls?site=https://www.lylinux.net&token=1uAOGrMsUm5syDGn'
@@ -31,7 +31,8 @@ class CategorySiteMap(Sitemap):
     priority = "0.6"
 
     def items(self):
-        return Category.objects.all()
+        # 按物化路径排序，子分类紧跟在上级分类之后
+        return Category.objects.order_by('path')
 
     def lastmod(self, obj):
         return obj.last_modify_time
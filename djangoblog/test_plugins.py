@@ -247,3 +247,140 @@ class ExternalLinksPluginTest(BaseTestCase, PluginTestMixin):
         content = '<a href="https://example.com">外部链接</a>'
         # 测试插件已加载即可，具体处理逻辑在运行时应用
         self.assertIsNotNone(plugin.PLUGIN_NAME)
+
+
+class ContentPipelineTest(BaseTestCase):
+    """测试单次解析的内容处理管线"""
+
+    def setUp(self):
+        super().setUp()
+        self._saved_hooks = hooks._hooks
+        hooks._hooks = {}
+
+    def tearDown(self):
+        hooks._hooks = self._saved_hooks
+        super().tearDown()
+
+    def test_untouched_html_is_preserved(self):
+        """未被转换器修改的内容原样输出"""
+        from djangoblog.plugin_manage.content_pipeline import ContentTransformer, apply_transformers
+
+        class NoopTransformer(ContentTransformer):
+            TAGS = ('img',)
+            HANDLE_TEXT = True
+
+        html = '<p class="x">a &amp; b &#39;<br/><!-- c --></p><pre><code>if a < b:</code></pre>'
+        self.assertEqual(apply_transformers(html, [NoopTransformer()]), html)
+
+    def test_transformers_share_one_parse(self):
+        """相邻转换器只解析一次 HTML"""
+        from djangoblog.plugin_manage import content_pipeline
+        from plugins.external_links.plugin import ExternalLinksTransformer
+        from plugins.image_lazy_loading.plugin import ImageOptimizationPlugin
+
+        hooks.register(ARTICLE_CONTENT_HOOK_NAME, ExternalLinksTransformer())
+        # 实例化时插件自动注册转换器
+        ImageOptimizationPlugin()
+        html = '<p><a href="https://www.lylinux.net/">ext</a><img src="/a.png"><img src="/b.png"></p>'
+        with patch.object(content_pipeline._ContentParser, 'feed',
+                          autospec=True, side_effect=content_pipeline._ContentParser.feed) as mock_feed:
+            result = hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, html)
+        self.assertEqual(mock_feed.call_count, 1)
+        self.assertIn('target="_blank"', result)
+        self.assertIn('rel="noopener noreferrer"', result)
+        self.assertIn('fetchpriority="high"', result)
+        self.assertIn('loading="lazy"', result)
+
+    def test_string_filters_keep_registration_order(self):
+        """字符串过滤器与转换器按注册顺序交替执行"""
+        from djangoblog.plugin_manage.content_pipeline import ContentTransformer
+
+        class SuffixTransformer(ContentTransformer):
+            def finish(self, document):
+                document.append('[t]')
+
+        hooks.register(ARTICLE_CONTENT_HOOK_NAME, lambda value, *args, **kwargs: value + '[f1]')
+        hooks.register(ARTICLE_CONTENT_HOOK_NAME, SuffixTransformer())
+        hooks.register(ARTICLE_CONTENT_HOOK_NAME, lambda value, *args, **kwargs: value + '[f2]')
+        result = hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x')
+        self.assertEqual(result, 'x[f1][t][f2]')
+
+    def test_internal_and_targeted_links_untouched(self):
+        from plugins.external_links.plugin import ExternalLinksPlugin
+        from djangoblog.utils import get_current_site
+        plugin = ExternalLinksPlugin()
+        domain = get_current_site().domain
+        html = f'<a href="https://{domain}/x">in</a><a href="https://e.com" target="_self">t</a>'
+        self.assertEqual(plugin.process_external_links(html), html)
+
+    def test_reading_time_and_copyright_skipped_in_summary(self):
+        from plugins.article_copyright.plugin import ArticleCopyrightPlugin
+        from plugins.reading_time.plugin import ReadingTimePlugin
+        ReadingTimePlugin()
+        ArticleCopyrightPlugin()
+        html = '<p>正文</p>'
+        summary = hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, html, article=self.article, is_summary=True)
+        self.assertEqual(summary, html)
+        detail = hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, html, article=self.article, is_summary=False)
+        self.assertTrue(detail.startswith('<div class="reading-time-estimate'))
+        self.assertTrue(detail.endswith('转载请注明出处。</p>'))
+
+
+class PureFilterCacheTest(BaseTestCase):
+    """测试纯过滤器输出按文章缓存"""
+
+    def setUp(self):
+        super().setUp()
+        from djangoblog.utils import cache
+        cache.clear()
+        self._saved_hooks = hooks._hooks
+        hooks._hooks = {}
+        self.calls = []
+
+    def tearDown(self):
+        hooks._hooks = self._saved_hooks
+        super().tearDown()
+
+    def register_filters(self):
+        @hooks.pure_filter
+        def pure_one(value, *args, **kwargs):
+            self.calls.append('pure')
+            return value + '[pure]'
+
+        def request_one(value, *args, **kwargs):
+            self.calls.append('request')
+            return value + '[request]'
+
+        hooks.register(ARTICLE_CONTENT_HOOK_NAME, pure_one)
+        hooks.register(ARTICLE_CONTENT_HOOK_NAME, request_one)
+
+    def test_pure_prefix_is_cached(self):
+        self.register_filters()
+        for _ in range(3):
+            result = hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x', article=self.article)
+            self.assertEqual(result, 'x[pure][request]')
+        self.assertEqual(self.calls.count('pure'), 1)
+        self.assertEqual(self.calls.count('request'), 3)
+
+    def test_cache_key_depends_on_content_and_summary(self):
+        self.register_filters()
+        hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x', article=self.article)
+        hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x', article=self.article, is_summary=True)
+        hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'y', article=self.article)
+        self.assertEqual(self.calls.count('pure'), 3)
+
+    def test_no_cache_without_article(self):
+        self.register_filters()
+        hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x')
+        hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x')
+        self.assertEqual(self.calls.count('pure'), 2)
+
+    def test_impure_head_disables_cache(self):
+        def request_first(value, *args, **kwargs):
+            return value
+
+        hooks.register(ARTICLE_CONTENT_HOOK_NAME, request_first)
+        self.register_filters()
+        hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x', article=self.article)
+        hooks.apply_filters(ARTICLE_CONTENT_HOOK_NAME, 'x', article=self.article)
+        self.assertEqual(self.calls.count('pure'), 2)
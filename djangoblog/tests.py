@@ -1,3 +1,6 @@
+import threading
+import time
+
 from django.test import TestCase
 
 from djangoblog.utils import *
@@ -30,3 +33,433 @@ class DjangoBlogTest(TestCase):
         }
         data = parse_dict_to_url(d)
         self.assertIsNotNone(data)
+
+
+class MarkdownPoolTest(TestCase):
+    def test_converter_is_reused(self):
+        pool = MarkdownPool(CommonMarkdown.LITE_EXTENSIONS)
+        with pool.converter() as md:
+            first = md
+        with pool.converter() as md:
+            self.assertIs(md, first)
+
+    def test_state_is_reset_between_uses(self):
+        pool = MarkdownPool(CommonMarkdown.EXTENSIONS)
+        body, toc = pool.convert('# first')
+        self.assertIn('first', toc)
+        body, toc = pool.convert('no heading')
+        self.assertNotIn('first', toc)
+        self.assertNotIn('first', body)
+
+    def test_pool_size_is_bounded(self):
+        pool = MarkdownPool(CommonMarkdown.LITE_EXTENSIONS, max_size=1)
+        with pool.converter():
+            with pool.converter():
+                pass
+        self.assertEqual(len(pool._pool), 1)
+
+    def test_lite_profile_skips_codehilite(self):
+        value = '```python\nimport os\n```'
+        self.assertIn('codehilite', CommonMarkdown.get_markdown(value))
+        self.assertNotIn('codehilite', CommonMarkdown.get_markdown_lite(value))
+
+
+class IncrementalMarkdownTest(TestCase):
+    DOCUMENT = '''# 标题
+
+intro **bold**
+continued
+
+## Code
+
+```python
+def f():
+
+    return 1
+```
+
+- item a
+
+- item b
+    nested
+
+> quote
+>
+> more
+
+| a | b |
+| --- | --- |
+| 1 | 2 |
+
+# 标题
+
+## Code
+'''
+
+    def setUp(self):
+        cache.clear()
+        self.renderer = IncrementalMarkdown(CommonMarkdown._pool)
+
+    def test_split_keeps_structures_together(self):
+        blocks = IncrementalMarkdown.split_blocks(self.DOCUMENT)
+        self.assertIn('```python\ndef f():\n\n    return 1\n```', blocks)
+        self.assertIn('- item a\n\n- item b\n    nested', blocks)
+        self.assertIn('> quote\n>\n> more', blocks)
+
+    def test_matches_whole_document(self):
+        import re
+        value = self.DOCUMENT * 3
+        body, toc = self.renderer.convert(value)
+        whole_body, whole_toc = CommonMarkdown.get_markdown_with_toc(value)
+        # 代码高亮块之后整篇转换会多一个空行，忽略元素之间的空行差异
+        self.assertEqual(re.sub(r'\n+', '\n', body), re.sub(r'\n+', '\n', whole_body))
+        self.assertEqual(toc, whole_toc)
+        self.assertIn('id="_2"', body)
+
+    def test_only_changed_blocks_rendered(self):
+        self.renderer.convert(self.DOCUMENT)
+        edited = self.DOCUMENT.replace('intro **bold**', 'intro **edited**')
+        with self.assertLogs('djangoblog.utils', level='INFO') as logs:
+            body, toc = self.renderer.convert(edited)
+        self.assertIn('1 rendered', logs.output[-1])
+        self.assertIn('<strong>edited</strong>', body)
+
+    def test_cross_block_syntax_falls_back(self):
+        self.assertIsNone(IncrementalMarkdown.split_blocks('[link][1]\n\n[1]: https://www.lylinux.net/'))
+        self.assertIsNone(IncrementalMarkdown.split_blocks('text[^1]\n\n[^1]: note'))
+        value = '```\n[1]: inside fence\n```'
+        self.assertEqual(IncrementalMarkdown.split_blocks(value), [value])
+
+
+class HighlightCacheTest(TestCase):
+    def setUp(self):
+        from djangoblog import highlight_cache
+        cache.clear()
+        highlight_cache._local_cache.clear()
+
+    def test_codehilite_uses_cached_highlight(self):
+        from markdown.extensions import codehilite
+        from djangoblog.highlight_cache import cached_highlight
+        self.assertIs(codehilite.highlight, cached_highlight)
+
+    def test_same_block_highlighted_once(self):
+        from unittest.mock import patch
+        import pygments
+        value = '```python\nimport os\n```'
+        first = CommonMarkdown.get_markdown(value)
+        with patch('djangoblog.highlight_cache.pygments.highlight',
+                   side_effect=pygments.highlight) as mock_highlight:
+            second = CommonMarkdown.get_markdown('text\n\n' + value)
+        mock_highlight.assert_not_called()
+        self.assertIn(first, second)
+
+    def test_shared_cache_tier(self):
+        from unittest.mock import patch
+        from djangoblog import highlight_cache
+        CommonMarkdown.get_markdown('```python\nimport sys\n```')
+        highlight_cache._local_cache.clear()
+        with patch('djangoblog.highlight_cache.pygments.highlight') as mock_highlight:
+            CommonMarkdown.get_markdown('```python\nimport sys\n```')
+        mock_highlight.assert_not_called()
+        self.assertEqual(len(highlight_cache._local_cache), 1)
+
+    def test_language_is_part_of_key(self):
+        python = CommonMarkdown.get_markdown('```python\nprint(1)\n```')
+        text = CommonMarkdown.get_markdown('```text\nprint(1)\n```')
+        self.assertNotEqual(python, text)
+
+    def test_lru_is_bounded(self):
+        from djangoblog.lru_cache import LRUCache
+        lru = LRUCache(max_size=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+
+
+class SanitizeHtmlTest(TestCase):
+    def test_cleaner_reused_from_pool(self):
+        from djangoblog.utils import CleanerPool
+        pool = CleanerPool(max_size=1)
+        with pool.cleaner() as first:
+            pass
+        with pool.cleaner() as second:
+            self.assertIs(second, first)
+            # 借出期间其他调用方拿到另一个实例
+            with pool.cleaner() as third:
+                self.assertIsNot(third, second)
+
+    def test_disallowed_classes_and_style_removed(self):
+        html = '<span class="k evil" style="color:red">x</span><div class="evil">y</div>'
+        self.assertEqual(sanitize_html(html), '<span class="k">x</span><div>y</div>')
+
+    def test_text_mentioning_style_is_kept(self):
+        self.assertEqual(sanitize_html('<code>style=""</code>'), '<code>style=""</code>')
+
+
+class CacheDecoratorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_key_is_deterministic_for_model_instances(self):
+        from blog.models import Article
+        first = Article(pk=1, title='a')
+        second = Article(pk=1, title='b')
+        key = Article.next_article.make_cache_key(first)
+        self.assertEqual(key, Article.next_article.make_cache_key(second))
+        self.assertNotEqual(key, Article.next_article.make_cache_key(Article(pk=2)))
+        self.assertIn('blog.models.Article.next_article', key)
+
+    def test_none_is_cached(self):
+        calls = []
+
+        @cache_decorator(60)
+        def lookup(value):
+            calls.append(value)
+            return None
+
+        self.assertIsNone(lookup(1))
+        self.assertIsNone(lookup(1))
+        self.assertEqual(calls, [1])
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        @cache_decorator(60)
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        threads = [threading.Thread(target=slow) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_served_while_refreshing(self):
+        from unittest.mock import patch
+        results = iter(['old', 'new'])
+
+        @cache_decorator(60, stale_ttl=60)
+        def value():
+            return next(results)
+
+        self.assertEqual(value(), 'old')
+        with patch('djangoblog.utils.time.time', return_value=time.time() + 90):
+            self.assertEqual(value(), 'old')
+        deadline = time.time() + 5
+        while value() != 'new' and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(value(), 'new')
+
+
+class CachedPageListTest(TestCase):
+    def test_paginator_uses_cached_rows(self):
+        from django.core.paginator import Paginator
+        from djangoblog.mixins import CachedPageList
+        rows = CachedPageList(['c', 'd'], count=5, offset=2)
+        page = Paginator(rows, 2).page(2)
+        self.assertEqual(list(page.object_list), ['c', 'd'])
+        self.assertEqual(page.paginator.num_pages, 3)
+        self.assertTrue(page.has_next())
+
+
+class CacheTagsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_tag(self):
+        from djangoblog import cache_tags
+        cache_tags.set_tagged('tagged_a', 'a', ['article:1', 'category:1'])
+        cache_tags.set_tagged('tagged_b', 'b', ['article:2'])
+        cache_tags.invalidate_tags('category:1')
+        self.assertIsNone(cache_tags.get_tagged('tagged_a'))
+        self.assertEqual(cache_tags.get_tagged('tagged_b'), 'b')
+
+    def test_change_during_compute_is_not_cached(self):
+        from djangoblog import cache_tags
+        versions = cache_tags.get_tag_versions(['article_list'])
+        cache_tags.invalidate_tags('article_list')
+        cache_tags.set_tagged('tagged', 'stale', tag_versions=versions)
+        self.assertIsNone(cache_tags.get_tagged('tagged'))
+
+    def test_evicted_version_invalidates(self):
+        from djangoblog import cache_tags
+        cache_tags.set_tagged('tagged', 'value', ['tag:1'])
+        cache.delete(cache_tags.TAG_VERSION_KEY.format(tag='tag:1'))
+        self.assertIsNone(cache_tags.get_tagged('tagged'))
+
+    def test_cache_decorator_tags(self):
+        from djangoblog import cache_tags
+        calls = []
+
+        @cache_decorator(60, tags=lambda value: ['tag:{}'.format(value)])
+        def lookup(value):
+            calls.append(value)
+            return value
+
+        lookup(1)
+        lookup(1)
+        cache_tags.invalidate_tags('tag:1')
+        lookup(1)
+        self.assertEqual(calls, [1, 1])
+
+    def test_blog_settings_save_keeps_unrelated_cache(self):
+        from blog.models import BlogSettings
+        cache.set('verify_code', '123456')
+        get_blog_setting()
+        BlogSettings.objects.first().save()
+        self.assertEqual(cache.get('verify_code'), '123456')
+        self.assertIsNone(cache.get('get_blog_setting'))
+
+
+class CacheNamespaceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_invalidates_namespace(self):
+        from djangoblog import cache_namespace
+        cache.set(cache_namespace.make_key('category:1', 'page_1'), 'a')
+        cache.set(cache_namespace.make_key('category:1', 'page_2'), 'b')
+        cache.set(cache_namespace.make_key('category:2', 'page_1'), 'c')
+        cache.set('verify_code', '123456')
+        cache_namespace.bump('category:1')
+        self.assertIsNone(cache.get(cache_namespace.make_key('category:1', 'page_1')))
+        self.assertIsNone(cache.get(cache_namespace.make_key('category:1', 'page_2')))
+        self.assertEqual(cache.get(cache_namespace.make_key('category:2', 'page_1')), 'c')
+        self.assertEqual(cache.get('verify_code'), '123456')
+
+    def test_evicted_generation_does_not_reuse_keys(self):
+        from djangoblog import cache_namespace
+        old_key = cache_namespace.make_key('index', 'index_1')
+        cache.set(old_key, 'old')
+        cache.delete(cache_namespace.GENERATION_KEY.format(namespace='index'))
+        self.assertNotEqual(cache_namespace.make_key('index', 'index_1'), old_key)
+        cache.delete(cache_namespace.GENERATION_KEY.format(namespace='index'))
+        cache_namespace.bump('index')
+        self.assertNotEqual(cache_namespace.make_key('index', 'index_1'), old_key)
+
+    def test_sidebar_cache_invalidated(self):
+        from djangoblog import cache_namespace
+        key = cache_namespace.make_key(cache_namespace.SIDEBAR, 'i')
+        cache.set(key, {'sidebar': True})
+        delete_sidebar_cache()
+        self.assertIsNone(cache.get(cache_namespace.make_key(cache_namespace.SIDEBAR, 'i')))
+
+
+class CachePurgeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_delete_prefix(self):
+        from djangoblog import cache_purge
+        cache.set('markdown_block_a', 'a')
+        cache.set('markdown_block_b', 'b')
+        cache.set('verify_code', '123456')
+        self.assertEqual(cache_purge.delete_prefix('markdown_block_'), 2)
+        self.assertIsNone(cache.get('markdown_block_a'))
+        self.assertEqual(cache.get('verify_code'), '123456')
+
+    def test_delete_prefix_unsupported_backend(self):
+        from django.core.management import CommandError, call_command
+        from django.test import override_settings
+        from djangoblog import cache_purge
+        dummy = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy):
+            with self.assertRaisesMessage(ValueError, 'DummyCache'):
+                cache_purge.delete_prefix('markdown_block_')
+            with self.assertRaises(CommandError):
+                call_command('clear_cache', prefix=['markdown_block_'])
+
+    def test_purge_all_keeps_unrelated_keys(self):
+        from djangoblog import cache_namespace, cache_purge
+        cache.set('verify_code', '123456')
+        key = cache_namespace.make_key(cache_namespace.PAGE, 'page_cache_x')
+        cache.set(key, 'page')
+        stats = cache_purge.purge()
+        self.assertGreater(stats['namespaces'], 0)
+        self.assertIsNone(cache.get(cache_namespace.make_key(cache_namespace.PAGE, 'page_cache_x')))
+        self.assertEqual(cache.get('verify_code'), '123456')
+
+    def test_purge_tag(self):
+        from blog.models import Tag
+        from djangoblog import cache_namespace, cache_purge
+        tag = Tag.objects.create(name='purge')
+        namespace = cache_namespace.tag_namespace(tag.pk)
+        cache.set(cache_namespace.make_key(namespace, 'tag_purge_1'), 'list')
+        stats = cache_purge.purge(tags=[tag.pk])
+        self.assertEqual(stats['tags'], 1)
+        self.assertIsNone(cache.get(cache_namespace.make_key(namespace, 'tag_purge_1')))
+
+    def test_unknown_namespace(self):
+        from djangoblog import cache_purge
+        with self.assertRaises(ValueError):
+            cache_purge.purge(namespaces=['unknown'])
+
+
+class NearCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_local_hit_skips_shared_cache(self):
+        from djangoblog.near_cache import NearCache
+        near = NearCache(check_interval=60)
+        near.get('key')
+        near.set('key', 'value')
+        cache.clear()
+        self.assertEqual(near.get('key'), 'value')
+
+    def test_invalidate_from_other_process(self):
+        from djangoblog.near_cache import NearCache
+        worker_a = NearCache(check_interval=0)
+        worker_b = NearCache(check_interval=0)
+        worker_a.set('key', 'a')
+        worker_b.set('key', 'b')
+        worker_a.get('key')
+        worker_b.invalidate()
+        self.assertIsNone(worker_a.get('key'))
+
+    def test_ttl_expires(self):
+        from djangoblog.near_cache import NearCache
+        near = NearCache(ttl=-1)
+        near.set('key', 'value')
+        self.assertIsNone(near.get('key'))
+
+    def test_site_save_invalidates(self):
+        from django.contrib.sites.models import Site
+        from djangoblog.utils import get_current_site
+        self.assertIs(get_current_site(), get_current_site())
+        site = Site.objects.get(pk=get_current_site().pk)
+        site.domain = 'new.example.com'
+        site.save()
+        self.assertEqual(get_current_site().domain, 'new.example.com')
+
+    def test_blog_settings_save_invalidates(self):
+        from blog.models import BlogSettings
+        get_blog_setting()
+        setting = get_blog_setting()
+        self.assertIs(get_blog_setting(), setting)
+        BlogSettings.objects.filter(pk=setting.pk).update(site_name='new name')
+        BlogSettings.objects.get(pk=setting.pk).save()
+        self.assertEqual(get_blog_setting().site_name, 'new name')
+
+
+class PageHolesTest(TestCase):
+    def test_fill_renders_for_request(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from djangoblog import page_holes
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        content = 'a{}b'.format(page_holes.render_marker('authenticated'))
+        self.assertEqual(page_holes.fill(request, content), 'afalseb')
+
+    def test_forged_marker_is_kept(self):
+        from django.test import RequestFactory
+        from djangoblog import page_holes
+        content = '<!--page-hole:forged-->'
+        self.assertEqual(page_holes.fill(RequestFactory().get('/'), content), content)
@@ -19,11 +19,13 @@ from django.conf.urls.static import static
 from django.contrib.sitemaps.views import sitemap
 from django.urls import path, include
 from django.urls import re_path
+from django.views.decorators.http import condition
 from haystack.views import search_view_factory
 from django.http import JsonResponse
 import time
 
 from blog.views import EsSearchView
+from djangoblog import conditional
 from djangoblog.admin_site import admin_site
 from djangoblog.elasticsearch_backend import ElasticSearchModelSearchForm
 from djangoblog.feeds import DjangoBlogFeed
@@ -38,6 +40,12 @@ sitemaps = {
     'static': StaticViewSitemap
 }
 
+# 执行之前根据文章修改时间和命名空间代数判断条件请求
+feed_view = condition(
+    etag_func=conditional.feed_etag, last_modified_func=conditional.feed_last_modified)(DjangoBlogFeed())
+sitemap_view = condition(
+    etag_func=conditional.sitemap_etag, last_modified_func=conditional.sitemap_last_modified)(sitemap)
+
 handler404 = 'blog.views.page_not_found_view'
 handler500 = 'blog.views.server_error_view'
 handle403 = 'blog.views.permission_denied_view'
@@ -64,10 +72,10 @@ urlpatterns += i18n_patterns(
     re_path(r'', include('comments.urls', namespace='comment')),
     re_path(r'', include('accounts.urls', namespace='account')),
     re_path(r'', include('oauth.urls', namespace='oauth')),
-    re_path(r'^sitemap\.xml$', sitemap, {'sitemaps': sitemaps},
+    re_path(r'^sitemap\.xml$', sitemap_view, {'sitemaps': sitemaps},
             name='django.contrib.sitemaps.views.sitemap'),
-    re_path(r'^feed/$', DjangoBlogFeed()),
-    re_path(r'^rss/$', DjangoBlogFeed()),
+    re_path(r'^feed/$', feed_view),
+    re_path(r'^rss/$', feed_view),
     re_path('^search', search_view_factory(view_class=EsSearchView, form_class=ElasticSearchModelSearchForm),
             name='search'),
     re_path(r'', include('servermanager.urls', namespace='servermanager'))
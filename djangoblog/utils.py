@@ -8,9 +8,18 @@ import random
 import string
 import uuid
 import hashlib
+import functools
 import hmac
+import re
+import threading
+import time
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
 
 import bleach
+import bleach.sanitizer
+from bleach.html5lib_shim import Filter
 import markdown
 import requests
 from django.conf import settings
@@ -18,6 +27,10 @@ from django.contrib.sites.models import Site
 from django.core.cache import cache
 from django.templatetags.static import static
 
+from djangoblog import cache_namespace, cache_tags
+from djangoblog.constants import CacheKey, CacheTimeout
+from djangoblog.near_cache import near_cache, near_cached
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,98 +46,417 @@ def get_sha256(value):
     return hmac.new(key, msg, hashlib.sha256).hexdigest()
 
 
-def cache_decorator(expiration=3 * 60):
+# cache_decorator 生成的缓存键前缀
+CACHE_DECORATOR_PREFIX = 'cache_decorator'
+# 重新计算时分布式锁的超时时间，以及未抢到锁时等待其他进程计算结果的最长时间
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 5
+
+_CachedValue = namedtuple('_CachedValue', ['value', 'fresh_until', 'tag_versions'], defaults=(None,))
+_single_flight_locks = weakref.WeakValueDictionary()
+_single_flight_guard = threading.Lock()
+
+
+def _cache_key_part(value):
+    from django.db.models import Model
+    if isinstance(value, Model):
+        # 模型实例按 app_label.Model:pk 生成，repr 中的内存地址等信息不参与
+        return '{label}:{pk}'.format(label=value._meta.label, pk=value.pk)
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_cache_key_part(v) for v in value) + ']'
+    if isinstance(value, dict):
+        items = sorted(value.items(), key=lambda item: repr(item[0]))
+        return '{' + ','.join(
+            '{k!r}:{v}'.format(k=k, v=_cache_key_part(v)) for k, v in items) + '}'
+    return repr(value)
+
+
+def make_cache_key(func, args=(), kwargs=None):
+    """
+    cache_decorator 的缓存键：模块 + 限定名 + 参数哈希
+    不包含函数对象的内存地址，不同 worker 进程、不同机器生成的键一致
+    """
+    digest = hashlib.sha256(
+        _cache_key_part([list(args), kwargs or {}]).encode('utf-8')).hexdigest()
+    return '{prefix}:{module}.{name}:{digest}'.format(
+        prefix=CACHE_DECORATOR_PREFIX,
+        module=func.__module__,
+        name=func.__qualname__,
+        digest=digest)
+
+
+def _get_local_lock(key):
+    with _single_flight_guard:
+        lock = _single_flight_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _single_flight_locks[key] = lock
+        return lock
+
+
+def cache_decorator(expiration=3 * 60, stale_ttl=0, tags=None):
+    """
+    缓存函数返回值
+
+    - 同一个键只有一个调用方重新计算：进程内用线程锁，跨进程/机器用 cache.add
+      （redis 下为 SET NX）实现的锁，未抢到锁的调用方等待计算结果
+    - stale_ttl > 0 时，过期后的 stale_ttl 秒内先返回旧值，并在后台线程刷新
+    - tags 返回缓存值依赖的标签（见 djangoblog.cache_tags），标签失效后缓存随之失效
+    :param expiration: 缓存有效期（秒）
+    :param stale_ttl: 过期后允许返回旧值的时间（秒）
+    :param tags: 以被装饰函数的参数调用，返回依赖标签列表
+    """
+
     def wrapper(func):
-        def news(*args, **kwargs):
+        def compute_and_set(key, args, kwargs):
+            tag_versions = cache_tags.get_tag_versions(tags(*args, **kwargs)) if tags else None
+            value = func(*args, **kwargs)
+            cache.set(key, _CachedValue(value, time.time() + expiration, tag_versions),
+                      expiration + stale_ttl)
+            return value
+
+        def get_entry(key):
+            entry = cache.get(key)
+            if isinstance(entry, _CachedValue) and cache_tags.is_valid(entry.tag_versions):
+                return entry
+            return None
+
+        def refresh(key, lock_key, args, kwargs):
+            from django.db import connection
             try:
-                view = args[0]
-                key = view.get_cache_key()
-            except:
-                key = None
+                compute_and_set(key, args, kwargs)
+            except Exception as e:
+                logger.error('cache_decorator refresh failed:%s key:%s %s', func.__qualname__, key, e)
+            finally:
+                cache.delete(lock_key)
+                connection.close()
+
+        def wait_for_value(key):
+            deadline = time.time() + CACHE_LOCK_WAIT
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = get_entry(key)
+                if entry is not None:
+                    return entry
+            return None
+
+        @functools.wraps(func)
+        def news(*args, **kwargs):
+            get_cache_key = getattr(args[0], 'get_cache_key', None) if args else None
+            key = get_cache_key() if callable(get_cache_key) else None
             if not key:
-                unique_str = repr((func, args, kwargs))
-
-                m = hashlib.sha256(unique_str.encode('utf-8'))
-                key = m.hexdigest()
-            value = cache.get(key)
-            if value is not None:
-                # logger.info('cache_decorator get cache:%s key:%s' % (func.__name__, key))
-                if str(value) == '__default_cache_value__':
-                    return None
-                else:
-                    return value
-            else:
-                logger.debug(
-                    'cache_decorator set cache:%s key:%s' %
-                    (func.__name__, key))
-                value = func(*args, **kwargs)
-                if value is None:
-                    cache.set(key, '__default_cache_value__', expiration)
-                else:
-                    cache.set(key, value, expiration)
-                return value
-
+                key = make_cache_key(func, args, kwargs)
+            lock_key = key + ':lock'
+
+            entry = get_entry(key)
+            if entry is not None:
+                if entry.fresh_until >= time.time():
+                    return entry.value
+                # 已过期但仍在 stale_ttl 内：返回旧值，抢到锁的调用方在后台刷新
+                if cache.add(lock_key, 1, CACHE_LOCK_TIMEOUT):
+                    logger.debug('cache_decorator refresh:%s key:%s', func.__qualname__, key)
+                    threading.Thread(
+                        target=refresh, args=(key, lock_key, args, kwargs), daemon=True).start()
+                return entry.value
+
+            with _get_local_lock(key):
+                entry = get_entry(key)
+                if entry is not None:
+                    return entry.value
+                logger.debug('cache_decorator set cache:%s key:%s', func.__qualname__, key)
+                if cache.add(lock_key, 1, CACHE_LOCK_TIMEOUT):
+                    try:
+                        return compute_and_set(key, args, kwargs)
+                    finally:
+                        cache.delete(lock_key)
+                # 其他进程正在计算，等待其结果，超时后自行计算
+                entry = wait_for_value(key)
+                if entry is not None:
+                    return entry.value
+                return compute_and_set(key, args, kwargs)
+
+        news.make_cache_key = lambda *args, **kwargs: make_cache_key(func, args, kwargs)
         return news
 
     return wrapper
 
 
-def expire_view_cache(path, servername, serverport, key_prefix=None):
-    '''
-    刷新视图缓存
-    :param path:url路径
-    :param servername:host
-    :param serverport:端口
-    :param key_prefix:前缀
-    :return:是否成功
-    '''
-    from django.http import HttpRequest
-    from django.utils.cache import get_cache_key
+@near_cached('get_current_site')
+@cache_decorator(stale_ttl=CacheTimeout.HOUR_1)
+def get_current_site():
+    site = Site.objects.get_current()
+    return site
 
-    request = HttpRequest()
-    request.META = {'SERVER_NAME': servername, 'SERVER_PORT': serverport}
-    request.path = path
 
-    key = get_cache_key(request, key_prefix=key_prefix, cache=cache)
-    if key:
-        logger.info('expire_view_cache:get key:{path}'.format(path=path))
-        if cache.get(key):
-            cache.delete(key)
-        return True
-    return False
+class MarkdownPool:
+    """
+    预配置的 Markdown 转换器池
 
+    markdown.Markdown 实例构造时会加载扩展、注册处理器，开销较大，
+    这里复用已构造的实例，每次使用后调用 reset() 清理状态。
+    实例在借出期间只被一个线程/协程独占，因此同时适用于多线程与 gevent。
+    """
+
+    def __init__(self, extensions, max_size=8):
+        self.extensions = list(extensions)
+        self.max_size = max_size
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def _create(self):
+        return markdown.Markdown(extensions=self.extensions)
+
+    @contextmanager
+    def converter(self):
+        with self._lock:
+            md = self._pool.pop() if self._pool else None
+        if md is None:
+            md = self._create()
+        try:
+            yield md
+        finally:
+            md.reset()
+            with self._lock:
+                if len(self._pool) < self.max_size:
+                    self._pool.append(md)
+
+    def convert(self, value):
+        with self.converter() as md:
+            body = md.convert(value)
+            toc = getattr(md, 'toc', '')
+        return body, toc
 
-@cache_decorator()
-def get_current_site():
-    site = Site.objects.get_current()
-    return site
+
+class IncrementalMarkdown:
+    """
+    大文章的块级增量渲染
+
+    正文按顶层块（空行分隔的段落、代码块、表格……）切分，每块单独转换并按内容哈希缓存，
+    修改某一段后只需重新转换变化的块；每次转换只持有单个块的 ElementTree，峰值内存更低。
+    标题 id 在拼接时重新去重，目录由各块的标题信息统一生成，与整篇转换结果一致。
+
+    引用式链接、脚注、缩写、原始 HTML 块会跨块生效，遇到时返回 None，由调用方整篇转换。
+    """
+    FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+    LIST_RE = re.compile(r'^([*+-]|\d+[.)])\s')
+    UNSUPPORTED_RE = re.compile(r'^ {0,3}(\[[^\]]+\]:|\*\[|\[TOC\]|<[a-zA-Z!/?])')
+    HEADING_ID_RE = re.compile(r'(<h[1-6][^>]*?\sid=")([^"]*)(")')
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @classmethod
+    def _line_kind(cls, line):
+        if cls.LIST_RE.match(line):
+            return 'list'
+        if line.startswith('>'):
+            return 'quote'
+        return None
+
+    @classmethod
+    def _is_continuation(cls, line, block_kind):
+        """空行之后的这一行是否仍属于上一块：缩进内容、定义列表、同一列表/引用的后续项"""
+        if line[:1] in (' ', '\t', ':'):
+            return True
+        kind = cls._line_kind(line)
+        return kind is not None and kind == block_kind
+
+    @classmethod
+    def split_blocks(cls, value):
+        """
+        按顶层块边界切分正文
+        :return: 块列表；包含跨块语法时返回 None
+        """
+        blocks = []
+        current = []
+        fence = None
+        after_blank = False
+        block_kind = None
+        for line in value.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+            match = cls.FENCE_RE.match(line)
+            if fence:
+                current.append(line)
+                marker = match.group(1) if match else ''
+                if (marker[:1] == fence[0] and len(marker) >= len(fence)
+                        and not line.strip()[len(marker):].strip()):
+                    fence = None
+                continue
+            if not line.strip():
+                current.append(line)
+                after_blank = True
+                continue
+            if cls.UNSUPPORTED_RE.match(line):
+                return None
+            if after_blank and not cls._is_continuation(line, block_kind):
+                block = '\n'.join(current).strip('\n')
+                if block.strip():
+                    blocks.append(block)
+                current = []
+            after_blank = False
+            if line[:1] not in (' ', '\t'):
+                block_kind = cls._line_kind(line)
+            if match:
+                fence = match.group(1)
+            current.append(line)
+        block = '\n'.join(current).strip('\n')
+        if block.strip():
+            blocks.append(block)
+        return blocks
+
+    @staticmethod
+    def _flatten_toc_tokens(tokens):
+        flat = []
+        for token in tokens:
+            item = dict(token)
+            children = item.pop('children', [])
+            flat.append(item)
+            flat.extend(IncrementalMarkdown._flatten_toc_tokens(children))
+        return flat
+
+    @staticmethod
+    def build_toc(tokens):
+        """按 toc 扩展的输出格式生成目录 HTML"""
+        def build_ul(items):
+            if not items:
+                return '<ul></ul>\n'
+            lis = []
+            for item in items:
+                children = build_ul(item['children']) if item['children'] else ''
+                lis.append('<li><a href="#{id}">{name}</a>{children}</li>\n'.format(
+                    id=item['id'], name=item['name'], children=children))
+            return '<ul>\n' + ''.join(lis) + '</ul>\n'
+
+        from markdown.extensions.toc import nest_toc_tokens
+        return '<div class="toc">\n' + build_ul(nest_toc_tokens(tokens)) + '</div>\n'
+
+    def _render_blocks(self, blocks):
+        """
+        转换各块，命中缓存的块不再转换
+        :return: {块内容: (html, 扁平的标题信息)}
+        """
+        keys = {
+            block: CacheKey.MARKDOWN_BLOCK.format(digest=CommonMarkdown.get_content_hash(block))
+            for block in blocks
+        }
+        cached = cache.get_many(list(keys.values()))
+        rendered = {}
+        missing = {}
+        for block, key in keys.items():
+            if key in cached:
+                rendered[block] = cached[key]
+                continue
+            with self.pool.converter() as md:
+                html = md.convert(block)
+                tokens = self._flatten_toc_tokens(getattr(md, 'toc_tokens', []))
+            rendered[block] = missing[key] = (html, tokens)
+        if missing:
+            cache.set_many(missing, CacheTimeout.DAY_7)
+        logger.info('Markdown blocks: %d total, %d rendered', len(keys), len(missing))
+        return rendered
+
+    def convert(self, value):
+        """
+        :return: (html, toc)；不适合分块时返回 None
+        """
+        from markdown.extensions.toc import unique
+        blocks = self.split_blocks(value)
+        if blocks is None:
+            return None
+        rendered = self._render_blocks(blocks)
+
+        used_ids = set()
+        parts = []
+        toc_tokens = []
+        for block in blocks:
+            html, tokens = rendered[block]
+            mapping = {}
+            for token in tokens:
+                new_id = unique(token['id'], used_ids)
+                if new_id != token['id']:
+                    mapping[token['id']] = new_id
+                toc_tokens.append(dict(token, id=new_id))
+            if mapping:
+                html = self.HEADING_ID_RE.sub(
+                    lambda m: m.group(1) + mapping.get(m.group(2), m.group(2)) + m.group(3), html)
+            parts.append(html)
+        return '\n'.join(parts), self.build_toc(toc_tokens)
 
 
 class CommonMarkdown:
+    # 文章正文：代码高亮 + 目录
+    EXTENSIONS = [
+        'extra',
+        'codehilite',
+        'toc',
+        'tables',
+    ]
+    # 评论、侧边栏等短文本：不需要代码高亮和目录
+    LITE_EXTENSIONS = [
+        'extra',
+        'tables',
+    ]
+
+    _pool = MarkdownPool(EXTENSIONS)
+    _lite_pool = MarkdownPool(LITE_EXTENSIONS)
+    _incremental = IncrementalMarkdown(_pool)
+
+    # 超过该长度的文章正文使用块级增量渲染
+    INCREMENTAL_MIN_LENGTH = 10000
+
     @staticmethod
     def _convert_markdown(value):
-        md = markdown.Markdown(
-            extensions=[
-                'extra',
-                'codehilite',
-                'toc',
-                'tables',
-            ]
-        )
-        body = md.convert(value)
-        toc = md.toc
-        return body, toc
+        return CommonMarkdown._pool.convert(value)
+
+    @staticmethod
+    def get_config_fingerprint():
+        """
+        渲染配置指纹：扩展列表、markdown/pygments 版本变化都会使已有渲染结果失效
+        """
+        import pygments
+        return '{extensions}|markdown={md}|pygments={pg}'.format(
+            extensions=','.join(CommonMarkdown.EXTENSIONS),
+            md=markdown.__version__,
+            pg=pygments.__version__)
+
+    @staticmethod
+    def get_content_hash(value):
+        """
+        正文内容 + 渲染配置的哈希，用作渲染结果的失效依据
+        """
+        m = hashlib.sha256(CommonMarkdown.get_config_fingerprint().encode('utf-8'))
+        m.update(b'\0')
+        m.update((value or '').encode('utf-8'))
+        return m.hexdigest()
 
     @staticmethod
     def get_markdown_with_toc(value):
         body, toc = CommonMarkdown._convert_markdown(value)
         return body, toc
 
+    @staticmethod
+    def get_markdown_with_toc_incremental(value):
+        """
+        文章正文渲染：大文章按块增量渲染，其余情况整篇转换
+        """
+        if value and len(value) >= CommonMarkdown.INCREMENTAL_MIN_LENGTH:
+            result = CommonMarkdown._incremental.convert(value)
+            if result is not None:
+                return result
+        return CommonMarkdown.get_markdown_with_toc(value)
+
     @staticmethod
     def get_markdown(value):
         body, toc = CommonMarkdown._convert_markdown(value)
         return body
 
+    @staticmethod
+    def get_markdown_lite(value):
+        """
+        轻量渲染，用于评论、侧边栏等短文本
+        """
+        body, toc = CommonMarkdown._lite_pool.convert(value)
+        return body
+
 
 def send_email(emailto, title, content):
     from djangoblog.blog_signals import send_email_signal
@@ -147,6 +479,7 @@ def parse_dict_to_url(dict):
     return url
 
 
+@near_cached('get_blog_setting')
 def get_blog_setting():
     value = cache.get('get_blog_setting')
     if value:
@@ -203,12 +536,23 @@ def save_user_avatar(url):
         return static('blog/img/avatar.png')
 
 
+def delete_blog_setting_cache():
+    """网站配置修改后清理依赖配置的缓存"""
+    cache.delete('get_blog_setting')
+    # 同时通知各进程清空近端缓存中的配置；配置出现在所有页面中，整页缓存一起失效
+    cache_namespace.bump(cache_namespace.SIDEBAR, cache_namespace.SEO, cache_namespace.PAGE)
+    cache_tags.invalidate_tags(cache_tags.SETTINGS)
+
+
+def delete_site_cache():
+    """站点修改后清理 get_current_site 的共享缓存（含过期后仍返回的旧值），并通知各进程清空近端缓存"""
+    cache.delete(get_current_site.make_cache_key())
+    near_cache.invalidate()
+
+
 def delete_sidebar_cache():
-    from blog.models import LinkShowType
-    keys = ["sidebar" + x for x in LinkShowType.values]
-    for k in keys:
-        logger.info('delete sidebar key:' + k)
-        cache.delete(k)
+    """侧边栏的所有链接类型共用一个命名空间，一次失效"""
+    cache_namespace.bump(cache_namespace.SIDEBAR)
 
 
 def delete_view_cache(prefix, keys):
@@ -236,22 +580,39 @@ ALLOWED_TAGS = [
     'del', 'ins', 'sub', 'sup',  # 文本修饰
 ]
 
-# 安全的class值白名单 - 只允许代码高亮相关的class
-ALLOWED_CLASSES = [
+# 安全的class值白名单 - 只允许代码高亮相关的class（集合，按class逐个查找）
+ALLOWED_CLASSES = frozenset([
     'codehilite', 'highlight', 'hll', 'c', 'err', 'k', 'l', 'n', 'o', 'p', 'cm', 'cp', 'c1', 'cs',
     'gd', 'ge', 'gr', 'gh', 'gi', 'go', 'gp', 'gs', 'gu', 'gt', 'kc', 'kd', 'kn', 'kp', 'kr', 'kt',
     'ld', 'm', 'mf', 'mh', 'mi', 'mo', 'na', 'nb', 'nc', 'no', 'nd', 'ni', 'ne', 'nf', 'nl', 'nn',
     'nt', 'nv', 'ow', 'w', 'mb', 'mh', 'mi', 'mo', 'sb', 'sc', 'sd', 'se', 'sh', 'si', 'sx', 's2',
     's1', 'ss', 'bp', 'vc', 'vg', 'vi', 'il'
-]
+])
 
 def class_filter(tag, name, value):
-    """自定义class属性过滤器"""
-    if name == 'class':
-        # 只允许预定义的安全class值
-        allowed_classes = [cls for cls in value.split() if cls in ALLOWED_CLASSES]
-        return ' '.join(allowed_classes) if allowed_classes else False
-    return value
+    """
+    自定义class属性过滤器
+    bleach 只按返回值真假决定是否保留属性，这里只保留 class（style 等一律移除），
+    class 的取值由 AllowedClassFilter 按白名单逐个过滤
+    """
+    return name == 'class'
+
+
+class AllowedClassFilter(Filter):
+    """只保留预定义的安全class值，过滤后为空则移除class属性"""
+
+    def __iter__(self):
+        for token in super().__iter__():
+            if token['type'] in ('StartTag', 'EmptyTag') and token['data']:
+                attrs = {}
+                for key, value in token['data'].items():
+                    if key[1] == 'class':
+                        value = ' '.join(cls for cls in value.split() if cls in ALLOWED_CLASSES)
+                        if not value:
+                            continue
+                    attrs[key] = value
+                token['data'] = attrs
+            yield token
 
 # 安全的属性白名单
 ALLOWED_ATTRIBUTES = {
@@ -271,22 +632,57 @@ ALLOWED_ATTRIBUTES = {
 # 安全的协议白名单 - 防止javascript:等危险协议
 ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
 
+class CleanerPool:
+    """
+    bleach Cleaner 池
+
+    Cleaner 构造时会创建 html5lib 解析器和过滤器，开销较大且不是线程安全的。
+    与 MarkdownPool 一样借出期间由一个线程/协程独占，用完归还；
+    gevent 下 threading.local 按协程隔离，每个请求都会重新构造，因此不按线程缓存。
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def _create(self):
+        return bleach.sanitizer.Cleaner(
+            tags=ALLOWED_TAGS,
+            attributes=ALLOWED_ATTRIBUTES,
+            protocols=ALLOWED_PROTOCOLS,  # 限制允许的协议
+            strip=True,  # 移除不允许的标签而不是转义
+            strip_comments=True,  # 移除HTML注释
+            filters=[AllowedClassFilter]
+        )
+
+    @contextmanager
+    def cleaner(self):
+        with self._lock:
+            cleaner = self._pool.pop() if self._pool else None
+        if cleaner is None:
+            cleaner = self._create()
+        try:
+            yield cleaner
+        finally:
+            with self._lock:
+                if len(self._pool) < self.max_size:
+                    self._pool.append(cleaner)
+
+
+_cleaner_pool = CleanerPool()
+
+
 def sanitize_html(html):
     """
     安全的HTML清理函数
     使用bleach库进行白名单过滤，防止XSS攻击
+    style 不在属性白名单中，由 Cleaner 直接移除，不再需要额外的正则处理
     """
-    cleaned = bleach.clean(
-        html, 
-        tags=ALLOWED_TAGS, 
-        attributes=ALLOWED_ATTRIBUTES,
-        protocols=ALLOWED_PROTOCOLS,  # 限制允许的协议
-        strip=True,  # 移除不允许的标签而不是转义
-        strip_comments=True  # 移除HTML注释
-    )
-    
-    # 移除空的 style 属性（bleach 有时会保留 style=""）
-    import re
-    cleaned = re.sub(r'\s*style\s*=\s*["\'][\s]*["\']', '', cleaned)
-    
-    return cleaned
+    with _cleaner_pool.cleaner() as cleaner:
+        return cleaner.clean(html)
+
+
+def render_comment_html(value):
+    """评论正文：轻量 Markdown 渲染后清理 HTML"""
+    return sanitize_html(CommonMarkdown.get_markdown_lite(value))
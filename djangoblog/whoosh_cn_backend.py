@@ -752,14 +752,12 @@ class WhooshSearchBackend(BaseSearchBackend):
                     # 高亮正文 - 返回markdown片段，让模板处理
                     if 'body' in additional_fields and additional_fields['body']:
                         import re
-                        from djangoblog.utils import CommonMarkdown
+                        from blog.models import ArticleRender
 
-                        # 先转换为HTML，便于提取摘要
-                        html_content = CommonMarkdown.get_markdown(additional_fields['body'])
-
-                        # 提取纯文本用于搜索匹配的上下文
-                        from django.utils.html import strip_tags
-                        plain_text = strip_tags(html_content)
+                        # 提取纯文本用于搜索匹配的上下文（读取预渲染结果）
+                        # 索引中的正文可能已过期，只读不写，不能覆盖文章的渲染结果
+                        plain_text = ArticleRender.get_or_render(
+                            raw_result[DJANGO_ID], additional_fields['body'], save=False).plain_text
 
                         # 找到关键词的位置，提取上下文
                         match_pos = -1